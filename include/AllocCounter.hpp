@@ -0,0 +1,12 @@
+#ifndef ALLOC_COUNTER_HPP
+#define ALLOC_COUNTER_HPP
+
+#include <cstdint>
+
+// Number of heap allocations (operator new) made by the calling thread.
+// Counting is done by the replacement operator new in AllocCounter.cpp;
+// builds that define LOADBAL_NO_ALLOC_HOOK keep the default allocator and
+// this always returns 0.
+std::uint64_t heap_alloc_count();
+
+#endif
@@ -0,0 +1,181 @@
+#ifndef CHECKPOINT_HPP
+#define CHECKPOINT_HPP
+
+#include <vector>
+#include <string>
+#include <cstdint>
+#include <cstring>
+#include <cstdio>
+#include <fcntl.h>
+#include <unistd.h>
+
+// Binary checkpoint file (little-endian, native layout):
+//   CheckpointHeader, then 'payload_bytes' of payload.
+// The payload is a flat sequence of values written by CheckpointWriter and
+// read back in the same order by CheckpointReader; vectors are stored as a
+// 64-bit length followed by their elements. Its layout belongs to
+// Simulation::save_state, which bumps the header version when it changes.
+struct CheckpointHeader {
+    char magic[8];            // "LBCKPT\0\0"
+    uint32_t version;
+    uint32_t reserved;
+    uint64_t payload_bytes;
+    uint64_t checksum;        // FNV-1a of the payload
+};
+
+static_assert(sizeof(CheckpointHeader) == 32, "CheckpointHeader must stay 32 bytes");
+
+static const char CHECKPOINT_MAGIC[8] = {'L', 'B', 'C', 'K', 'P', 'T', '\0', '\0'};
+
+inline uint64_t fnv1a(const char* data, size_t size) {
+    uint64_t h = 0xCBF29CE484222325ULL;
+    for (size_t i = 0; i < size; ++i) {
+        h ^= (unsigned char)data[i];
+        h *= 0x100000001B3ULL;
+    }
+    return h;
+}
+
+// Serializes into a buffer that keeps its capacity between checkpoints
+class CheckpointWriter {
+public:
+    void clear() { buf.clear(); }
+    const std::vector<char>& bytes() const { return buf; }
+
+    template <class T>
+    void put(const T& v) {
+        const char* p = reinterpret_cast<const char*>(&v);
+        buf.insert(buf.end(), p, p + sizeof(T));
+    }
+
+    template <class T>
+    void put_vec(const std::vector<T>& v) {
+        put<uint64_t>(v.size());
+        const char* p = reinterpret_cast<const char*>(v.data());
+        buf.insert(buf.end(), p, p + v.size() * sizeof(T));
+    }
+
+    void put_str(const std::string& s) {
+        put<uint64_t>(s.size());
+        buf.insert(buf.end(), s.begin(), s.end());
+    }
+
+    // Writes header + payload to 'path' atomically: a temporary file next
+    // to it is written and synced, then renamed over 'path'.
+    bool commit(const std::string& path, uint32_t version) const {
+        CheckpointHeader h{};
+        memcpy(h.magic, CHECKPOINT_MAGIC, sizeof(h.magic));
+        h.version = version;
+        h.payload_bytes = buf.size();
+        h.checksum = fnv1a(buf.data(), buf.size());
+
+        std::string tmp = path + ".tmp";
+        int fd = open(tmp.c_str(), O_WRONLY | O_CREAT | O_TRUNC, 0644);
+        if (fd < 0) return false;
+        bool ok = write_all(fd, reinterpret_cast<const char*>(&h), sizeof(h)) &&
+                  write_all(fd, buf.data(), buf.size()) &&
+                  fsync(fd) == 0;
+        ok = (close(fd) == 0) && ok;
+        if (ok) ok = rename(tmp.c_str(), path.c_str()) == 0;
+        if (!ok) unlink(tmp.c_str());
+        return ok;
+    }
+
+private:
+    static bool write_all(int fd, const char* p, size_t size) {
+        while (size > 0) {
+            ssize_t w = write(fd, p, size);
+            if (w <= 0) return false;
+            p += w;
+            size -= (size_t)w;
+        }
+        return true;
+    }
+
+    std::vector<char> buf;
+};
+
+// Reads a checkpoint written by CheckpointWriter. Every get fails (and
+// leaves ok() false) once the payload is exhausted, so a truncated or
+// mismatched payload is detected rather than read past.
+class CheckpointReader {
+public:
+    // Loads and verifies the file; 'error' says why on failure
+    bool open(const std::string& path, uint32_t version, std::string& error) {
+        FILE* f = fopen(path.c_str(), "rb");
+        if (!f) {
+            error = "cannot open " + path;
+            return false;
+        }
+        CheckpointHeader h;
+        bool ok = fread(&h, sizeof(h), 1, f) == 1 &&
+                  memcmp(h.magic, CHECKPOINT_MAGIC, sizeof(h.magic)) == 0;
+        if (ok && h.version != version) {
+            fclose(f);
+            error = path + " has checkpoint version " + std::to_string(h.version) +
+                    ", expected " + std::to_string(version);
+            return false;
+        }
+        if (ok) {
+            buf.resize(h.payload_bytes);
+            ok = fread(buf.data(), 1, buf.size(), f) == buf.size() &&
+                 fnv1a(buf.data(), buf.size()) == h.checksum;
+        }
+        fclose(f);
+        if (!ok) error = path + " is not a valid checkpoint (truncated or corrupt)";
+        pos = 0;
+        good = ok;
+        return ok;
+    }
+
+    bool ok() const { return good; }
+    bool at_end() const { return pos == buf.size(); }
+
+    template <class T>
+    T get() {
+        T v{};
+        if (take(sizeof(T))) memcpy(&v, buf.data() + pos - sizeof(T), sizeof(T));
+        return v;
+    }
+
+    // Reads a vector, which must have 'expected' elements (unless negative)
+    template <class T>
+    bool get_vec(std::vector<T>& v, long long expected = -1) {
+        uint64_t size = get<uint64_t>();
+        if (!good || (expected >= 0 && size != (uint64_t)expected) ||
+            size > (buf.size() - pos) / sizeof(T)) {
+            good = false;
+            return false;
+        }
+        v.resize(size);
+        take(size * sizeof(T));
+        if (size) memcpy(v.data(), buf.data() + pos - size * sizeof(T), size * sizeof(T));
+        return true;
+    }
+
+    std::string get_str() {
+        uint64_t size = get<uint64_t>();
+        if (!good || size > buf.size() - pos) {
+            good = false;
+            return std::string();
+        }
+        take(size);
+        return std::string(buf.data() + pos - size, size);
+    }
+
+private:
+    bool take(size_t size) {
+        if (!good || size > buf.size() - pos) {
+            good = false;
+            return false;
+        }
+        pos += size;
+        return true;
+    }
+
+    std::vector<char> buf;
+    size_t pos = 0;
+    bool good = false;
+};
+
+#endif
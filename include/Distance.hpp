@@ -0,0 +1,103 @@
+#ifndef DISTANCE_HPP
+#define DISTANCE_HPP
+
+#include <vector>
+#include <cstdlib>
+#include "Graph.hpp"
+
+// Closed-form distances for the supported topologies, built once per run.
+//   cycle   : ring distance min(|u-v|, n-|u-v|)
+//   grid    : Manhattan distance on the best-fit width x height rectangle
+//   cluster : 1 hop inside a cluster, 2 hops across, times the comm cost
+//             (a cost of 0 counts hops with weight 1)
+// Grid coordinates and cluster ids are tabulated per node so a lookup is
+// a couple of array reads, with no sqrt, factor search or division.
+class DistanceOracle {
+public:
+    DistanceOracle(Topology topology_ = Topology::Unknown, int n_ = 0,
+                   int num_clusters = 1, double comm_cost = 0.0)
+        : topology(topology_), n(n_), width(1), height(n_),
+          weight(comm_cost > 1e-9 ? comm_cost : 1.0)
+    {
+        if (topology == Topology::Grid && n > 0) {
+            width = grid_width(n);
+            height = n / width;
+            row.resize(n);
+            col.resize(n);
+            for (int i = 0; i < n; ++i) {
+                row[i] = i / width;
+                col[i] = i % width;
+            }
+        } else if (topology == Topology::Cluster) {
+            cluster_id.assign(n, 0);
+            if (num_clusters > 1) {
+                int servers_per_cluster = (n + num_clusters - 1) / num_clusters;
+                for (int i = 0; i < n; ++i) cluster_id[i] = i / servers_per_cluster;
+            }
+        }
+    }
+
+    double distance(int u, int v) const {
+        if (u == v) return 0.0;
+        switch (topology) {
+            case Topology::Cluster:
+                return (cluster_id[u] == cluster_id[v]) ? weight : 2.0 * weight;
+            case Topology::Cycle: {
+                int d = std::abs(u - v);
+                return (double)std::min(d, n - d);
+            }
+            case Topology::Grid:
+                return (double)(std::abs(row[u] - row[v]) + std::abs(col[u] - col[v]));
+            default:
+                return 0.0;
+        }
+    }
+
+    // out[i] = distance(s, v[i]) for i < count
+    void distances(int s, const int* v, int count, double* out) const {
+        switch (topology) {
+            case Topology::Cluster: {
+                int cs = cluster_id[s];
+                for (int i = 0; i < count; ++i) {
+                    out[i] = (v[i] == s) ? 0.0
+                           : (cluster_id[v[i]] == cs ? weight : 2.0 * weight);
+                }
+                break;
+            }
+            case Topology::Cycle:
+                for (int i = 0; i < count; ++i) {
+                    int d = std::abs(s - v[i]);
+                    out[i] = (double)std::min(d, n - d);
+                }
+                break;
+            case Topology::Grid: {
+                int rs = row[s], cs = col[s];
+                for (int i = 0; i < count; ++i) {
+                    out[i] = (double)(std::abs(rs - row[v[i]]) + std::abs(cs - col[v[i]]));
+                }
+                break;
+            }
+            default:
+                for (int i = 0; i < count; ++i) out[i] = 0.0;
+        }
+    }
+
+    int cluster_of(int u) const {
+        return cluster_id.empty() ? 0 : cluster_id[u];
+    }
+
+    int grid_cols() const { return width; }
+    int grid_rows() const { return height; }
+
+private:
+    Topology topology;
+    int n;
+    int width;
+    int height;
+    double weight;
+    std::vector<int> row;
+    std::vector<int> col;
+    std::vector<int> cluster_id;
+};
+
+#endif
@@ -0,0 +1,104 @@
+#ifndef EVENT_HEAP_HPP
+#define EVENT_HEAP_HPP
+
+#include <vector>
+#include <algorithm>
+
+// Indexed 4-ary min-heap of server completion times.
+// Each server appears at most once; its slot is tracked in 'pos' so that
+// insert / update / remove of a given server costs O(log n).
+// Ties on time are broken by the lower server index, which matches the
+// first-found minimum of a linear scan over the servers.
+class EventHeap {
+public:
+    explicit EventHeap(int n = 0) : pos(n, -1) { heap.reserve(n); }
+
+    bool empty() const { return heap.empty(); }
+    int size() const { return (int)heap.size(); }
+    bool contains(int id) const { return pos[id] >= 0; }
+
+    int top() const { return heap[0].id; }
+    double top_time() const { return heap[0].t; }
+
+    // Insert 'id' with time 't', or move it if it is already queued.
+    void push(int id, double t) {
+        int i = pos[id];
+        if (i < 0) {
+            i = (int)heap.size();
+            heap.push_back({t, id});
+            pos[id] = i;
+            sift_up(i);
+        } else {
+            double old = heap[i].t;
+            heap[i].t = t;
+            if (t < old) sift_up(i); else sift_down(i);
+        }
+    }
+
+    void remove(int id) {
+        int i = pos[id];
+        if (i < 0) return;
+        pos[id] = -1;
+        Node last = heap.back();
+        heap.pop_back();
+        if (i < (int)heap.size()) {
+            heap[i] = last;
+            pos[last.id] = i;
+            sift_up(i);
+            sift_down(pos[last.id]);
+        }
+    }
+
+    void clear() {
+        for (const Node& nd : heap) pos[nd.id] = -1;
+        heap.clear();
+    }
+
+private:
+    struct Node {
+        double t;
+        int id;
+    };
+
+    static bool less(const Node& a, const Node& b) {
+        return a.t < b.t || (a.t == b.t && a.id < b.id);
+    }
+
+    void sift_up(int i) {
+        Node nd = heap[i];
+        while (i > 0) {
+            int parent = (i - 1) / 4;
+            if (!less(nd, heap[parent])) break;
+            heap[i] = heap[parent];
+            pos[heap[i].id] = i;
+            i = parent;
+        }
+        heap[i] = nd;
+        pos[nd.id] = i;
+    }
+
+    void sift_down(int i) {
+        int size = (int)heap.size();
+        Node nd = heap[i];
+        while (true) {
+            int first = 4 * i + 1;
+            if (first >= size) break;
+            int last = std::min(first + 4, size);
+            int best = first;
+            for (int c = first + 1; c < last; ++c) {
+                if (less(heap[c], heap[best])) best = c;
+            }
+            if (!less(heap[best], nd)) break;
+            heap[i] = heap[best];
+            pos[heap[i].id] = i;
+            i = best;
+        }
+        heap[i] = nd;
+        pos[nd.id] = i;
+    }
+
+    std::vector<Node> heap;
+    std::vector<int> pos;
+};
+
+#endif
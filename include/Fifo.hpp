@@ -0,0 +1,80 @@
+#ifndef FIFO_HPP
+#define FIFO_HPP
+
+#include <vector>
+#include "Checkpoint.hpp"
+
+// Arrival times of the jobs queued at each server, oldest first, for
+// per-job response times. All servers share one pool of list nodes with a
+// free list, so memory is O(n + jobs in system). The pool starts with room
+// for 4 jobs per server and only allocates (doubling) beyond that.
+class ServerFifos {
+public:
+    explicit ServerFifos(int n = 0) : head(n, -1), tail(n, -1), free_node(-1) {
+        time.reserve(4 * (size_t)n + 1024);
+        next.reserve(4 * (size_t)n + 1024);
+    }
+
+    void push(int server, double t) {
+        int node = free_node;
+        if (node >= 0) {
+            free_node = next[node];
+            time[node] = t;
+            next[node] = -1;
+        } else {
+            node = (int)time.size();
+            time.push_back(t);
+            next.push_back(-1);
+        }
+        if (tail[server] >= 0) next[tail[server]] = node;
+        else head[server] = node;
+        tail[server] = node;
+    }
+
+    // Removes and returns the oldest arrival time at 'server' (not empty)
+    double pop(int server) {
+        int node = head[server];
+        head[server] = next[node];
+        if (head[server] < 0) tail[server] = -1;
+        next[node] = free_node;
+        free_node = node;
+        return time[node];
+    }
+
+    // Queued arrival times server by server; the queue lengths delimit them
+    void save(CheckpointWriter& out) const {
+        std::vector<double> flat;
+        for (size_t s = 0; s < head.size(); ++s) {
+            for (int node = head[s]; node >= 0; node = next[node]) flat.push_back(time[node]);
+        }
+        out.put_vec(flat);
+    }
+
+    // Rebuilds the lists from save()'s output and the per-server queue lengths
+    bool load(CheckpointReader& in, const std::vector<int>& lengths) {
+        std::vector<double> flat;
+        if (!in.get_vec(flat)) return false;
+        size_t total = 0;
+        for (int len : lengths) total += len;
+        if (total != flat.size() || lengths.size() != head.size()) return false;
+        std::fill(head.begin(), head.end(), -1);
+        std::fill(tail.begin(), tail.end(), -1);
+        time.clear();
+        next.clear();
+        free_node = -1;
+        size_t k = 0;
+        for (size_t s = 0; s < lengths.size(); ++s) {
+            for (int j = 0; j < lengths[s]; ++j) push((int)s, flat[k++]);
+        }
+        return true;
+    }
+
+private:
+    std::vector<int> head;     // oldest node per server, -1 if empty
+    std::vector<int> tail;     // newest node per server
+    std::vector<double> time;  // node arrival times
+    std::vector<int> next;     // next node in a list / the free list
+    int free_node;
+};
+
+#endif
@@ -2,33 +2,94 @@
 #define GRAPH_HPP
 
 #include <vector>
+#include <string>
 #include <cmath>
 #include <algorithm>
+#include <iostream>
+
+enum class Topology { Cycle, Grid, Cluster, Unknown };
+
+inline Topology parse_topology(const std::string& name) {
+    if (name == "cycle") return Topology::Cycle;
+    if (name == "grid") return Topology::Grid;
+    if (name == "cluster") return Topology::Cluster;
+    return Topology::Unknown;
+}
+
+// "Best fit" grid width: the largest factor of n not above sqrt(n).
+// A prime n gives width 1, i.e. a 1 x n line.
+inline int grid_width(int n) {
+    int width = (int)std::floor(std::sqrt(n));
+    while (width > 0 && n % width != 0) {
+        width--;
+    }
+    return width;
+}
+
+// Neighbor sets for the spatial policies.
+// Cycle and grid lists are stored as one flat CSR array: the neighbors of
+// node i are indices[offsets[i] .. offsets[i+1]). Clusters are implicit:
+// node i's neighbors are the other nodes of [cluster_begin(i), cluster_end(i)),
+// so no per-node list is ever materialised.
+struct NeighborTable {
+    std::vector<size_t> offsets;   // n+1 entries, empty if no lists
+    std::vector<int> indices;
+
+    bool clustered = false;
+    int n = 0;
+    int servers_per_cluster = 0;   // 0 = no cluster neighbors
+
+    int degree(int i) const {
+        if (clustered) {
+            return servers_per_cluster > 0 ? cluster_end(i) - cluster_begin(i) - 1 : 0;
+        }
+        return offsets.empty() ? 0 : (int)(offsets[i + 1] - offsets[i]);
+    }
+    const int* begin(int i) const { return indices.data() + offsets[i]; }
+    const int* end(int i) const { return indices.data() + offsets[i + 1]; }
+
+    int cluster_begin(int i) const { return (i / servers_per_cluster) * servers_per_cluster; }
+    int cluster_end(int i) const { return std::min(cluster_begin(i) + servers_per_cluster, n); }
+
+    int max_degree() const {
+        int d = 0;
+        if (clustered) return servers_per_cluster > 0 ? std::min(servers_per_cluster, n) - 1 : 0;
+        for (int i = 0; i + 1 < (int)offsets.size(); ++i) d = std::max(d, degree(i));
+        return d;
+    }
+
+    size_t memory_bytes() const {
+        return offsets.capacity() * sizeof(size_t) + indices.capacity() * sizeof(int);
+    }
+};
 
 // Generate neighbors for Cycle: s+1, s-1, s+2, s-2...
 // Each node is connected to k/2 neighbors on the left and k/2 on the right.
-inline std::vector<std::vector<int>> generate_cycle_neighbors(int n, int k_neighbors) {
-    std::vector<std::vector<int>> k_nbrs(n);
+inline NeighborTable generate_cycle_neighbors(int n, int k_neighbors) {
+    NeighborTable t;
+    t.n = n;
+    t.offsets.reserve(n + 1);
+    t.indices.reserve((size_t)n * std::max(k_neighbors, 0));
+    t.offsets.push_back(0);
     for (int i = 0; i < n; i++) {
+        int deg = 0;
         for (int offset = 1; offset <= (k_neighbors + 1) / 2; ++offset) {
-            if (k_nbrs[i].size() < (size_t)k_neighbors) 
-                k_nbrs[i].push_back((i + offset) % n);
-            if (k_nbrs[i].size() < (size_t)k_neighbors) 
-                k_nbrs[i].push_back((i - offset + n) % n);
+            if (deg < k_neighbors) { t.indices.push_back((i + offset) % n); deg++; }
+            if (deg < k_neighbors) { t.indices.push_back((i - offset + n) % n); deg++; }
         }
+        t.offsets.push_back(t.indices.size());
     }
-    return k_nbrs;
+    return t;
 }
 
 // Generate neighbors for Grid: Right, Left, Down, Up
-inline std::vector<std::vector<int>> generate_grid_neighbors(int n, int k_neighbors) {
-    std::vector<std::vector<int>> k_nbrs(n);
+inline NeighborTable generate_grid_neighbors(int n, int k_neighbors) {
+    NeighborTable t;
+    t.n = n;
+    t.offsets.assign(n + 1, 0);
     
     // 1. Calculate Best Fit Width
-    int width = (int)std::floor(std::sqrt(n));
-    while (width > 0 && n % width != 0) {
-        width--;
-    }
+    int width = grid_width(n);
     
     // --- PRIME CHECK ---
     // If width reached 1, it means n has no factors other than 1 and itself.
@@ -37,22 +98,25 @@ inline std::vector<std::vector<int>> generate_grid_neighbors(int n, int k_neighb
         // You can either return empty (to signal failure) 
         // or throw an exception depending on your error handling preference.
         std::cerr << "Error: N=" << n << " is prime. Cannot form a rectangular grid." << std::endl;
-        return k_nbrs; 
+        return t; 
     }
     // -------------------
 
     int height = n / width; 
+    t.indices.reserve((size_t)n * std::min(std::max(k_neighbors, 0), 4));
 
     for (int i = 0; i < n; i++) {
         int r = i / width;
         int c = i % width;
+        int deg = 0;
         
         auto add = [&](int nr, int nc) {
             // Strict Boundary Check (Non-Toroidal)
             if (nr >= 0 && nr < height && nc >= 0 && nc < width) {
                 int neighbor = nr * width + nc;
-                if (k_nbrs[i].size() < (size_t)k_neighbors) {
-                    k_nbrs[i].push_back(neighbor);
+                if (deg < k_neighbors) {
+                    t.indices.push_back(neighbor);
+                    deg++;
                 }
             }
         };
@@ -61,34 +125,34 @@ inline std::vector<std::vector<int>> generate_grid_neighbors(int n, int k_neighb
         add(r, c - 1); // Left
         add(r + 1, c); // Down
         add(r - 1, c); // Up
+        t.offsets[i + 1] = t.indices.size();
     }
-    return k_nbrs;
+    return t;
 }
 
 // Generate neighbors for Clusters
 // Each node is connected to all other nodes within its own cluster.
 // Used for "spatialKL" policy within a cluster topology.
-inline std::vector<std::vector<int>> generate_cluster_neighbors(int n, int num_clusters) {
-    std::vector<std::vector<int>> k_nbrs(n);
-    if (num_clusters <= 0) return k_nbrs;
+// Membership is kept as ranges, O(1) memory instead of O(n^2 / C).
+inline NeighborTable generate_cluster_neighbors(int n, int num_clusters) {
+    NeighborTable t;
+    t.n = n;
+    t.clustered = true;
+    if (num_clusters <= 0) return t;
 
-    int servers_per_cluster = (n + num_clusters - 1) / num_clusters; // Ceil division
+    t.servers_per_cluster = (n + num_clusters - 1) / num_clusters; // Ceil division
+    return t;
+}
 
-    for (int i = 0; i < n; i++) {
-        int my_cluster = i / servers_per_cluster;
-        
-        // Calculate the range of node IDs in this cluster
-        int start_node = my_cluster * servers_per_cluster;
-        int end_node = std::min(start_node + servers_per_cluster, n);
-
-        // Add all other nodes in the cluster as neighbors
-        for (int candidate = start_node; candidate < end_node; candidate++) {
-            if (candidate != i) {
-                k_nbrs[i].push_back(candidate);
-            }
-        }
+// Neighbor table needed by a policy/topology pair (only spatialKL uses one)
+inline NeighborTable build_neighbors(const std::string& policy, const std::string& topo,
+                                     int n, int k, int num_clusters) {
+    if (policy == "spatialKL") {
+        if (topo == "cycle") return generate_cycle_neighbors(n, k);
+        if (topo == "grid") return generate_grid_neighbors(n, k);
+        if (topo == "cluster") return generate_cluster_neighbors(n, num_clusters);
     }
-    return k_nbrs;
+    return NeighborTable();
 }
 
-#endif
\ No newline at end of file
+#endif
@@ -0,0 +1,90 @@
+#ifndef HISTOGRAM_HPP
+#define HISTOGRAM_HPP
+
+#include <vector>
+#include <algorithm>
+#include "Checkpoint.hpp"
+
+// Time-weighted queue-length histogram kept incrementally.
+// counts[b] is the number of servers whose queue length currently falls in
+// bin b (lengths >= nbins-1 share the overflow bin). Each bin remembers when
+// it was last flushed, so a queue-length change only touches the two bins
+// involved: O(1) per event instead of a walk over all n queues.
+class TimeWeightedHistogram {
+public:
+    TimeWeightedHistogram(int nbins = 1, int n = 0)
+        : counts(nbins, 0), area(nbins, 0.0), last(nbins, 0.0), recording(false)
+    {
+        counts[0] = n; // every server starts empty
+    }
+
+    int bin(int len) const { return std::min(len, (int)counts.size() - 1); }
+
+    // Start accumulating at time t (end of warmup)
+    void start(double t) {
+        std::fill(last.begin(), last.end(), t);
+        recording = true;
+    }
+
+    bool is_recording() const { return recording; }
+
+    // One server moves from queue length 'from' to 'to' at time t
+    void move(int from, int to, double t) {
+        int b1 = bin(from);
+        int b2 = bin(to);
+        if (b1 == b2) return;
+        if (recording) {
+            flush(b1, t);
+            flush(b2, t);
+        }
+        counts[b1]--;
+        counts[b2]++;
+    }
+
+    // Bring every bin up to time t
+    void flush_all(double t) {
+        if (!recording) return;
+        for (size_t b = 0; b < counts.size(); ++b) flush((int)b, t);
+    }
+
+    // Accumulated server-time per bin (valid after flush_all)
+    const std::vector<double>& areas() const { return area; }
+
+    // Integral of the summed bin index (queue length) up to time t, without
+    // flushing: reading it leaves the accumulated areas bit-for-bit unchanged
+    double level_area(double t) const {
+        double sum = 0.0;
+        for (size_t b = 0; b < counts.size(); ++b) {
+            sum += b * (area[b] + counts[b] * (t - last[b]));
+        }
+        return sum;
+    }
+
+    void save(CheckpointWriter& out) const {
+        out.put_vec(counts);
+        out.put_vec(area);
+        out.put_vec(last);
+        out.put<char>(recording);
+    }
+
+    bool load(CheckpointReader& in) {
+        long long nbins = (long long)counts.size();
+        bool ok = in.get_vec(counts, nbins) && in.get_vec(area, nbins) &&
+                  in.get_vec(last, nbins);
+        recording = in.get<char>() != 0;
+        return ok && in.ok();
+    }
+
+private:
+    void flush(int b, double t) {
+        area[b] += counts[b] * (t - last[b]);
+        last[b] = t;
+    }
+
+    std::vector<long long> counts;
+    std::vector<double> area;
+    std::vector<double> last;
+    bool recording;
+};
+
+#endif
@@ -0,0 +1,69 @@
+#ifndef JOBSTREAM_HPP
+#define JOBSTREAM_HPP
+
+#include <algorithm>
+#include <cmath>
+#include <random>
+#include <vector>
+
+// Common random numbers for paired runs (--paired): the jobs of one
+// replication, each an origin server, a service time and the gap to the
+// next arrival, drawn once from one generator and replayed by every
+// Simulation of the set. Only a block of jobs is held at a time; fill()
+// replaces it with the next one once every simulation has used it up, so
+// memory does not grow with m. Jobs are numbered from 0, the initial job.
+class JobStream {
+public:
+    static const int DEFAULT_BLOCK = 1 << 16;
+
+    JobStream(int n, double lambda, double mu, long long jobs, unsigned long long seed,
+              int block = DEFAULT_BLOCK)
+        : n(n), lambda(lambda), mu(mu), count(jobs), block(std::max(1, block)),
+          first(0), last(0), rng(seed) {}
+
+    // Draws the next block; false once all jobs have been drawn
+    bool fill() {
+        if (last >= count) return false;
+        first = last;
+        last = std::min(count, first + block);
+        size_t size = (size_t)(last - first);
+        origin_.resize(size);
+        duration_.resize(size);
+        gap_.resize(size);
+        std::uniform_int_distribution<int> U(0, n - 1);
+        for (size_t j = 0; j < size; ++j) {
+            origin_[j] = U(rng);
+            duration_[j] = exp_rv(mu);
+            gap_[j] = exp_rv(n * lambda);
+        }
+        return true;
+    }
+
+    long long size() const { return count; }
+    long long begin() const { return first; }
+    long long end() const { return last; }     // jobs [begin, end) are held
+
+    int origin(long long j) const { return origin_[j - first]; }
+    double duration(long long j) const { return duration_[j - first]; }
+    double gap(long long j) const { return gap_[j - first]; }   // to job j + 1
+
+private:
+    double exp_rv(double rate) {
+        std::uniform_real_distribution<double> U(0.0, 1.0);
+        return -std::log(1.0 - U(rng)) / rate;
+    }
+
+    int n;
+    double lambda;
+    double mu;
+    long long count;
+    long long block;
+    long long first;
+    long long last;
+    std::mt19937_64 rng;
+    std::vector<int> origin_;
+    std::vector<double> duration_;
+    std::vector<double> gap_;
+};
+
+#endif
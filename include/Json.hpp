@@ -0,0 +1,179 @@
+#ifndef JSON_HPP
+#define JSON_HPP
+
+#include <vector>
+#include <string>
+#include <utility>
+#include <cstdlib>
+#include <stdexcept>
+#include <cstdio>
+
+// Minimal JSON reader for configuration files (sweep specs).
+// Supports objects, arrays, strings (basic escapes), numbers, true/false/null.
+// json_escape() is the writers' side: user strings (tags, paths) in output.
+struct JsonValue {
+    enum Type { Null, Bool, Number, String, Array, Object };
+
+    Type type = Null;
+    bool boolean = false;
+    double number = 0.0;
+    std::string str;
+    std::vector<JsonValue> items;                             // Array
+    std::vector<std::pair<std::string, JsonValue>> members;   // Object, in file order
+
+    bool is_array() const { return type == Array; }
+    bool is_object() const { return type == Object; }
+
+    const JsonValue* find(const std::string& key) const {
+        for (const auto& kv : members) {
+            if (kv.first == key) return &kv.second;
+        }
+        return nullptr;
+    }
+
+    // Scalar rendered as text, e.g. to fill a string or numeric field
+    std::string as_text() const {
+        if (type == String) return str;
+        if (type == Bool) return boolean ? "true" : "false";
+        if (type == Number) {
+            char buf[64];
+            snprintf(buf, sizeof(buf), "%.17g", number);
+            return buf;
+        }
+        throw std::runtime_error("JSON: expected a scalar value");
+    }
+};
+
+class JsonParser {
+public:
+    explicit JsonParser(const std::string& text_) : text(text_), pos(0) {}
+
+    JsonValue parse() {
+        JsonValue v = value();
+        skip_ws();
+        if (pos != text.size()) fail("trailing characters");
+        return v;
+    }
+
+private:
+    [[noreturn]] void fail(const std::string& what) const {
+        throw std::runtime_error("JSON: " + what + " at offset " + std::to_string(pos));
+    }
+
+    void skip_ws() {
+        while (pos < text.size() && (text[pos] == ' ' || text[pos] == '\t' ||
+                                     text[pos] == '\n' || text[pos] == '\r')) pos++;
+    }
+
+    bool consume(char c) {
+        skip_ws();
+        if (pos < text.size() && text[pos] == c) { pos++; return true; }
+        return false;
+    }
+
+    void expect(char c) {
+        if (!consume(c)) fail(std::string("expected '") + c + "'");
+    }
+
+    JsonValue value() {
+        skip_ws();
+        if (pos >= text.size()) fail("unexpected end of input");
+        char c = text[pos];
+        JsonValue v;
+        if (c == '{') {
+            pos++;
+            v.type = JsonValue::Object;
+            if (consume('}')) return v;
+            do {
+                skip_ws();
+                std::string key = string_literal();
+                expect(':');
+                v.members.emplace_back(key, value());
+            } while (consume(','));
+            expect('}');
+        } else if (c == '[') {
+            pos++;
+            v.type = JsonValue::Array;
+            if (consume(']')) return v;
+            do {
+                v.items.push_back(value());
+            } while (consume(','));
+            expect(']');
+        } else if (c == '"') {
+            v.type = JsonValue::String;
+            v.str = string_literal();
+        } else if (text.compare(pos, 4, "true") == 0) {
+            pos += 4; v.type = JsonValue::Bool; v.boolean = true;
+        } else if (text.compare(pos, 5, "false") == 0) {
+            pos += 5; v.type = JsonValue::Bool; v.boolean = false;
+        } else if (text.compare(pos, 4, "null") == 0) {
+            pos += 4;
+        } else {
+            const char* begin = text.c_str() + pos;
+            char* end = nullptr;
+            v.number = std::strtod(begin, &end);
+            if (end == begin) fail("invalid value");
+            v.type = JsonValue::Number;
+            pos += end - begin;
+        }
+        return v;
+    }
+
+    std::string string_literal() {
+        if (pos >= text.size() || text[pos] != '"') fail("expected string");
+        pos++;
+        std::string out;
+        while (pos < text.size() && text[pos] != '"') {
+            char c = text[pos++];
+            if (c == '\\' && pos < text.size()) {
+                char e = text[pos++];
+                switch (e) {
+                    case 'n': out += '\n'; break;
+                    case 't': out += '\t'; break;
+                    case 'r': out += '\r'; break;
+                    case 'b': out += '\b'; break;
+                    case 'f': out += '\f'; break;
+                    default:  out += e; break;   // \" \\ \/
+                }
+            } else {
+                out += c;
+            }
+        }
+        if (pos >= text.size()) fail("unterminated string");
+        pos++;
+        return out;
+    }
+
+    const std::string& text;
+    size_t pos;
+};
+
+// Contents of a JSON string literal for 'text' (without the quotes)
+inline std::string json_escape(const std::string& text) {
+    std::string out;
+    out.reserve(text.size());
+    for (char c : text) {
+        switch (c) {
+            case '"':  out += "\\\""; break;
+            case '\\': out += "\\\\"; break;
+            case '\n': out += "\\n"; break;
+            case '\r': out += "\\r"; break;
+            case '\t': out += "\\t"; break;
+            default:
+                if ((unsigned char)c < 0x20) {
+                    char buf[8];
+                    snprintf(buf, sizeof(buf), "\\u%04x", (unsigned char)c);
+                    out += buf;
+                } else {
+                    out += c;
+                }
+        }
+    }
+    return out;
+}
+
+inline JsonValue parse_json(const std::string& text) {
+    return JsonParser(text).parse();
+}
+
+#endif
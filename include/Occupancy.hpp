@@ -0,0 +1,88 @@
+#ifndef OCCUPANCY_HPP
+#define OCCUPANCY_HPP
+
+#include <vector>
+#include "Checkpoint.hpp"
+
+// Server occupancy counts for the Occupancy engine: counts[l] is the number
+// of servers with exactly l jobs. Under pot / poKL servers are exchangeable,
+// so this vector is the whole state, and its size depends on the longest
+// queue, not on n. A Fenwick tree over the counts finds the length of the
+// r-th server in queue-length order in O(log levels), which is how a
+// uniformly random (or uniformly random busy) server is drawn. The levels
+// double on the rare queue that outgrows them.
+class OccupancyCounts {
+public:
+    OccupancyCounts(int levels = 1, long long n = 0) { reset(levels, n); }
+
+    // All n servers empty, room for lengths below 'levels'
+    void reset(int levels, long long n) {
+        size = 1;
+        while (size < levels) size *= 2;
+        counts.assign(size, 0);
+        counts[0] = n;
+        jobs = 0;
+        rebuild();
+    }
+
+    long long count(int len) const { return len < size ? counts[len] : 0; }
+    long long total_jobs() const { return jobs; }
+
+    // 'delta' servers gain (or, negative, lose) queue length 'len'
+    void add(int len, long long delta) {
+        if (len >= size) grow(len + 1);
+        counts[len] += delta;
+        jobs += delta * len;
+        for (int i = len + 1; i <= size; i += i & -i) tree[i] += delta;
+    }
+
+    // Queue length of the server with rank r (0-based) when servers are
+    // ordered by queue length: the smallest l with count(0..l) > r
+    int find(long long r) const {
+        int pos = 0;
+        for (int step = size; step > 0; step >>= 1) {
+            if (pos + step <= size && tree[pos + step] <= r) {
+                pos += step;
+                r -= tree[pos];
+            }
+        }
+        return pos;
+    }
+
+    void save(CheckpointWriter& out) const { out.put_vec(counts); }
+
+    bool load(CheckpointReader& in) {
+        if (!in.get_vec(counts)) return false;
+        size = 1;
+        while (size < (int)counts.size()) size *= 2;
+        counts.resize(size, 0);
+        jobs = 0;
+        for (int l = 0; l < size; ++l) jobs += l * counts[l];
+        rebuild();
+        return in.ok();
+    }
+
+private:
+    void grow(int levels) {
+        while (size < levels) size *= 2;
+        counts.resize(size, 0);
+        rebuild();
+    }
+
+    // O(levels) Fenwick construction from 'counts'
+    void rebuild() {
+        tree.assign(size + 1, 0);
+        for (int i = 1; i <= size; ++i) {
+            tree[i] += counts[i - 1];
+            int parent = i + (i & -i);
+            if (parent <= size) tree[parent] += tree[i];
+        }
+    }
+
+    int size;                        // levels, a power of two
+    std::vector<long long> counts;
+    std::vector<long long> tree;     // 1-based Fenwick tree over counts
+    long long jobs;                  // sum of l * counts[l]
+};
+
+#endif
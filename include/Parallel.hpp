@@ -0,0 +1,66 @@
+#ifndef PARALLEL_HPP
+#define PARALLEL_HPP
+
+#include <string>
+#include "Simulation.hpp"
+#include "Graph.hpp"
+
+// Synchronization counters of a ParallelSimulation run
+struct ParallelStats {
+    int lps = 0;                  // logical processes (one thread each)
+    double window = 0.0;          // synchronization window, simulated time
+    long long windows = 0;
+    long long messages = 0;       // dispatches to a server of another process
+    long long in_flight = 0;      // of those, still in transfer when the run ended
+};
+
+// Conservative parallel simulation of the cluster topology (--engine pdes).
+// Whole clusters are dealt to 'lps' logical processes, each a contiguous
+// range of servers run by its own thread. A process owns the queues of its
+// servers, the arrivals whose origin is one of them (Poisson of rate lambda
+// per server) and a heap of their completions, exactly as the Heap engine.
+// Processes advance in lockstep windows of 'window' time units with one
+// barrier per window:
+//   - queue lengths of other processes' servers are read from a snapshot
+//     taken at the last window boundary;
+//   - a job sent to another process's server is a timestamped message that
+//     joins its queue 'window' later. That delay is the lookahead: every
+//     message lands in the receiver's next window, never in its past.
+// The stale snapshot and the transfer delay are the whole difference to the
+// sequential engines, and both vanish as window -> 0. Warmup and the end of
+// the run are decided at window boundaries from the total arrival count, so
+// a run overshoots m by at most one window of arrivals. Response times run
+// from a job's arrival at its origin, transfer included, and the
+// processes' sketches are merged at the end. After the last window each
+// process serves out its queued jobs and those still in transfer to it
+// (stats().in_flight) without arrivals, so that every job gets a response
+// time; the queue statistics end with the last window. Results depend only
+// on the seed, lps and window, not on thread timing.
+class ParallelSimulation {
+public:
+    ParallelSimulation(int n, double lambda, long long m, double mu,
+                       const std::string& policy, const NeighborTable& k_nbrs,
+                       int k, int L, int qmax, int num_clusters, double comm_cost,
+                       unsigned long long seed, int lps, double window);
+
+    SimulationResult run();
+
+    const ParallelStats& stats() const { return stats_; }
+
+private:
+    int n;
+    double lambda_;
+    long long m;
+    double mu_;
+    Policy policy_id;
+    const NeighborTable* k_nbrs;  // shared, read-only; owned by the caller
+    int k;
+    int L;
+    int qmax;
+    int num_clusters;
+    double comm_cost;
+    unsigned long long seed;
+    ParallelStats stats_;
+};
+
+#endif
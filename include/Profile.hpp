@@ -0,0 +1,188 @@
+#ifndef PROFILE_HPP
+#define PROFILE_HPP
+
+#include <cstdint>
+#include <chrono>
+#include <algorithm>
+#if defined(__x86_64__) || defined(__i386__)
+#include <x86intrin.h>
+#endif
+
+// Hot-path instrumentation of Simulation::run(), compiled in with
+// `make PROFILE=1` (-DLOADBAL_PROFILE; run `make clean` when switching).
+// Without it every PROF_* macro expands to nothing, so the event loop is
+// exactly the uninstrumented one and Profile stays all zeros.
+//
+// Phase timers count TSC cycles on x86, steady_clock nanoseconds elsewhere;
+// ticks_per_second, measured over the event loop, converts them to seconds.
+// Timing is exclusive: a phase entered inside another (exp_rv while finding
+// the next event) pauses it, so every tick goes to exactly one phase.
+// Reading the counter costs tens of nanoseconds (more under
+// virtualization), so only every PROFILE_SAMPLE_EVENTS-th event is timed,
+// as a whole: what no phase covers (branching) goes to PHASE_OTHER, and
+// the cost of the counter reads (calibrated once per run) to none. The
+// sampled ticks are then scaled to the loop time, so the phases add up to
+// loop_ticks;
+// calls and all counters are exact. Bookkeeping runs at fixed event counts
+// that would alias with the sampling, and rarely, so it is always timed.
+enum ProfilePhase {
+    PHASE_NEXT_EVENT,     // finding the next completion (scan or heap top)
+    PHASE_CLOCK,          // advancing the clock (the Scan engine's per-server decrement)
+    PHASE_CHOOSE_NODE,    // candidate sampling and selection
+    PHASE_HISTOGRAM,      // queue-length changes and their histogram update
+    PHASE_EVENT_QUEUE,    // starting / stopping service (heap push / remove)
+    PHASE_EXP_RV,         // exponential variates
+    PHASE_TRACE,          // reading the job trace
+    PHASE_BOOKKEEPING,    // block boundaries, checkpoints, telemetry
+    NUM_PHASES,
+    PHASE_OTHER = NUM_PHASES  // the rest of a sampled event
+};
+
+static const int PROFILE_SAMPLE_EVENTS = 64;
+
+static const char* const PROFILE_PHASE_NAMES[NUM_PHASES] = {
+    "next_event", "clock_advance", "choose_node", "histogram",
+    "event_queue", "exp_rv", "trace", "bookkeeping",
+};
+
+inline uint64_t profile_ticks() {
+#if defined(__x86_64__) || defined(__i386__)
+    return __rdtsc();
+#else
+    return (uint64_t)std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count();
+#endif
+}
+
+struct Profile {
+    bool timing = false;               // time phases during the current event
+    int active = -1;                   // phase being timed, -1 if none
+    uint64_t since = 0;                // when 'active' was entered or resumed
+    uint64_t overhead = 0;             // ticks of one counter read
+    uint64_t ticks[NUM_PHASES + 1] = {};   // raw, see phase_ticks(); + other
+    uint64_t calls[NUM_PHASES] = {};
+    uint64_t loop_ticks = 0;
+    double loop_seconds = 0.0;
+    long long events = 0;
+    long long arrivals = 0;
+    long long departures = 0;
+    long long rejection_retries = 0;   // candidate draws rejected as already picked
+    long long dense_samples = 0;       // sample_distinct calls that used Fisher-Yates
+    long long candidates_scored = 0;
+    long long heap_allocs = 0;
+
+    double ticks_per_second() const {
+        return loop_seconds > 0 ? loop_ticks / loop_seconds : 0.0;
+    }
+
+    static bool always_timed(int phase) { return phase == PHASE_BOOKKEEPING; }
+
+    // Estimated ticks of a phase (or PHASE_OTHER) over all events: the
+    // sampled ones share the loop time that bookkeeping leaves
+    double phase_ticks(int phase) const {
+        if (always_timed(phase)) return (double)ticks[phase];
+        double sampled = 0.0;
+        for (int i = 0; i <= NUM_PHASES; ++i) {
+            if (!always_timed(i)) sampled += ticks[i];
+        }
+        double rest = (double)(loop_ticks - std::min(loop_ticks, ticks[PHASE_BOOKKEEPING]));
+        if (sampled == 0) return phase == PHASE_OTHER ? rest : 0.0;
+        return rest * ticks[phase] / sampled;
+    }
+
+    // Ends the interval of the active phase and starts timing 'phase' (-1:
+    // none). The counter read closing an interval is left out: unsampled
+    // events do not pay for it.
+    void switch_to(int phase) {
+        uint64_t now = profile_ticks();
+        if (active >= 0) {
+            uint64_t d = now - since;
+            ticks[active] += d > overhead ? d - overhead : 0;
+        }
+        active = phase;
+        since = now;
+    }
+
+    // Totals over replications
+    void add(const Profile& o) {
+        for (int i = 0; i <= NUM_PHASES; ++i) ticks[i] += o.ticks[i];
+        for (int i = 0; i < NUM_PHASES; ++i) calls[i] += o.calls[i];
+        loop_ticks += o.loop_ticks;
+        loop_seconds += o.loop_seconds;
+        events += o.events;
+        arrivals += o.arrivals;
+        departures += o.departures;
+        rejection_retries += o.rejection_retries;
+        dense_samples += o.dense_samples;
+        candidates_scored += o.candidates_scored;
+        heap_allocs += o.heap_allocs;
+    }
+};
+
+// Smallest tick difference between two back-to-back counter reads
+inline uint64_t profile_timer_overhead() {
+    uint64_t best = ~0ULL;
+    for (int i = 0; i < 1000; ++i) {
+        uint64_t t0 = profile_ticks();
+        uint64_t t1 = profile_ticks();
+        best = std::min(best, t1 - t0);
+    }
+    return best;
+}
+
+#ifdef LOADBAL_PROFILE
+
+static const bool PROFILE_ENABLED = true;
+
+// Counts a call of one phase and, on sampled events, times it from
+// construction to destruction, pausing the phase it interrupts
+class ProfileScope {
+public:
+    ProfileScope(Profile& p, ProfilePhase ph)
+        : prof(p), phase(ph), timed(p.timing || Profile::always_timed(ph)), parent(p.active) {
+        if (timed) prof.switch_to(phase);
+    }
+    ~ProfileScope() {
+        if (timed) prof.switch_to(parent);
+        prof.calls[phase]++;
+    }
+private:
+    Profile& prof;
+    ProfilePhase phase;
+    bool timed;
+    int parent;
+};
+
+// One iteration of the event loop: decides whether it is sampled and, if
+// so, times it as a whole (PHASE_OTHER outside the phases)
+class ProfileEvent {
+public:
+    explicit ProfileEvent(Profile& p) : prof(p) {
+        prof.timing = (prof.events++ % PROFILE_SAMPLE_EVENTS) == 0;
+        if (prof.timing) prof.switch_to(PHASE_OTHER);
+    }
+    ~ProfileEvent() {
+        if (prof.timing) prof.switch_to(-1);
+        prof.timing = false;
+    }
+private:
+    Profile& prof;
+};
+
+#define PROF_CONCAT_(a, b) a##b
+#define PROF_CONCAT(a, b) PROF_CONCAT_(a, b)
+#define PROF_SCOPE(prof, phase) ProfileScope PROF_CONCAT(prof_scope_, __LINE__)(prof, phase)
+#define PROF_EVENT(prof) ProfileEvent PROF_CONCAT(prof_event_, __LINE__)(prof)
+#define PROF_COUNT(expr) (expr)
+
+#else
+
+static const bool PROFILE_ENABLED = false;
+
+#define PROF_SCOPE(prof, phase) ((void)0)
+#define PROF_EVENT(prof) ((void)0)
+#define PROF_COUNT(expr) ((void)0)
+
+#endif
+
+#endif
@@ -0,0 +1,38 @@
+#ifndef RESULT_STORE_HPP
+#define RESULT_STORE_HPP
+
+#include <string>
+#include "Runner.hpp"
+
+struct sqlite3;
+struct sqlite3_stmt;
+
+// Append-only SQLite database of finished runs, one row per configuration.
+// Columns carry every parameter and metric under its _metrics.json name,
+// plus 'hist' (the histogram as a little-endian float64 blob, full
+// precision) and 'record' (the complete one-line JSON record, including
+// confidence intervals and per-replication values).
+// Several processes may append to the same file; writes are serialized by
+// SQLite with a busy timeout. scripts/results_store.py reads it back.
+//
+// Built only when the Makefile has SQLITE=1 (the default); otherwise open()
+// reports that the store is unavailable.
+class ResultStore {
+public:
+    ResultStore() = default;
+    ~ResultStore();
+    ResultStore(const ResultStore&) = delete;
+    ResultStore& operator=(const ResultStore&) = delete;
+
+    // Opens (creating if needed) the database and its 'runs' table
+    bool open(const std::string& path);
+    bool append(const RunReport& report);
+
+private:
+    void close();
+
+    sqlite3* db = nullptr;
+    sqlite3_stmt* insert = nullptr;
+};
+
+#endif
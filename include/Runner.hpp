@@ -0,0 +1,130 @@
+#ifndef RUNNER_HPP
+#define RUNNER_HPP
+
+#include <vector>
+#include <string>
+#include <ostream>
+#include <functional>
+#include <memory>
+#include "Simulation.hpp"
+#include "Parallel.hpp"
+#include "Graph.hpp"
+#include "ThreadPool.hpp"
+#include "Trace.hpp"
+#include "Telemetry.hpp"
+
+// A further policy / k / L of a paired run
+struct PairedArm {
+    std::string policy;
+    int k = 1;
+    int L = 1;
+};
+
+// Parses "policy:k:L[,policy:k:L...]" (--paired); throws std::invalid_argument
+std::vector<PairedArm> parse_paired_arms(const std::string& spec);
+
+// Everything needed to build a Simulation, as given on the command line
+struct SimConfig {
+    int n = 1000;
+    long long m = 100000;
+    double lambda = 0.9;
+    double mu = 1.0;
+    std::string policy = "pot";
+    std::string topo = "cycle";
+    int k = 1;
+    int L = 1;
+    int qmax = 100;
+    int num_clusters = 1;
+    double comm_cost = 0.0;
+    std::string trace_file;
+    std::string engine = "scan";
+    unsigned long long seed = 123456789ULL;
+    int replications = 1;
+    double target_rel_error = 0.0;   // > 0: stop each replication at this precision
+    int lps = 0;                      // pdes engine: logical processes (0 = cores left by the pool)
+    double window = 0.0;              // pdes engine: synchronization window (0 = 0.05 / mu)
+    bool compare_sequential = false;  // pdes engine: also run the heap engine on each seed
+    std::vector<PairedArm> paired;    // further configurations on the same job streams
+    std::string tag;
+
+    // Checkpointing of long runs (command line only; does not affect results)
+    std::string checkpoint;           // checkpoint file, see checkpoint_file()
+    long long checkpoint_events = 0;  // save every this many events ...
+    double checkpoint_seconds = 0.0;  // ... and/or this many seconds of wall time
+    bool resume = false;              // continue from the existing checkpoints
+};
+
+// Results of all replications of one configuration
+struct RunReport {
+    SimConfig config;
+    std::vector<unsigned long long> seeds;
+    std::vector<SimulationResult> reps;
+    std::vector<double> rep_seconds;
+    SimulationResult combined;     // replication average (hist, means)
+    int threads = 1;
+    double setup_seconds = 0.0;
+    double run_seconds = 0.0;
+    size_t neighbor_bytes = 0;
+    long peak_rss_kb = 0;
+    int failed = 0;                // replications whose checkpoint could not be resumed
+
+    // pdes engine, per replication: synchronization counters and, with
+    // compare_sequential, the heap engine's result on the same seed
+    std::vector<ParallelStats> parallel;
+    std::vector<SimulationResult> sequential;
+    std::vector<double> sequential_seconds;
+
+    // Paired runs: one report per arm, on the same seeds and job streams
+    std::vector<RunReport> paired;
+};
+
+// Seed of replication r: the base seed itself for r = 0, otherwise a
+// splitmix64 hash of (base, r) so that streams are unrelated.
+unsigned long long replication_seed(unsigned long long base, int r);
+
+// Checkpoint file of replication r: cfg.checkpoint itself for r = 0,
+// otherwise with ".r<r>" appended. Empty when checkpointing is off.
+std::string checkpoint_file(const SimConfig& cfg, int r);
+
+// Name of a run in telemetry: its tag, or policy_topo_n<n>_lam<lambda>
+std::string run_name(const SimConfig& cfg);
+
+// Queues cfg.replications independently seeded replications on 'pool' and
+// returns immediately. All of them read the same neighbor table and trace
+// (trace may be null), which must outlive the run. 'on_done' is called once,
+// on the worker thread that finishes the last replication. With a
+// 'telemetry' sink, every replication reports its start, progress and end.
+void submit_replications(const SimConfig& cfg, const NeighborTable& k_nbrs,
+                         const Trace* trace, ThreadPool& pool,
+                         std::function<void(RunReport&)> on_done,
+                         Telemetry* telemetry = nullptr);
+
+// Blocking version of submit_replications
+RunReport run_replications(const SimConfig& cfg, const NeighborTable& k_nbrs,
+                           const Trace* trace, ThreadPool& pool,
+                           Telemetry* telemetry = nullptr);
+
+// Configuration of arm i of a paired run: cfg with the arm's policy, k and L
+SimConfig paired_config(const SimConfig& cfg, size_t i);
+
+// Paired run with common random numbers: every replication draws one
+// JobStream (arrivals, origins, service times) from its seed, and the base
+// configuration and every arm of cfg.paired replay it in lockstep, so they
+// differ only in where jobs are sent. arm_nbrs[i] is arm i's neighbor
+// table. Returns the base configuration's report with the arms' reports in
+// 'paired'. Replications run in parallel on 'pool'.
+RunReport run_paired(const SimConfig& cfg, const NeighborTable& k_nbrs,
+                     const std::vector<const NeighborTable*>& arm_nbrs,
+                     ThreadPool& pool, Telemetry* telemetry = nullptr);
+
+void write_hist_csv(const std::vector<double>& hist, const std::string& path);
+
+// Metrics record of a run. 'pretty' writes the indented multi-line layout of
+// _metrics.json; otherwise the record is a single line (for JSON-lines
+// output) and also carries the histogram.
+void write_metrics_json(const RunReport& report, std::ostream& out, bool pretty = true);
+
+// Peak resident set size of this process in kilobytes
+long peak_rss_kb();
+
+#endif
@@ -5,6 +5,19 @@
 #include <string>
 #include <random>
 #include <iostream>
+#include <chrono>
+#include <cstdint>
+#include "Checkpoint.hpp"
+#include "EventHeap.hpp"
+#include "Telemetry.hpp"
+#include "Profile.hpp"
+#include "Histogram.hpp"
+#include "Occupancy.hpp"
+#include "Fifo.hpp"
+#include "Sketch.hpp"
+#include "Distance.hpp"
+#include "Trace.hpp"
+#include "JobStream.hpp"
 
 struct SimulationResult {
     std::vector<double> hist;     
@@ -12,38 +25,95 @@ struct SimulationResult {
     double mean_Q;          
     double mean_W;          
     double avg_req_dist;          
+    long long loop_heap_allocs;   // heap allocations made inside the event loop
+    long long jobs_used;          // arrivals simulated
+    long long warmup_jobs;        // leading arrivals discarded as warmup
+    long long events;             // arrival and departure events simulated
+    double rel_error;             // achieved 95% CI half-width of mean_Q / mean_Q
+                                  // (sequential mode only, otherwise -1)
+    int batches;                  // batches behind rel_error
+    Profile profile;              // hot-path counters (make PROFILE=1, else zeros)
+    QuantileSketch response;      // per-job response times of the recorded jobs,
+                                  // including those still queued at the end
 };
 
-struct TraceJob {
-    double inter_arrival_time;
-    double duration;
-};
+
+// Event engine used by Simulation::run()
+//   Scan : linear search for the next completion and per-event clock decrement
+//   Heap : absolute completion timestamps in an indexed heap, O(log n) per event
+//   Occupancy : only the number of servers at each queue length (pot / poKL,
+//          whose servers are exchangeable); memory and time per event do not
+//          depend on n. Departures occur at rate mu * (busy servers), so the
+//          results agree with the other engines in distribution only.
+// The cluster topology also has a multi-threaded engine, ParallelSimulation
+// (Parallel.hpp, --engine pdes), which is a separate class.
+enum class Engine { Scan, Heap, Occupancy };
+
+// Why 'engine' cannot simulate a configuration, or "" if it can
+std::string engine_error(const std::string& engine, const std::string& policy,
+                         const std::string& topology, bool trace);
+
+// Policy / topology names resolved once at construction
+enum class Policy { Pot, PoKL, SpatialKL, Unknown };
 
 class Simulation {
 public:
     // Constructor
-    Simulation(int n_, double lambda__, int m_, double mu__,
+    Simulation(int n_, double lambda__, long long m_, double mu__,
                const std::string &policy_,
                const std::string &topology_,
-               const std::vector<std::vector<int>> &dist_,
-               const std::vector<std::vector<int>> &k_nbrs_,
+               const NeighborTable &k_nbrs_,
                int k_, int L_, int qmax_,
                int num_clusters_ = 1, 
                double comm_cost_ = 0.0,
-               const std::string& trace_file_path = "");
+               const Trace* trace_ = nullptr,
+               const std::string& engine_ = "scan",
+               unsigned long long seed_ = 123456789ULL,
+               double target_rel_error_ = 0.0,
+               const JobStream* jobs_ = nullptr);
 
     SimulationResult run();
 
+    // Paired runs. With a job stream (filled, shared with the other
+    // simulations of the set), arrivals, origins and service times come
+    // from the stream instead of this simulation's generator, which then
+    // only drives the policy's candidate sampling. A job's service time
+    // stays with it while it waits. advance() runs the event loop until the
+    // stream's block is used up (false: fill the next block and call again)
+    // or the run ends (true); result() then post-processes like run().
+    // Results do not depend on the block size.
+    bool advance();
+    SimulationResult result();
+
+    // Checkpointing. With a path set, run() saves the complete simulation
+    // state there every 'every_events' events and/or every 'every_seconds'
+    // of wall time (0 disables either; the clock is read every few thousand
+    // events), and once more when the event loop ends. Files are replaced
+    // atomically, so a killed run always leaves a complete checkpoint.
+    void set_checkpoint(const std::string& path, long long every_events, double every_seconds);
+
+    // Restores a checkpoint into a freshly constructed Simulation with the
+    // same parameters (seed included). run() then continues from where the
+    // checkpoint was taken and returns bit-for-bit the result of the
+    // uninterrupted run. Returns false, with the reason in 'error', if the
+    // file is unreadable or was written for a different configuration.
+    bool resume(const std::string& path, std::string& error);
+
+    // Progress lines (see Telemetry.hpp) every sink->interval seconds while
+    // run() is in its event loop, labelled with 'run' and 'rep'. Reading the
+    // running statistics does not change them: results are identical with
+    // and without telemetry.
+    void set_telemetry(Telemetry* sink, const std::string& run, int rep);
+
 private:
     int n;
     double lambda_;
-    int m;
+    long long m;
     double mu_;
     std::string policy;
     std::string topology;
     
-    std::vector<std::vector<int>> dist;
-    std::vector<std::vector<int>> k_nbrs;
+    const NeighborTable* k_nbrs;  // shared, read-only; owned by the caller
     int k;
     int L;
     int qmax;
@@ -52,26 +122,139 @@ private:
     int num_clusters;
     double comm_cost;
 
+    Engine engine;
+    Policy policy_id;
+    Topology topology_id;
+
+    // Dispatch table for choose_node, filled in by the constructor
+    void (Simulation::*sample_candidates)(int s);
+    int (Simulation::*select_candidate)(int s);
+
+    DistanceOracle oracle;
+
+    // Reusable scratch space for candidate sampling (no allocation per arrival)
+    std::vector<int> candidates;
+    std::vector<unsigned> mark;   // mark[v] == epoch  <=>  v already picked
+    unsigned epoch;
+    int picked;                   // distinct servers in 'candidates'
+    std::vector<int> perm;        // identity permutation for dense sampling
+    std::vector<int> perm_pos;    // inverse of perm
+    std::vector<int> swap_log;
+    std::vector<double> cand_dist;
+
     double T;
+    double now;                  // absolute simulation clock
     std::vector<int> q;
-    std::vector<double> s_time;
+    std::vector<double> s_time;  // Scan: residual service time, Heap: completion time
+    ServerFifos fifos;           // arrival times of the queued jobs (not Occupancy)
+    ServerFifos sizes;           // paired runs: service times of the waiting jobs
+    QuantileSketch response;
+    EventHeap events;            // busy servers keyed by completion time (Heap engine)
+    OccupancyCounts occ;         // servers per queue length (Occupancy engine)
+    bool joined_own;             // Occupancy: the arrival stayed at its own server
+    int occ_width;               // Occupancy on the grid: columns (distances
+                                 // without the oracle's per-server tables)
     double t_arr;
     double req_dist;
-    std::vector<double> q_mid_hist;
-    int arrivals_recorded;
+    TimeWeightedHistogram q_mid_hist;
+    long long arrivals_recorded;
 
     // Trace Data
-    std::vector<TraceJob> trace_jobs;
+    const Trace* trace;           // shared, read-only; owned by the caller
     size_t trace_idx;
     bool use_trace;
+    const JobStream* jobs;        // paired runs; shared, owned by the caller
 
+    unsigned long long seed;
     std::mt19937_64 rng;
 
+    // Event loop progress (members so that a checkpoint captures them)
+    long long arrivals;
+    double stats_start;          // start of the recorded interval
+    double end_time;             // and its end: the last event before drain()
+    bool finished;               // event loop done (set in a final checkpoint)
+    bool resumed;
+    bool started;                // advance() has been called
+    long long loop_allocs;       // event-loop allocations of earlier segments
+    std::uint64_t alloc_base;    // heap_alloc_count() at the start of this segment
+
+    // Checkpoint and telemetry cadence. Both are handled by tick(), called
+    // every check_interval events of the loop.
+    std::string checkpoint_path;
+    long long checkpoint_events;
+    double checkpoint_seconds;
+    int check_interval;          // events between ticks, 0 = no ticks
+    int check_countdown;
+    long long events_done;       // events processed by this run() call
+    long long events_since_checkpoint;
+    std::chrono::steady_clock::time_point last_checkpoint;
+    Telemetry* telemetry;
+    std::string telemetry_prefix;   // start of every progress line
+    std::chrono::steady_clock::time_point run_start, last_report;
+    long long events_at_report;
+    long long arrivals_at_start;
+    bool checkpoint_warned;
+    std::string config_key;      // serialized parameters, must match on resume
+    CheckpointWriter checkpoint_buf;
+
+    Profile prof;                // filled only with LOADBAL_PROFILE (this run() call)
+
+    // Sequential stopping (target_rel_error > 0). The run is cut into blocks
+    // of block_jobs arrivals; a boundary snapshot is kept at the end of each
+    // block, and adjacent blocks are merged when there are too many. Warmup
+    // is chosen by MSER-5 and precision by batch means over the snapshots.
+    // A boundary's response snapshot holds the jobs that arrived by then:
+    // those that had left, plus the ones that leave later (remove_job).
+    struct Boundary {
+        double t;                 // simulation time
+        double q_area;            // integral of total queue length (from histogram)
+        double req_dist;          // cumulative request distance
+        long long arrivals;
+        long long recorded;       // cumulative arrivals_recorded
+        uint64_t responses;       // jobs in the response snapshot
+        double response_sum;      // and their total response time
+    };
+    double target_rel_error;
+    long long block_jobs;
+    long long next_boundary;
+    std::vector<Boundary> boundaries;
+    std::vector<double> boundary_hist;   // histogram areas at each boundary, row-major
+    std::vector<uint64_t> boundary_resp; // response sketch buckets at each boundary
+    std::vector<double> batch_means;     // scratch for MSER / batch means
+    int trunc_block;
+    double achieved_rel_error;
+    int batches_used;
+
     double exp_rv(double rate);
+    void add_job(int i);
+    void remove_job(int i);
+    void record_response(double arrived);
+    void drain();
+    void start_service(int i, double duration);
+    void stop_service(int i);
     int choose_node(int s);
-    double calculate_distance(int u, int v); 
-    int get_cluster_id(int node_index) const;
-    void load_trace(const std::string& filepath);
+    int choose_length();
+    double random_distance();
+    void join_length(int len);
+    void leave_length(int len);
+    void new_pick_set();
+    void pick(int v);
+    void sample_distinct(int count);
+    void sample_pot(int s);
+    void sample_pokl(int s);
+    void sample_spatial(int s);
+    void sample_spatial_cluster(int s);
+    int select_min_queue(int s);
+    int select_min_cost(int s);
+    void record_boundary(long long arrivals);
+    bool block_boundary();
+    bool estimate_precision(bool final_estimate);
+    double block_mean(int a, int b) const;
+    void schedule_ticks();
+    void tick();
+    void report_progress(std::chrono::steady_clock::time_point t);
+    void write_checkpoint();
+    void save_state(CheckpointWriter& out) const;
 };
 
 #endif
\ No newline at end of file
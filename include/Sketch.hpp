@@ -0,0 +1,131 @@
+#ifndef SKETCH_HPP
+#define SKETCH_HPP
+
+#include <vector>
+#include <cmath>
+#include <cstdint>
+#include <algorithm>
+#include "Checkpoint.hpp"
+
+// Fixed-memory quantile sketch of positive values, log-linear like an HDR
+// histogram: every power of two [2^(e-1), 2^e) is split into SUB_BUCKETS
+// equal buckets, so a quantile is off by less than 1/SUB_BUCKETS of its
+// value (0.8%) over the whole range 2^MIN_EXPONENT .. 2^MAX_EXPONENT.
+// Values outside the range go to the first / last bucket. Sketches merge by
+// adding counts, so replications and parallel partitions combine exactly as
+// if all values had been added to one sketch.
+class QuantileSketch {
+public:
+    static const int SUB_BUCKETS = 128;
+    static const int MIN_EXPONENT = -20;   // about 1e-6
+    static const int MAX_EXPONENT = 44;    // about 1.8e13
+    static const int BUCKETS = (MAX_EXPONENT - MIN_EXPONENT + 1) * SUB_BUCKETS;
+
+    QuantileSketch() : counts(BUCKETS, 0), total(0), sum_v(0.0), min_v(0.0), max_v(0.0) {}
+
+    static int bucket(double v) {
+        if (!(v > 0)) return 0;
+        int e;
+        double f = std::frexp(v, &e);    // v = f * 2^e, f in [0.5, 1)
+        if (e < MIN_EXPONENT) return 0;
+        if (e > MAX_EXPONENT) return BUCKETS - 1;
+        int sub = std::min(SUB_BUCKETS - 1, (int)((f - 0.5) * 2 * SUB_BUCKETS));
+        return (e - MIN_EXPONENT) * SUB_BUCKETS + sub;
+    }
+
+    // Midpoint of a bucket
+    static double value(int b) {
+        int e = b / SUB_BUCKETS + MIN_EXPONENT;
+        double f = 0.5 + (b % SUB_BUCKETS + 0.5) / (2.0 * SUB_BUCKETS);
+        return std::ldexp(f, e);
+    }
+
+    // Lower edge of a bucket (BUCKETS: the top of the range)
+    static double lower(int b) {
+        int e = b / SUB_BUCKETS + MIN_EXPONENT;
+        return std::ldexp(0.5 + (b % SUB_BUCKETS) / (2.0 * SUB_BUCKETS), e);
+    }
+
+    void add(double v) {
+        counts[bucket(v)]++;
+        min_v = total ? std::min(min_v, v) : v;
+        max_v = total ? std::max(max_v, v) : v;
+        total++;
+        sum_v += v;
+    }
+
+    void merge(const QuantileSketch& o) {
+        if (!o.total) return;
+        for (int b = 0; b < BUCKETS; ++b) counts[b] += o.counts[b];
+        min_v = total ? std::min(min_v, o.min_v) : o.min_v;
+        max_v = total ? std::max(max_v, o.max_v) : o.max_v;
+        total += o.total;
+        sum_v += o.sum_v;
+    }
+
+    // Takes out values added earlier, given as their bucket counts (BUCKETS
+    // of them), number and sum. The extremes are narrowed to the buckets
+    // that are left, so they stay exact unless their own bucket emptied.
+    void subtract(const uint64_t* out, uint64_t n, double s) {
+        if (!n) return;
+        for (int b = 0; b < BUCKETS; ++b) counts[b] -= out[b];
+        total -= n;
+        sum_v -= s;
+        if (!total) {
+            sum_v = min_v = max_v = 0.0;
+            return;
+        }
+        int lo = 0, hi = BUCKETS - 1;
+        while (!counts[lo]) ++lo;
+        while (!counts[hi]) --hi;
+        // The end buckets also hold the values outside the range
+        if (lo > 0) min_v = std::max(min_v, lower(lo));
+        if (hi < BUCKETS - 1) max_v = std::min(max_v, lower(hi + 1));
+    }
+
+    long long count() const { return (long long)total; }
+    double sum() const { return sum_v; }
+    double mean() const { return total ? sum_v / total : 0.0; }
+    double min() const { return min_v; }
+    double max() const { return max_v; }
+
+    // Nearest-rank p-quantile (0 < p <= 1), 0 when empty
+    double quantile(double p) const {
+        if (!total) return 0.0;
+        uint64_t rank = std::max<uint64_t>(1, (uint64_t)std::ceil(p * total));
+        uint64_t seen = 0;
+        for (int b = 0; b < BUCKETS; ++b) {
+            seen += counts[b];
+            if (seen >= rank) return std::min(max_v, std::max(min_v, value(b)));
+        }
+        return max_v;
+    }
+
+    const std::vector<uint64_t>& bucket_counts() const { return counts; }
+
+    void save(CheckpointWriter& out) const {
+        out.put_vec(counts);
+        out.put(total);
+        out.put(sum_v);
+        out.put(min_v);
+        out.put(max_v);
+    }
+
+    bool load(CheckpointReader& in) {
+        bool ok = in.get_vec(counts, BUCKETS);
+        total = in.get<uint64_t>();
+        sum_v = in.get<double>();
+        min_v = in.get<double>();
+        max_v = in.get<double>();
+        return ok && in.ok();
+    }
+
+private:
+    std::vector<uint64_t> counts;
+    uint64_t total;
+    double sum_v;
+    double min_v;
+    double max_v;
+};
+
+#endif
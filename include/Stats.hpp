@@ -0,0 +1,75 @@
+#ifndef STATS_HPP
+#define STATS_HPP
+
+#include <vector>
+#include <cmath>
+#include <algorithm>
+
+// Point estimate with a 95% confidence interval from independent samples
+struct Estimate {
+    int count = 0;
+    double mean = 0.0;
+    double std_err = 0.0;
+    double ci_low = 0.0;
+    double ci_high = 0.0;
+};
+
+// Two-sided 95% Student-t quantile t_{0.975, dof}
+inline double t_quantile_975(int dof) {
+    static const double table[] = {
+        0.0, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+        2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+        2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+        2.042
+    };
+    if (dof <= 0) return 0.0;
+    if (dof <= 30) return table[dof];
+    if (dof <= 60) return 2.000 + (2.042 - 2.000) * (60 - dof) / 30.0;
+    if (dof <= 120) return 1.980 + (2.000 - 1.980) * (120 - dof) / 60.0;
+    return 1.960;
+}
+
+inline Estimate estimate(const std::vector<double>& samples) {
+    Estimate e;
+    e.count = (int)samples.size();
+    if (e.count == 0) return e;
+
+    double sum = 0.0;
+    for (double x : samples) sum += x;
+    e.mean = sum / e.count;
+
+    if (e.count > 1) {
+        double ss = 0.0;
+        for (double x : samples) ss += (x - e.mean) * (x - e.mean);
+        e.std_err = std::sqrt(ss / (e.count - 1) / e.count);
+    }
+    double half = t_quantile_975(e.count - 1) * e.std_err;
+    e.ci_low = e.mean - half;
+    e.ci_high = e.mean + half;
+    return e;
+}
+
+// MSER warmup truncation on batch averages z[0..k): the number of leading
+// batches d <= k/2 that minimizes  sum_{j>=d} (z_j - mean_{j>=d})^2 / (k-d)^2.
+// Applied to averages of 5 consecutive observations this is MSER-5.
+inline int mser_truncation(const double* z, int k) {
+    if (k < 2) return 0;
+    int best = 0;
+    double best_score = 0.0;
+    double s1 = 0.0, s2 = 0.0;   // suffix sums of z and z^2
+    for (int d = k - 1; d >= 0; --d) {
+        s1 += z[d];
+        s2 += z[d] * z[d];
+        if (d > k / 2) continue;
+        double len = (double)(k - d);
+        double sse = std::max(0.0, s2 - s1 * s1 / len);
+        double score = sse / (len * len);
+        if (d == k / 2 || score <= best_score) {
+            best = d;
+            best_score = score;
+        }
+    }
+    return best;
+}
+
+#endif
@@ -0,0 +1,37 @@
+#ifndef SWEEP_HPP
+#define SWEEP_HPP
+
+#include <vector>
+#include <string>
+#include "Runner.hpp"
+#include "ResultStore.hpp"
+
+// Sets one SimConfig field from its command-line name (n, m, lambda, mu,
+// policy, topo, k, L, clusters, cost, qmax, trace, engine, seed,
+// replications, target-rel-error, tag). Returns false for an unknown name.
+bool set_config_field(SimConfig& cfg, const std::string& key, const std::string& value);
+
+// Expands a sweep spec into the list of points to run.
+//
+// JSON spec: either an array of point objects, or an object with
+//   "base"   : fields shared by every point
+//   "grid"   : field -> list of values; the cartesian product is taken
+//   "points" : explicit list of points (each combined with the grid)
+// e.g. {"base": {"n": 525, "m": 1000000, "engine": "heap"},
+//       "grid": {"policy": ["poKL", "spatialKL"], "lambda": [0.9, 0.95]}}
+//
+// CSV spec (*.csv): a header row of field names, then one point per row.
+//
+// Fields not given anywhere keep the values from 'defaults'.
+std::vector<SimConfig> load_sweep_spec(const std::string& path, const SimConfig& defaults);
+
+// Runs every point on a work-stealing pool of 'threads' workers. Neighbor
+// tables and traces are built once per distinct (policy, topo, n, k,
+// clusters) / trace file and shared. Each point is appended to 'out_path'
+// as one JSON line (unless 'out_path' is empty) and to 'store' (if given)
+// as soon as all its replications finish. Progress of every point goes to
+// 'telemetry' when given.
+int run_sweep(const std::vector<SimConfig>& points, const std::string& out_path, int threads,
+              ResultStore* store = nullptr, Telemetry* telemetry = nullptr);
+
+#endif
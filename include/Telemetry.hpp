@@ -0,0 +1,50 @@
+#ifndef TELEMETRY_HPP
+#define TELEMETRY_HPP
+
+#include <string>
+#include <mutex>
+
+// Machine-readable progress stream (--telemetry): one JSON object per line,
+// written to an inherited file descriptor ("fd:3") or to a Unix domain
+// stream socket that a reader is listening on ("unix:/path/to.sock").
+// Lines are written whole under a lock, so every replication and sweep
+// point of a process can share one stream. A write error (reader gone)
+// turns the stream off; the simulation itself is never affected.
+//
+// Line types, by their "type" field. Every line has "run" (the tag, or
+// policy_topo_n<n>_lam<lambda>) and "rep" (replication index):
+//   start     n, lambda, max_jobs
+//   progress  jobs, max_jobs, events, events_per_sec (since the previous
+//             line), elapsed, sim_time, mean_Q (running time average per
+//             server over the recorded interval, -1 before it starts),
+//             eta_seconds (to max_jobs) and, with --target-rel-error,
+//             rel_error (latest estimate, -1 until there are enough blocks)
+//   done      jobs, mean_Q, seconds
+class Telemetry {
+public:
+    Telemetry() = default;
+    ~Telemetry();
+    Telemetry(const Telemetry&) = delete;
+    Telemetry& operator=(const Telemetry&) = delete;
+
+    // Opens "fd:N" or "unix:PATH"; false (with a message) if that fails
+    bool open(const std::string& dest);
+    bool active() const { return fd >= 0; }
+
+    // Writes one line; 'line' must not contain a newline
+    void send(const char* line, size_t size);
+    void send(const std::string& line) { send(line.data(), line.size()); }
+
+    // The start and done lines of one replication
+    void start(const std::string& run, int rep, int n, double lambda, long long max_jobs);
+    void done(const std::string& run, int rep, long long jobs, double mean_Q, double seconds);
+
+    double interval = 1.0;    // wall-clock seconds between progress lines of a run
+
+private:
+    int fd = -1;
+    bool owned = false;       // opened here (socket), closed on destruction
+    std::mutex mtx;
+};
+
+#endif
@@ -0,0 +1,130 @@
+#ifndef THREAD_POOL_HPP
+#define THREAD_POOL_HPP
+
+#include <vector>
+#include <deque>
+#include <memory>
+#include <thread>
+#include <mutex>
+#include <atomic>
+#include <condition_variable>
+#include <functional>
+
+// Fixed-size work-stealing pool.
+// Every worker owns a deque. Tasks submitted from outside are dealt to the
+// deques round-robin; tasks submitted by a worker go to its own deque. A
+// worker runs its own deque in submission order and, when that is empty,
+// steals from the back of another worker's deque.
+// wait() blocks until every submitted task has finished.
+class ThreadPool {
+public:
+    explicit ThreadPool(int threads) : queued(0), pending(0), next_queue(0), stopping(false) {
+        if (threads < 1) threads = 1;
+        for (int i = 0; i < threads; ++i) queues.emplace_back(new Queue);
+        for (int i = 0; i < threads; ++i) {
+            workers.emplace_back([this, i] { worker_loop(i); });
+        }
+    }
+
+    ~ThreadPool() {
+        {
+            std::lock_guard<std::mutex> lock(mtx);
+            stopping = true;
+        }
+        work_cv.notify_all();
+        for (auto& t : workers) t.join();
+    }
+
+    ThreadPool(const ThreadPool&) = delete;
+    ThreadPool& operator=(const ThreadPool&) = delete;
+
+    int size() const { return (int)workers.size(); }
+
+    void submit(std::function<void()> task) {
+        int idx = (current_pool == this) ? current_index
+                                         : (int)(next_queue++ % queues.size());
+        {
+            std::lock_guard<std::mutex> lock(queues[idx]->mtx);
+            queues[idx]->tasks.push_back(std::move(task));
+        }
+        {
+            std::lock_guard<std::mutex> lock(mtx);
+            queued++;
+            pending++;
+        }
+        work_cv.notify_one();
+    }
+
+    void wait() {
+        std::unique_lock<std::mutex> lock(mtx);
+        done_cv.wait(lock, [this] { return pending == 0; });
+    }
+
+private:
+    struct Queue {
+        std::mutex mtx;
+        std::deque<std::function<void()>> tasks;
+    };
+
+    bool try_take(int self, std::function<void()>& task) {
+        int nq = (int)queues.size();
+        {
+            Queue& own = *queues[self];
+            std::lock_guard<std::mutex> lock(own.mtx);
+            if (!own.tasks.empty()) {
+                task = std::move(own.tasks.front());
+                own.tasks.pop_front();
+                return true;
+            }
+        }
+        for (int i = 1; i < nq; ++i) {
+            Queue& victim = *queues[(self + i) % nq];
+            std::lock_guard<std::mutex> lock(victim.mtx);
+            if (!victim.tasks.empty()) {
+                task = std::move(victim.tasks.back());
+                victim.tasks.pop_back();
+                return true;
+            }
+        }
+        return false;
+    }
+
+    void worker_loop(int self) {
+        current_pool = this;
+        current_index = self;
+        while (true) {
+            {
+                // Reserve one queued task; it is then guaranteed to be in
+                // some deque until this worker takes it
+                std::unique_lock<std::mutex> lock(mtx);
+                work_cv.wait(lock, [this] { return stopping || queued > 0; });
+                if (stopping && queued == 0) return;
+                queued--;
+            }
+            std::function<void()> task;
+            while (!try_take(self, task)) std::this_thread::yield();
+            task();
+            bool idle;
+            {
+                std::lock_guard<std::mutex> lock(mtx);
+                idle = (--pending == 0);
+            }
+            if (idle) done_cv.notify_all();
+        }
+    }
+
+    inline static thread_local ThreadPool* current_pool = nullptr;
+    inline static thread_local int current_index = 0;
+
+    std::vector<std::unique_ptr<Queue>> queues;
+    std::vector<std::thread> workers;
+    int queued;                  // tasks sitting in deques, not yet reserved
+    int pending;                 // tasks submitted but not finished
+    std::atomic<unsigned> next_queue;
+    bool stopping;
+    std::mutex mtx;
+    std::condition_variable work_cv;
+    std::condition_variable done_cv;
+};
+
+#endif
@@ -0,0 +1,75 @@
+#ifndef TRACE_HPP
+#define TRACE_HPP
+
+#include <vector>
+#include <string>
+#include <cstdint>
+
+// Binary trace layout (little-endian), written by Trace::write_binary and
+// scripts/trace_tool.py:
+//   TraceHeader, zero padding up to data_offset,
+//   count inter-arrival values, then count durations,
+// each column packed as float32 or float64 (value_bytes = 4 or 8).
+struct TraceHeader {
+    char magic[8];          // "LBTRACE\0"
+    uint32_t version;       // 1
+    uint32_t value_bytes;   // 4 (float32) or 8 (float64)
+    uint64_t count;         // number of jobs
+    uint64_t data_offset;   // start of the inter-arrival column
+    uint64_t reserved[4];
+};
+
+static_assert(sizeof(TraceHeader) == 64, "TraceHeader must stay 64 bytes");
+
+// Job trace replayed by Simulation instead of Poisson arrivals.
+// Loaded once and shared read-only by every simulation that uses it.
+// A binary trace is mapped rather than read, so loading is O(1) and
+// concurrent runs share the page cache; text traces are parsed into memory.
+class Trace {
+public:
+    Trace() = default;
+    ~Trace();
+    Trace(const Trace&) = delete;
+    Trace& operator=(const Trace&) = delete;
+
+    // Reads a binary trace (detected by its magic) or a text trace of
+    // "inter_arrival duration" pairs separated by whitespace or a comma,
+    // skipping an optional header line.
+    // Returns false if the file is missing, malformed or holds no jobs.
+    bool load(const std::string& filepath);
+
+    // Writes the loaded jobs in the binary layout above.
+    // value_bytes = 8 keeps every value exact; 4 halves the file size.
+    bool write_binary(const std::string& filepath, int value_bytes = 8) const;
+
+    size_t size() const { return count; }
+    bool empty() const { return count == 0; }
+    bool is_mapped() const { return map_base != nullptr; }
+
+    double inter_arrival(size_t i) const { return value(ia_col, i); }
+    double duration(size_t i) const { return value(dur_col, i); }
+
+private:
+    double value(const void* col, size_t i) const {
+        return single ? (double)static_cast<const float*>(col)[i]
+                      : static_cast<const double*>(col)[i];
+    }
+
+    void reset();
+    bool load_binary(int fd, size_t file_size, const std::string& filepath);
+    bool load_text(const std::string& filepath);
+
+    // Text traces own their columns; binary traces point into the mapping
+    std::vector<double> ia_owned;
+    std::vector<double> dur_owned;
+
+    const void* ia_col = nullptr;
+    const void* dur_col = nullptr;
+    bool single = false;         // columns are float32
+    size_t count = 0;
+
+    void* map_base = nullptr;
+    size_t map_size = 0;
+};
+
+#endif
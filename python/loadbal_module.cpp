@@ -0,0 +1,158 @@
+// In-process Python bindings for the simulator.
+//
+//   import loadbal
+//   hist, metrics = loadbal.run(n=525, m=10**6, lam=0.9, policy="poKL", k=0, L=2)
+//
+// 'hist' is a NumPy array of P(Q=i) and 'metrics' a dict with the same keys
+// as the binary's _metrics.json. The GIL is released while the simulation
+// is built and run, so a thread pool can drive many runs in parallel.
+// telemetry="unix:/path.sock" (or "fd:N") streams progress lines labelled
+// 'run_id' exactly like the binary's --telemetry.
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include <algorithm>
+#include <chrono>
+#include "Simulation.hpp"
+#include "Graph.hpp"
+#include "Telemetry.hpp"
+
+namespace py = pybind11;
+
+static py::tuple run(int n, long long m, double lam, double mu,
+                     const std::string& policy, const std::string& topo,
+                     int k, int L, int qmax, int clusters, double cost,
+                     const std::string& trace, const std::string& engine,
+                     unsigned long long seed, double target_rel_error,
+                     const std::string& telemetry, double telemetry_interval,
+                     const std::string& run_id) {
+    std::string engine_problem = engine_error(engine, policy, topo, !trace.empty());
+    if (!engine_problem.empty()) throw py::value_error(engine_problem);
+    if (engine == "pdes") throw py::value_error("The pdes engine is only available in loadbal_sim");
+    Telemetry sink;
+    if (!telemetry.empty() && !sink.open(telemetry)) {
+        throw py::value_error("Cannot open telemetry destination '" + telemetry + "'");
+    }
+    sink.interval = telemetry_interval;
+
+    SimulationResult result;
+    double run_seconds = 0.0;
+    {
+        py::gil_scoped_release release;
+        NeighborTable k_nbrs = build_neighbors(policy, topo, n, k, clusters);
+        Trace jobs;
+        if (!trace.empty()) jobs.load(trace);
+        Simulation sim(n, lam, m, mu, policy, topo, k_nbrs, k, L, qmax,
+                       clusters, cost, jobs.empty() ? nullptr : &jobs, engine, seed,
+                       target_rel_error);
+        if (sink.active()) {
+            sim.set_telemetry(&sink, run_id, 0);
+            sink.start(run_id, 0, n, lam, jobs.empty() ? (long long)m : (long long)jobs.size());
+        }
+        auto start = std::chrono::steady_clock::now();
+        result = sim.run();
+        run_seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+        if (sink.active()) sink.done(run_id, 0, result.jobs_used, result.mean_Q, run_seconds);
+    }
+
+    py::array_t<double> hist(result.hist.size());
+    std::copy(result.hist.begin(), result.hist.end(), hist.mutable_data());
+
+    py::dict metrics;
+    metrics["policy"] = policy;
+    metrics["graph"] = topo;
+    metrics["n"] = n;
+    metrics["m"] = m;
+    metrics["lambda"] = lam;
+    metrics["mu"] = mu;
+    metrics["k"] = k;
+    metrics["L"] = L;
+    metrics["qmax"] = qmax;
+    metrics["num_clusters"] = clusters;
+    metrics["comm_cost"] = cost;
+    metrics["engine"] = engine;
+    metrics["seed"] = seed;
+    metrics["total_req_dist"] = result.total_req_dist;
+    metrics["mean_Q"] = result.mean_Q;
+    metrics["mean_W"] = result.mean_W;
+    metrics["avg_req_dist"] = result.avg_req_dist;
+    metrics["jobs_used"] = result.jobs_used;
+    metrics["warmup_jobs"] = result.warmup_jobs;
+    metrics["events"] = result.events;
+    {
+        // Same layout as the binary's "response_time" object
+        const QuantileSketch& s = result.response;
+        py::list buckets;
+        const std::vector<uint64_t>& counts = s.bucket_counts();
+        for (size_t b = 0; b < counts.size(); ++b) {
+            if (counts[b]) buckets.append(py::make_tuple(b, counts[b]));
+        }
+        py::dict sketch;
+        sketch["sub_buckets"] = QuantileSketch::SUB_BUCKETS;
+        sketch["min_exponent"] = QuantileSketch::MIN_EXPONENT;
+        sketch["buckets"] = buckets;
+        py::dict response;
+        response["count"] = s.count();
+        response["mean"] = s.mean();
+        response["p50"] = s.quantile(0.5);
+        response["p90"] = s.quantile(0.9);
+        response["p99"] = s.quantile(0.99);
+        response["p999"] = s.quantile(0.999);
+        response["max"] = s.max();
+        response["sketch"] = sketch;
+        metrics["response_time"] = response;
+    }
+    if (target_rel_error > 0) {
+        metrics["target_rel_error"] = target_rel_error;
+        metrics["rel_error"] = result.rel_error;
+        metrics["target_met"] = result.rel_error <= target_rel_error;
+        metrics["batches"] = result.batches;
+    }
+    metrics["run_seconds"] = run_seconds;
+    if (PROFILE_ENABLED) {
+        // Same layout as the binary's "profile" object
+        const Profile& p = result.profile;
+        double rate = p.ticks_per_second();
+        py::dict phases;
+        for (int i = 0; i < NUM_PHASES; ++i) {
+            py::dict phase;
+            phase["seconds"] = rate > 0 ? p.phase_ticks(i) / rate : 0.0;
+            phase["share"] = p.loop_ticks ? p.phase_ticks(i) / p.loop_ticks : 0.0;
+            phase["calls"] = p.calls[i];
+            phases[PROFILE_PHASE_NAMES[i]] = phase;
+        }
+        double other = p.phase_ticks(PHASE_OTHER);
+        py::dict rest;
+        rest["seconds"] = rate > 0 ? other / rate : 0.0;
+        rest["share"] = p.loop_ticks ? other / p.loop_ticks : 0.0;
+        phases["other"] = rest;
+
+        py::dict profile;
+        profile["loop_seconds"] = p.loop_seconds;
+        profile["ticks_per_second"] = rate;
+        profile["phases"] = phases;
+        profile["events"] = p.events;
+        profile["arrivals"] = p.arrivals;
+        profile["departures"] = p.departures;
+        profile["rejection_retries"] = p.rejection_retries;
+        profile["dense_samples"] = p.dense_samples;
+        profile["candidates_scored"] = p.candidates_scored;
+        profile["heap_allocs"] = p.heap_allocs;
+        metrics["profile"] = profile;
+    }
+    return py::make_tuple(hist, metrics);
+}
+
+PYBIND11_MODULE(loadbal, mod) {
+    mod.doc() = "In-process load-balancing simulator";
+    mod.def("run", &run,
+            "Build and run one Simulation; returns (hist, metrics).",
+            py::arg("n") = 1000, py::arg("m") = 100000,
+            py::arg("lam") = 0.9, py::arg("mu") = 1.0,
+            py::arg("policy") = "pot", py::arg("topo") = "cycle",
+            py::arg("k") = 1, py::arg("L") = 1, py::arg("qmax") = 100,
+            py::arg("clusters") = 1, py::arg("cost") = 0.0,
+            py::arg("trace") = "", py::arg("engine") = "heap",
+            py::arg("seed") = 123456789ULL, py::arg("target_rel_error") = 0.0,
+            py::arg("telemetry") = "", py::arg("telemetry_interval") = 1.0,
+            py::arg("run_id") = "run");
+}
@@ -12,9 +12,19 @@ make
 
 if [ ! -f "$TRACE_FILE" ]; then
     echo "Error: Trace file '$TRACE_FILE' not found!"
+    echo "Convert a job log or synthesize one with scripts/trace_tool.py, e.g."
+    echo "  python3 scripts/trace_tool.py synthesize $TRACE_FILE -m 200000 --n 1000 --lambda 0.9"
     exit 1
 fi
 
+# Convert the CSV once; every run below then maps the binary trace
+# instead of re-parsing the text.
+TRACE_BIN="${TRACE_FILE%.csv}.lbt"
+if [ ! -f "$TRACE_BIN" ] || [ "$TRACE_FILE" -nt "$TRACE_BIN" ]; then
+    $BIN --trace $TRACE_FILE --convert-trace $TRACE_BIN || exit 1
+fi
+TRACE_FILE=$TRACE_BIN
+
 echo "--- Starting Cluster Experiments with Trace Data ---"
 
 # ==========================================================
@@ -0,0 +1,253 @@
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+# ==========================================
+# Adaptive choice of the loads of an E[W]-vs-lambda sweep.
+#
+# Each curve (one topology / policy / power) gets a Gaussian-process
+# surrogate of
+#
+#   y = log E[W]   against   x = log 1/(1 - lambda)
+#
+# In these coordinates the curves are close to straight lines (M/M/1 is
+# exactly y = x), so the surrogate is a linear trend plus a squared-
+# exponential GP on the residuals. Its length scale and amplitude are picked
+# by marginal likelihood, and each point's noise comes from its rel_error,
+# so points should be run with a target-rel-error (a few times below tol).
+# A curve starts from a few loads evenly spaced in x, plus its anchors
+# (loads that must be simulated, e.g. the one the summary plots use). After
+# that it asks for one load per round: the one where the surrogate is least
+# sure. A strongly bent region fits a short length scale, so uncertainty
+# (and new points) follows curvature there. A curve is done once
+#   - 2 sd of the surrogate is below `tol` everywhere on [lo, hi] (tol is a
+#     95% relative error on E[W]), and
+#   - the newest point landed within `tol` (plus its own rel_error) of what
+#     the surrogate predicted for it before it was run,
+# or once it has max_points points. Curves are refined in lockstep rounds,
+# so one round's points can be run in parallel. With paired=True every curve
+# runs the union of the round's proposals, so curves that are compared load
+# by load (poKL vs spatialKL) keep sharing their loads:
+#
+#   curves = [adaptive_sweep.Curve(key, 0.6, 0.99, anchors=[0.95]) for key in keys]
+#   adaptive_sweep.refine(curves, evaluate)   # evaluate([(curve, lam)]) -> [metrics]
+#   mean, sd = curves[0].surrogate().predict(lams)
+#   python scripts/adaptive_sweep.py --policy poKL --k 0 --L 1 --lo 0.5 --hi 0.99 --mean-field
+# ==========================================
+DEFAULT_TOL = 0.02
+INITIAL_POINTS = 4
+MAX_POINTS = 12
+GRID_POINTS = 200            # candidate loads per curve
+NOISE_FLOOR = 1e-3           # relative sd assumed for points without rel_error
+LAMBDA_DIGITS = 4            # loads are rounded, so cached points are reused
+
+def to_x(lam):
+    return -np.log1p(-np.asarray(lam, dtype=float))
+
+def to_lambda(x):
+    return -np.expm1(-np.asarray(x, dtype=float))
+
+class Surrogate:
+    """Linear trend plus GP fit of (x, y, noise variance) points."""
+    def __init__(self, x, y, noise, tol):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.noise = np.asarray(noise, dtype=float)
+        if len(self.x) >= 2:
+            A = np.stack([np.ones_like(self.x), self.x], axis=1)
+            self.trend, *_ = np.linalg.lstsq(A, self.y, rcond=None)
+        else:
+            self.trend = np.array([self.y.mean() if len(self.y) else 0.0, 1.0])
+        resid = self.y - self.trend[0] - self.trend[1] * self.x
+        span = max(np.ptp(self.x), 1e-6) if len(self.x) else 1.0
+        # The amplitude floor keeps a nearly straight curve from claiming
+        # certainty between points that are still far apart
+        scales = [max(tol, f * float(np.std(resid))) for f in (0.5, 1.0, 2.0, 4.0)]
+        best = None
+        for ell in span * np.array([0.05, 0.1, 0.2, 0.35, 0.5, 1.0, 2.0]):
+            for s in scales:
+                fit = self._fit(resid, ell, s)
+                if fit is not None and (best is None or fit[0] > best[0]):
+                    best = fit
+        _, self.ell, self.scale, self.chol, self.alpha = best
+
+    def _fit(self, resid, ell, scale):
+        K = self._kernel(self.x, self.x, ell, scale) + np.diag(self.noise + 1e-10)
+        try:
+            chol = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return None
+        alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, resid))
+        loglik = -0.5 * resid @ alpha - np.log(np.diag(chol)).sum()
+        return loglik, ell, scale, chol, alpha
+
+    @staticmethod
+    def _kernel(a, b, ell, scale):
+        return scale ** 2 * np.exp(-0.5 * ((a[:, None] - b[None, :]) / ell) ** 2)
+
+    def predict_x(self, x):
+        """Mean and sd of y = log E[W] at x."""
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        Ks = self._kernel(x, self.x, self.ell, self.scale)
+        mean = self.trend[0] + self.trend[1] * x + Ks @ self.alpha
+        v = np.linalg.solve(self.chol, Ks.T)
+        var = np.maximum(self.scale ** 2 - (v * v).sum(axis=0), 0.0)
+        return mean, np.sqrt(var)
+
+    def predict(self, lam):
+        """Mean and sd of log E[W] at the loads `lam`."""
+        return self.predict_x(to_x(lam))
+
+class Curve:
+    """The points of one E[W]-vs-lambda curve and the next load to run."""
+    def __init__(self, key, lo, hi, anchors=(), tol=DEFAULT_TOL,
+                 initial=INITIAL_POINTS, max_points=MAX_POINTS):
+        self.key = key
+        self.lo, self.hi = lo, hi
+        self.tol = tol
+        self.max_points = max_points
+        xs = np.linspace(to_x(lo), to_x(hi), max(2, initial))
+        self.start = sorted({round(float(l), LAMBDA_DIGITS) for l in to_lambda(xs)}
+                            | {round(float(a), LAMBDA_DIGITS) for a in anchors})
+        self.grid = np.linspace(to_x(lo), to_x(hi), GRID_POINTS)
+        self.points = {}          # lambda -> (mean_W, rel_error)
+        self.failed = set()
+        self.surprise = math.inf  # |y - prediction| of the newest point
+        self.max_sd = math.inf
+
+    def add(self, lam, metrics):
+        """Records a finished point (metrics None: the run failed)."""
+        if metrics is None or not metrics.get("mean_W", 0) > 0:
+            self.failed.add(lam)
+            return
+        rel_error = metrics.get("rel_error", 0.0) or 0.0
+        if all(l in self.points or l in self.failed for l in self.start):
+            # Less the point's own (95%) error, which tol does not cover
+            mean, _ = self.surrogate().predict(lam)
+            self.surprise = max(0.0, abs(math.log(metrics["mean_W"]) - float(mean[0])) - rel_error)
+        self.points[lam] = (metrics["mean_W"], rel_error)
+
+    def surrogate(self):
+        lams = sorted(self.points)
+        y = [math.log(self.points[l][0]) for l in lams]
+        # rel_error is a 95% half-width on E[Q], and so on E[W] = E[Q] / lambda
+        noise = [max(self.points[l][1] / 1.96, NOISE_FLOOR) ** 2 for l in lams]
+        return Surrogate(to_x(lams), y, noise, self.tol)
+
+    def done(self):
+        return not self.propose()
+
+    def propose(self):
+        """Loads to run next: the start set, then one per round until converged."""
+        tried = set(self.points) | self.failed
+        todo = [l for l in self.start if l not in tried]
+        if todo:
+            return todo
+        if len(self.points) < 2 or len(tried) >= self.max_points:
+            return []
+        _, sd = self.surrogate().predict_x(self.grid)
+        self.max_sd = float(sd.max())
+        if 2 * self.max_sd < self.tol and self.surprise < self.tol:
+            return []
+        # Next to a noisy point the sd stays at that point's noise; another
+        # run right beside it would teach the surrogate little
+        gap = np.ptp(self.grid) / (4 * self.max_points)
+        taken = to_x(sorted(tried))
+        for i in np.argsort(-sd):
+            if np.abs(taken - self.grid[i]).min() < gap:
+                continue
+            return [round(float(to_lambda(self.grid[i])), LAMBDA_DIGITS)]
+        return []
+
+    def status(self):
+        state = "done" if self.done() else "refining"
+        return (f"{self.key}: {len(self.points)} points, max 2sd {2 * self.max_sd:.4f}, "
+                f"last surprise {self.surprise:.4f} ({state})")
+
+def refine(curves, evaluate, on_round=None, paired=False):
+    """
+    Runs the curves' proposals in rounds until every curve is done.
+    evaluate([(curve, lam)]) returns a metrics dict (or None) per request;
+    on_round(round, requests) is called after each round. paired=True runs
+    every load any curve proposes on all curves (that have not run it).
+    """
+    rounds = 0
+    while True:
+        requests = [(c, lam) for c in curves for lam in c.propose()]
+        if paired:
+            loads = sorted({lam for _, lam in requests})
+            requests = [(c, lam) for c in curves for lam in loads
+                        if lam not in c.points and lam not in c.failed]
+        if not requests:
+            return rounds
+        for (c, lam), metrics in zip(requests, evaluate(requests)):
+            c.add(lam, metrics)
+        rounds += 1
+        if on_round:
+            on_round(rounds, requests)
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive E[W]-vs-lambda sweep of one curve")
+    parser.add_argument("--policy", default="pot", choices=["pot", "poKL", "spatialKL"])
+    parser.add_argument("--topo", default="cycle", choices=["cycle", "grid", "cluster"])
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--m", type=int, default=1_000_000)
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--L", type=int, default=1)
+    parser.add_argument("--clusters", type=int, default=1)
+    parser.add_argument("--cost", type=float, default=0.0)
+    parser.add_argument("--engine", default="heap")
+    parser.add_argument("--target-rel-error", type=float, default=0.0)
+    parser.add_argument("--lo", type=float, default=0.5)
+    parser.add_argument("--hi", type=float, default=0.99)
+    parser.add_argument("--anchor", type=float, nargs="*", default=[])
+    parser.add_argument("--tol", type=float, default=DEFAULT_TOL,
+                        help="Stop once log E[W] is known to +-tol (95%%) on [lo, hi]")
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS)
+    parser.add_argument("--mean-field", action="store_true",
+                        help="Evaluate points with the mean-field model instead of simulating")
+    args = parser.parse_args()
+    if not 0.0 < args.lo < args.hi < 1.0:
+        sys.exit("Error: need 0 < lo < hi < 1")
+
+    if args.mean_field:
+        import mean_field
+        run_point = mean_field.run_point
+    else:
+        import sim_runner
+        run_point = sim_runner.run_point
+
+    base = {"n": args.n, "m": args.m, "policy": args.policy, "topo": args.topo,
+            "k": args.k, "L": args.L, "clusters": args.clusters, "cost": args.cost,
+            "engine": args.engine, "target-rel-error": args.target_rel_error}
+
+    def evaluate(requests):
+        results = []
+        for _, lam in requests:
+            try:
+                results.append(run_point(dict(base, **{"lambda": lam}))[1])
+            except Exception as e:
+                print(f"  lambda {lam}: failed ({e})")
+                results.append(None)
+        return results
+
+    curve = Curve(f"{args.policy} k={args.k} L={args.L}", args.lo, args.hi, args.anchor,
+                  args.tol, max_points=args.max_points)
+    start = time.perf_counter()
+    rounds = refine([curve], evaluate,
+                    lambda r, reqs: print(f"Round {r}: ran {', '.join(str(l) for _, l in reqs)}"))
+    elapsed = time.perf_counter() - start
+
+    print(curve.status())
+    surrogate = curve.surrogate()
+    print(f"{'lambda':>8} {'E[W]':>10} {'surrogate':>10} {'2sd':>7}")
+    for lam in sorted(curve.points):
+        mean, sd = surrogate.predict(lam)
+        print(f"{lam:>8.4f} {curve.points[lam][0]:>10.5f} {math.exp(mean[0]):>10.5f} {2 * sd[0]:>7.4f}")
+    print(f"{len(curve.points)} points in {rounds} rounds, {elapsed:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import mean_field
+
+# ==========================================
+# Lockstep batch engine: R independent copies of a small system (8-256
+# servers) simulated at once with NumPy, for replication-heavy studies of
+# finite-n effects where a process or thread per replication would cost
+# more than the simulation itself.
+#
+# Same model as Simulation::run(): Poisson arrivals at rate n*lambda to a
+# uniform server s, exponential service at rate mu, the pot / poKL /
+# spatialKL candidate rules on cycle, grid and cluster topologies (min
+# queue, or queue + distance on clusters; earlier candidates win ties),
+# m arrivals per system of which the first 20% are warmup, and a
+# time-weighted queue-length histogram. Random streams differ from the C++
+# engines, so results agree in distribution, not bit for bit.
+#
+# With exponential service the system is a Markov chain, so the next event
+# is selected by uniformization instead of a minimum over completion times:
+# every step, each system draws one event at the constant rate
+# n * (lambda + mu), an arrival with probability lambda / (lambda + mu),
+# otherwise a completion at a uniform server (nothing happens when that
+# server is idle). All rows then do the same O(1) work per step, with no
+# per-row search, and each step lasts 1 / (n * (lambda + mu)) on average;
+# the histogram uses that mean instead of a sampled holding time, which
+# keeps the time averages unbiased and lowers their variance. Queues and
+# histogram areas are (R, n) / (R, qmax + 1) arrays.
+#
+#   hist, metrics = batch_sim.run_point({"n": 16, "lambda": 0.9, "m": 100000},
+#                                       replications=4096)
+#   python scripts/batch_sim.py --n 16 --R 4096 --m 100000 --policy pot --lambda 0.9
+# ==========================================
+DEFAULTS = {
+    "n": 16, "m": 100000, "lambda": 0.9, "mu": 1.0,
+    "policy": "pot", "topo": "cycle", "k": 1, "L": 1, "qmax": 100,
+    "clusters": 1, "cost": 0.0, "seed": 123456789,
+}
+
+WARMUP_FRACTION = 0.2
+INVALID = -1            # padding in candidate lists (fewer neighbors, small clusters)
+
+def t_quantile_975(dof):
+    """Two-sided 95% Student-t quantile, as in include/Stats.hpp."""
+    table = [0.0, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+             2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+             2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+             2.042]
+    if dof <= 0:
+        return 0.0
+    if dof <= 30:
+        return table[dof]
+    if dof <= 60:
+        return 2.000 + (2.042 - 2.000) * (60 - dof) / 30.0
+    if dof <= 120:
+        return 1.980 + (2.000 - 1.980) * (120 - dof) / 60.0
+    return 1.960
+
+def estimate(samples):
+    """Mean with a 95% CI over replications, in the metrics' "ci" layout."""
+    x = np.asarray(samples, dtype=float)
+    mean = float(x.mean())
+    std_err = float(x.std(ddof=1) / np.sqrt(len(x))) if len(x) > 1 else 0.0
+    half = t_quantile_975(len(x) - 1) * std_err
+    return {"mean": mean, "std_err": std_err, "ci95_low": mean - half, "ci95_high": mean + half}
+
+class BatchSimulation:
+    def __init__(self, replications, n, lam, m, mu=1.0, policy="pot", topo="cycle",
+                 k=1, L=1, qmax=100, clusters=1, cost=0.0, seed=123456789):
+        if policy not in ("pot", "poKL", "spatialKL"):
+            raise ValueError(f"unknown policy {policy}")
+        if topo not in ("cycle", "grid", "cluster"):
+            raise ValueError(f"unknown topology {topo}")
+        self.R, self.n, self.lam, self.m, self.mu = replications, n, lam, m, mu
+        self.policy, self.topo = policy, topo
+        self.k, self.L = max(0, k), max(0, L)
+        self.nbins = qmax + 1
+        self.rng = np.random.default_rng(seed)
+        self.warmup = int(m * WARMUP_FRACTION)
+
+        # Topology: distances (DistanceOracle) and spatialKL neighbor lists (Graph.hpp)
+        idx = np.arange(n)
+        self.weight = cost if cost > 1e-9 else 1.0
+        self.cluster_id = np.zeros(n, dtype=np.int64)
+        self.nbrs = np.empty((n, 0), dtype=np.int64)
+        self.local = 0
+        if topo == "grid":
+            width, height = mean_field.grid_shape(n)
+            self.row, self.col = idx // width, idx % width
+            if policy == "spatialKL":
+                lists = []
+                for i in range(n):
+                    r, c = divmod(i, width)
+                    cand = [(r, c + 1), (r, c - 1), (r + 1, c), (r - 1, c)]
+                    ok = [rr * width + cc for rr, cc in cand if 0 <= rr < height and 0 <= cc < width]
+                    lists.append(ok[:self.k])
+                self.nbrs = self._pad(lists)
+        elif topo == "cycle":
+            if policy == "spatialKL":
+                offsets = [(i // 2 + 1) * (1 if i % 2 == 0 else -1) for i in range(self.k)]
+                self.nbrs = (idx[:, None] + np.array(offsets, dtype=np.int64)) % n
+        else:
+            if clusters > 1:
+                self.cluster_id = idx // -(-n // clusters)
+            if policy == "spatialKL" and clusters > 0:
+                size = np.bincount(self.cluster_id).max()
+                self.local = min(self.k, size - 1)
+
+        self.draws = {"pot": 1, "poKL": self.k + self.L, "spatialKL": self.L}[policy]
+
+        # System state, one row per replication
+        R = replications
+        self.q = np.zeros((R, n), dtype=np.int64)
+        self.rate = n * (lam + mu)                    # uniformization rate
+        self.p_arrival = lam / (lam + mu)
+        self.now = np.zeros(R)
+        self.arrivals = np.zeros(R, dtype=np.int64)
+        self.area = np.zeros((R, self.nbins))
+        self.last = np.zeros((R, n))                  # time of each queue's last change
+        self.recording = np.full(R, self.warmup == 0)
+        self.stats_start = np.zeros(R)
+        self.req_dist = np.zeros(R)
+        self.recorded = np.zeros(R, dtype=np.int64)
+        self.done = np.zeros(R, dtype=bool)
+
+    @staticmethod
+    def _pad(lists):
+        width = max((len(l) for l in lists), default=0)
+        out = np.full((len(lists), width), INVALID, dtype=np.int64)
+        for i, l in enumerate(lists):
+            out[i, :len(l)] = l
+        return out
+
+    def distance(self, s, v):
+        if self.topo == "cycle":
+            d = np.abs(s - v)
+            return np.minimum(d, self.n - d).astype(float)
+        if self.topo == "grid":
+            return (np.abs(self.row[s] - self.row[v]) + np.abs(self.col[s] - self.col[v])).astype(float)
+        same = self.cluster_id[s] == self.cluster_id[v]
+        return np.where(s == v, 0.0, np.where(same, self.weight, 2.0 * self.weight))
+
+    def _distinct(self, blocked, count):
+        """'count' distinct uniform servers per row outside 'blocked'; INVALID when short."""
+        if count <= 0:
+            return np.empty((blocked.shape[0], 0), dtype=np.int64)
+        keys = self.rng.random(blocked.shape)
+        keys[blocked] = 2.0
+        count = min(count, self.n)
+        picked = np.argpartition(keys, count - 1, axis=1)[:, :count]
+        short = np.take_along_axis(keys, picked, axis=1) > 1.0
+        return np.where(short, INVALID, picked)
+
+    def candidates(self, s):
+        """(rows, D) candidate servers in Simulation::choose_node order, s first."""
+        rows = np.arange(len(s))
+        cols = [s[:, None]]
+        if self.policy == "pot":
+            r = self.rng.integers(0, self.n - 1, len(s))
+            cols.append((r + (r >= s))[:, None])
+            return np.concatenate(cols, axis=1)
+
+        blocked = np.zeros((len(s), self.n), dtype=bool)
+        blocked[rows, s] = True
+        if self.policy == "spatialKL":
+            if self.topo == "cluster":
+                if self.local > 0:
+                    outside = self.cluster_id[None, :] != self.cluster_id[s][:, None]
+                    near = self._distinct(blocked | outside, self.local)
+                    cols.append(near)
+                    blocked[rows[:, None], np.where(near == INVALID, s[:, None], near)] = True
+            elif self.nbrs.shape[1] > 0:
+                near = self.nbrs[s]
+                cols.append(near)
+                blocked[rows[:, None], np.where(near == INVALID, s[:, None], near)] = True
+        cols.append(self._distinct(blocked, self.draws))
+        return np.concatenate(cols, axis=1)
+
+    def choose(self, rows, s):
+        cand = self.candidates(s)
+        valid = cand != INVALID
+        safe = np.where(valid, cand, s[:, None])
+        score = self.q[rows[:, None], safe].astype(float)
+        if self.topo == "cluster":
+            score += self.distance(s[:, None], safe)
+        score[~valid] = np.inf
+        return safe[np.arange(len(rows)), np.argmin(score, axis=1)]
+
+    def _move(self, rows, servers, old):
+        """Queue of (row, server) leaves length 'old': close its histogram interval."""
+        rec = self.recording[rows]
+        r, i = rows[rec], servers[rec]
+        self.area[r, np.minimum(old[rec], self.nbins - 1)] += self.now[r] - self.last[r, i]
+        self.last[rows, servers] = self.now[rows]
+
+    def step(self):
+        live = ~self.done
+        self.now += live / self.rate
+        u = self.rng.random(self.R)
+        is_arr = live & (u < self.p_arrival)
+
+        # Arrivals
+        rows = np.flatnonzero(is_arr)
+        if len(rows):
+            self.arrivals[rows] += 1
+            s = self.rng.integers(0, self.n, len(rows))
+            chosen = self.choose(rows, s)
+            old = self.q[rows, chosen]
+            self._move(rows, chosen, old)
+            self.q[rows, chosen] = old + 1
+
+            begin = self.arrivals[rows] == self.warmup + 1
+            if begin.any():
+                b = rows[begin]
+                self.recording[b] = True
+                self.stats_start[b] = self.now[b]
+                self.last[b] = self.now[b][:, None]
+            counted = self.arrivals[rows] > self.warmup
+            self.req_dist[rows[counted]] += self.distance(s[counted], chosen[counted])
+            self.recorded[rows[counted]] += 1
+            self.done[rows[self.arrivals[rows] >= self.m]] = True
+
+        # Completions at a uniform server; idle servers have none
+        rows = np.flatnonzero(live & ~is_arr)
+        servers = self.rng.integers(0, self.n, len(rows))
+        busy = self.q[rows, servers] > 0
+        rows, servers = rows[busy], servers[busy]
+        if len(rows):
+            old = self.q[rows, servers]
+            self._move(rows, servers, old)
+            self.q[rows, servers] = old - 1
+
+    def run(self):
+        """Per-replication results: dict of arrays with the metrics' field names."""
+        steps = 0
+        while not self.done.all():
+            self.step()
+            steps += 1
+
+        # Flush every open interval, then normalize by T * n
+        rec = self.recording
+        bins = np.minimum(self.q, self.nbins - 1)
+        rows = np.broadcast_to(np.arange(self.R)[:, None], bins.shape)
+        open_time = np.where(rec[:, None], self.now[:, None] - self.last, 0.0)
+        np.add.at(self.area, (rows, bins), open_time)
+        T = np.where(rec, self.now - self.stats_start, 0.0)
+        hist = self.area / np.maximum(T * self.n, 1e-300)[:, None]
+        mean_Q = hist @ np.arange(self.nbins)
+        in_system = self.q.sum(axis=1)
+        return {
+            "hist": hist,
+            "total_req_dist": self.req_dist,
+            "mean_Q": mean_Q,
+            "mean_W": mean_Q / self.lam if self.lam > 0 else np.zeros(self.R),
+            "avg_req_dist": np.where(self.recorded > 0, self.req_dist / np.maximum(self.recorded, 1), 0.0),
+            "jobs_used": self.arrivals,
+            "events": (self.arrivals - 1) + (self.arrivals - in_system),
+            "steps": steps,
+        }
+
+def run_point(params, replications, threads=1):
+    """
+    Runs `replications` copies of one point (binary flag names, missing
+    keys take the defaults above) and returns (hist, metrics) like the
+    binary with --replications: averaged histogram, averaged metrics and
+    across-replication confidence intervals under "ci".
+    """
+    p = {**DEFAULTS, **params}
+    start = time.perf_counter()
+    sim = BatchSimulation(replications, int(p["n"]), float(p["lambda"]), int(p["m"]),
+                          float(p["mu"]), p["policy"], p["topo"], int(p["k"]), int(p["L"]),
+                          int(p["qmax"]), int(p["clusters"]), float(p["cost"]), int(p["seed"]))
+    setup = time.perf_counter() - start
+    res = sim.run()
+    run_seconds = time.perf_counter() - start - setup
+
+    metrics = {
+        "policy": p["policy"], "graph": p["topo"], "n": int(p["n"]), "m": int(p["m"]),
+        "lambda": p["lambda"], "mu": p["mu"], "k": int(p["k"]), "L": int(p["L"]),
+        "qmax": int(p["qmax"]), "num_clusters": int(p["clusters"]),
+        "comm_cost": p["cost"], "engine": "batch", "seed": int(p["seed"]),
+        "replications": replications, "threads": threads,
+        "total_req_dist": float(res["total_req_dist"].mean()),
+        "mean_Q": float(res["mean_Q"].mean()),
+        "mean_W": float(res["mean_W"].mean()),
+        "avg_req_dist": float(res["avg_req_dist"].mean()),
+        "loop_heap_allocs": 0,
+        "jobs_used": int(round(res["jobs_used"].mean())),
+        "warmup_jobs": sim.warmup,
+        "events": int(round(res["events"].mean())),
+        "setup_seconds": setup,
+        "run_seconds": run_seconds,
+        "neighbor_table_bytes": int(sim.nbrs.nbytes),
+        "peak_rss_kb": 0,
+        "events_per_sec": float(res["events"].sum() / run_seconds) if run_seconds > 0 else 0.0,
+    }
+    if replications > 1:
+        metrics["ci"] = {name: estimate(res[name]) for name in ("mean_Q", "mean_W", "avg_req_dist")}
+    return res["hist"].mean(axis=0), metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Many small systems at once (NumPy lockstep engine)")
+    parser.add_argument("--n", type=int, default=16)
+    parser.add_argument("--R", type=int, default=1024, help="Replications (systems in the batch)")
+    parser.add_argument("--m", type=int, default=100000, help="Arrivals per replication")
+    parser.add_argument("--lambda", dest="lam", type=float, nargs="+", default=[0.9])
+    parser.add_argument("--mu", type=float, default=1.0)
+    parser.add_argument("--policy", default="pot", choices=["pot", "poKL", "spatialKL"])
+    parser.add_argument("--topo", default="cycle", choices=["cycle", "grid", "cluster"])
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--L", type=int, default=1)
+    parser.add_argument("--qmax", type=int, default=100)
+    parser.add_argument("--clusters", type=int, default=1)
+    parser.add_argument("--cost", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=123456789)
+    args = parser.parse_args()
+
+    print(f"{'lambda':>8} {'E[Q]':>10} {'95% CI':>21} {'n->inf':>10} {'finite n':>10} {'Mev/s':>7}")
+    for lam in args.lam:
+        params = {"n": args.n, "m": args.m, "lambda": lam, "mu": args.mu,
+                  "policy": args.policy, "topo": args.topo, "k": args.k, "L": args.L,
+                  "qmax": args.qmax, "clusters": args.clusters, "cost": args.cost,
+                  "seed": args.seed}
+        try:
+            _, m = run_point(params, args.R)
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        _, theory = mean_field.run_point(params)
+        _, refined = mean_field.run_point(params, finite_n=True)
+        ci = m.get("ci", {}).get("mean_Q", {"ci95_low": m["mean_Q"], "ci95_high": m["mean_Q"]})
+        print(f"{lam:>8.4f} {m['mean_Q']:>10.5f} [{ci['ci95_low']:>9.5f}, {ci['ci95_high']:>9.5f}] "
+              f"{theory['mean_Q']:>10.5f} {refined['mean_Q']:>10.5f} {m['events_per_sec'] / 1e6:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# ==========================================
+# Simulator speed benchmarks with regression baselines.
+#
+#   run      time a matrix of configurations, write the results as JSON
+#            (optionally comparing against a baseline right away)
+#   compare  compare two result files and flag regressions
+#
+# Matrix: n x policy x topology x arrivals (Poisson or a replayed trace),
+# all filterable, run through the binary or (--backend module) the loadbal
+# extension module. Every point runs in a fresh process, so peak RSS and
+# startup time (including the module import) belong to that point alone;
+# the best of --repeat runs is kept. Reported per point:
+#   events_per_sec    arrival + departure events per second of event loop
+#   ns_per_arrival    event-loop time per arrival
+#   ns_per_decision   time in choose_node per arrival (PROFILE=1 builds only)
+#   startup_seconds   process start to event loop (exec, neighbor table, trace)
+#   setup_seconds     neighbor table + trace load, as measured by the binary
+#   peak_rss_kb
+#
+#   python scripts/benchmark.py run --out bench.json
+#   python scripts/benchmark.py run --n 1000 10000 --baseline bench.json
+#   python scripts/benchmark.py compare bench.json new.json --threshold 0.1
+# ==========================================
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BIN_DIR = REPO_ROOT / "bin"
+BIN_PATH = BIN_DIR / "loadbal_sim"
+TRACE_TOOL = REPO_ROOT / "scripts" / "trace_tool.py"
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+POLICIES = ["pot", "poKL", "spatialKL"]
+TOPOLOGIES = ["cycle", "grid", "cluster"]
+ARRIVALS = ["poisson", "trace"]
+
+LAMBDA = 0.9
+CLUSTER_SIZE = 100          # servers per cluster for the cluster topology
+CHOICES = {                 # (k, L) per policy
+    "pot": (1, 1),
+    "poKL": (1, 1),
+    "spatialKL": (2, 1),
+}
+
+# Which direction is worse, per metric
+HIGHER_IS_BETTER = {"events_per_sec": True, "ns_per_arrival": False, "ns_per_decision": False,
+                    "startup_seconds": False, "peak_rss_kb": False}
+
+# ------------------------------------------
+# Running
+# ------------------------------------------
+def point_key(n, policy, topo, arrivals):
+    return f"n={n}/{policy}/{topo}/{arrivals}"
+
+def point_args(n, policy, topo, jobs, engine):
+    k, L = CHOICES[policy]
+    args = ["--n", n, "--m", jobs, "--lambda", LAMBDA, "--policy", policy,
+            "--topo", topo, "--k", k, "--L", L, "--engine", engine]
+    if topo == "cluster":
+        args += ["--clusters", max(1, n // CLUSTER_SIZE), "--cost", 1.0]
+    return [str(a) for a in args]
+
+def make_trace(work_dir, n, jobs):
+    """Synthetic Poisson trace at load LAMBDA for n servers (built once per size)."""
+    path = Path(work_dir) / f"bench_n{n}_m{jobs}.lbt"
+    if not path.exists():
+        subprocess.run([sys.executable, str(TRACE_TOOL), "synthesize", str(path),
+                        "-m", str(jobs), "--n", str(n), "--lambda", str(LAMBDA)],
+                       check=True, stdout=subprocess.DEVNULL)
+    return path
+
+def run_binary(binary, args):
+    """One run in its own process; (metrics, wall seconds)."""
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        subprocess.run([str(binary), *args, "--outdir", out_dir, "--tag", "bench"],
+                       check=True, stdout=subprocess.DEVNULL)
+        wall = time.perf_counter() - start
+        metrics = json.loads(next(Path(out_dir).glob("*_metrics.json")).read_text())
+    return metrics, wall
+
+# Child process of a module run: simulate, then print the metrics and peak RSS
+MODULE_CHILD = """
+import json, resource, sys
+sys.path.insert(0, sys.argv[1])
+import loadbal
+_, metrics = loadbal.run(**json.loads(sys.argv[2]))
+metrics["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps(metrics))
+"""
+
+def module_kwargs(args):
+    """The binary's --flag value list as loadbal.run() keyword arguments."""
+    names = {"lambda": "lam", "policy": "policy", "topo": "topo", "k": "k", "L": "L",
+             "n": "n", "m": "m", "clusters": "clusters", "cost": "cost",
+             "engine": "engine", "trace": "trace"}
+    kwargs = {}
+    for flag, value in zip(args[::2], args[1::2]):
+        key = names[flag[2:]]
+        kwargs[key] = value if key in ("policy", "topo", "engine", "trace") else float(value)
+    for key in ("n", "m", "k", "L", "clusters"):
+        if key in kwargs:
+            kwargs[key] = int(kwargs[key])
+    return kwargs
+
+def run_module(module_dir, args):
+    """One module run in its own interpreter; (metrics, wall seconds)."""
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", MODULE_CHILD, str(module_dir),
+                          json.dumps(module_kwargs(args))],
+                         check=True, capture_output=True, text=True).stdout
+    wall = time.perf_counter() - start
+    return json.loads(out.splitlines()[-1]), wall
+
+def measure(metrics, wall):
+    run = metrics["run_seconds"]
+    out = {
+        "events": metrics["events"],
+        "jobs": metrics["jobs_used"],
+        "run_seconds": run,
+        "events_per_sec": metrics["events"] / run if run > 0 else 0.0,
+        "ns_per_arrival": 1e9 * run / max(1, metrics["jobs_used"]),
+        "startup_seconds": max(0.0, wall - run),
+        "setup_seconds": metrics.get("setup_seconds", 0.0),
+        "peak_rss_kb": metrics["peak_rss_kb"],
+    }
+    phase = metrics.get("profile", {}).get("phases", {}).get("choose_node")
+    if phase and phase["calls"]:
+        out["ns_per_decision"] = 1e9 * phase["seconds"] / phase["calls"]
+    return out
+
+def best_of(runs):
+    """Fastest repeat; peak RSS and startup are the smallest seen."""
+    best = dict(min(runs, key=lambda r: r["run_seconds"]))
+    best["startup_seconds"] = min(r["startup_seconds"] for r in runs)
+    best["peak_rss_kb"] = min(r["peak_rss_kb"] for r in runs)
+    return best
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "-C", str(REPO_ROOT), "describe", "--always", "--dirty"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def cmd_run(args):
+    binary = Path(args.binary)
+    if args.backend == "binary" and not binary.exists():
+        sys.exit(f"Error: {binary} not found (run make)")
+    if args.backend == "module" and not list(Path(args.module_dir).glob("loadbal*.so")):
+        sys.exit(f"Error: no loadbal module in {args.module_dir} (run make module)")
+    points = list(itertools.product(args.n, args.policies, args.topos, args.arrivals))
+    results = {}
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="loadbal_bench_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Benchmarking {len(points)} points, {args.jobs} jobs each, best of {args.repeat}")
+    for i, (n, policy, topo, arrivals) in enumerate(points, 1):
+        key = point_key(n, policy, topo, arrivals)
+        cmd = point_args(n, policy, topo, args.jobs, args.engine)
+        if arrivals == "trace":
+            cmd += ["--trace", str(make_trace(work_dir, n, args.jobs))]
+        try:
+            if args.backend == "module":
+                runs = [measure(*run_module(args.module_dir, cmd)) for _ in range(args.repeat)]
+            else:
+                runs = [measure(*run_binary(binary, cmd)) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"[{i}/{len(points)}] {key}: failed ({e})")
+            continue
+        results[key] = best_of(runs)
+        r = results[key]
+        print(f"[{i}/{len(points)}] {key:<36} {r['events_per_sec'] / 1e6:7.2f}M ev/s  "
+              f"{r['ns_per_arrival']:8.1f} ns/arrival  startup {r['startup_seconds']:6.3f} s  "
+              f"RSS {r['peak_rss_kb'] / 1024:7.1f} MB")
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "host": platform.node(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "backend": args.backend,
+            "binary": str(binary) if args.backend == "binary" else args.module_dir,
+            "engine": args.engine,
+            "jobs": args.jobs,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Results written to {args.out}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+# ------------------------------------------
+# Comparing
+# ------------------------------------------
+def compare(baseline, current, threshold):
+    """Prints a metric-by-metric comparison; returns the list of regressions."""
+    regressions = []
+    base, cur = baseline["results"], current["results"]
+    for field in ("host", "backend", "engine", "jobs"):
+        if baseline["meta"].get(field) != current["meta"].get(field):
+            print(f"Note: {field} differs (baseline {baseline['meta'].get(field)}, "
+                  f"current {current['meta'].get(field)})")
+    shared = [k for k in cur if k in base]
+    print(f"{len(shared)} points in both files "
+          f"({len(set(base) - set(cur))} only in baseline, {len(set(cur) - set(base))} only in current)")
+    for key in shared:
+        for metric, higher_better in HIGHER_IS_BETTER.items():
+            if metric not in base[key] or metric not in cur[key] or not base[key][metric]:
+                continue
+            change = cur[key][metric] / base[key][metric] - 1.0
+            worse = -change if higher_better else change
+            if worse > threshold:
+                regressions.append((key, metric, base[key][metric], cur[key][metric], change))
+    for key, metric, old, new, change in regressions:
+        print(f"REGRESSION {key} {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    if not regressions:
+        print(f"No regressions beyond {threshold:.0%}")
+    return regressions
+
+def cmd_compare(args):
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    return 1 if compare(baseline, current, args.threshold) else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulator against a baseline")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="Run the benchmark matrix")
+    p.add_argument("--backend", default="binary", choices=["binary", "module"])
+    p.add_argument("--binary", default=str(BIN_PATH))
+    p.add_argument("--module-dir", default=str(BIN_DIR), help="Where `make module` put loadbal*.so")
+    p.add_argument("--out", default=None, help="Write results to this JSON file")
+    p.add_argument("--baseline", default=None, help="Compare against this earlier result file")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="Relative change that counts as a regression")
+    p.add_argument("--n", type=int, nargs="+", default=SIZES)
+    p.add_argument("--policies", nargs="+", default=POLICIES, choices=POLICIES)
+    p.add_argument("--topos", nargs="+", default=TOPOLOGIES, choices=TOPOLOGIES)
+    p.add_argument("--arrivals", nargs="+", default=ARRIVALS, choices=ARRIVALS)
+    p.add_argument("--jobs", type=int, default=2_000_000, help="Arrivals per run (--m)")
+    p.add_argument("--engine", default="heap", choices=["heap", "scan"])
+    p.add_argument("--repeat", type=int, default=3, help="Runs per point; the best is kept")
+    p.add_argument("--work-dir", default=None, help="Where generated traces are kept")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("compare", help="Compare two result files")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.10)
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# ==========================================
+# Mean-field (n -> infinity) model of the simulator, for screening sweeps
+# without simulating: stationary tail fractions s_q = P(Q >= q) and the
+# metrics derived from them, in the simulator's metrics schema.
+#
+# A job arrives at a uniform server s, which samples the same candidates
+# as Simulation::choose_node (s first, then neighbors, then global draws)
+# and joins the first candidate with the lowest score: the queue length,
+# plus the distance to s on the cluster topology. With candidate queues
+# independent and distributed as the stationary s, the fraction of
+# arrivals that join a server of length m, a_m(s), gives the fixed point
+#
+#   s_q = (lambda / mu) * sum_{m >= q-1} a_m(s),   q >= 1
+#
+# Without costs a_m only depends on s_m, s_{m+1} and the fixed point is an
+# explicit recursion (JSQ(d): s_q = rho^((d^q - 1) / (d - 1))), evaluated
+# for whole lambda x d grids at once. With costs it is solved by Newton's
+# method. spatialKL on the cycle and the grid is approximated by the same
+# independence assumption (neighbor queues are correlated in reality), and
+# flagged "approximate" in the metrics.
+#
+# finite_n=True adds the O(1/n) correction of the refined mean field
+# (Gast & Van Houdt, 2017), and for the cost-free policies the effect of
+# sampling distinct servers out of n.
+#
+#   hist, metrics = mean_field.run_point({"policy": "poKL", "k": 1, "L": 1,
+#                                         "lambda": 0.95, "n": 1000})
+#   mean_Q = mean_field.jsq_mean_queue(np.linspace(0.5, 0.99, 50), [2, 3, 4])
+#   python scripts/mean_field.py --policy poKL --k 1 --L 1 --lambda 0.9 0.95 0.99
+# ==========================================
+DEFAULTS = {
+    "n": 1000, "m": 0, "lambda": 0.9, "mu": 1.0,
+    "policy": "pot", "topo": "cycle", "k": 1, "L": 1, "qmax": 100,
+    "clusters": 1, "cost": 0.0,
+}
+
+NEWTON_TOL = 1e-12
+NEWTON_MAX_ITER = 60
+EPS = 1e-9              # score comparisons: costs are only known to float precision
+TAIL_CUTOFF = 1e-15     # levels beyond this tail fraction are dropped from the correction
+
+# ------------------------------------------
+# Candidate model
+# ------------------------------------------
+# A candidate is a list of options (probability, score cost, distance to s);
+# a model is a list of groups (fraction of arriving servers, candidates):
+# servers differ in their number of neighbors (grid boundary, last cluster).
+def grid_shape(n):
+    """(width, height) of the simulator's grid (Graph.hpp grid_width)."""
+    width = math.isqrt(n)
+    while width > 0 and n % width != 0:
+        width -= 1
+    if width == 1 and n > 1:
+        raise ValueError(f"n={n} is prime, it cannot form a rectangular grid")
+    return width, n // width
+
+def mean_random_distance(topo, n):
+    """Mean distance from a server to a uniform other server."""
+    if n <= 1:
+        return 0.0
+    if topo == "cycle":
+        return (n * n // 4) / (n - 1)
+    if topo == "grid":
+        w, h = grid_shape(n)
+        mean = (h * h - 1) / (3 * h) + (w * w - 1) / (3 * w)
+        return mean * n / (n - 1)
+    return 0.0
+
+def grid_degrees(n, k):
+    """{degree: fraction of servers} of the spatialKL grid neighbor lists."""
+    w, h = grid_shape(n)
+    r, c = np.divmod(np.arange(n), w)
+    deg = np.zeros(n, dtype=int)
+    for ok in (c + 1 < w, c - 1 >= 0, r + 1 < h, r - 1 >= 0):   # right, left, down, up
+        deg += ok & (deg < k)
+    values, counts = np.unique(deg, return_counts=True)
+    return {int(v): cnt / n for v, cnt in zip(values, counts)}
+
+def cluster_sizes(n, clusters):
+    """{cluster size: fraction of servers} (DistanceOracle's ceil-sized clusters)."""
+    if clusters <= 1:
+        return {n: 1.0}
+    per = -(-n // clusters)
+    sizes = {}
+    for begin in range(0, n, per):
+        size = min(per, n - begin)
+        sizes[size] = sizes.get(size, 0.0) + size / n
+    return sizes
+
+def build_model(p):
+    """(groups, cost_aware, approximate) for the parameters p (binary flag names)."""
+    policy, topo, n = p["policy"], p["topo"], int(p["n"])
+    k, L = max(0, int(p["k"])), max(0, int(p["L"]))
+    if policy not in ("pot", "poKL", "spatialKL"):
+        raise ValueError(f"unknown policy {policy}")
+    if topo not in ("cycle", "grid", "cluster"):
+        raise ValueError(f"unknown topology {topo}")
+    own = [(1.0, 0.0, 0.0)]
+
+    if topo == "cluster":
+        # Score = queue + distance; a cost of 0 counts hops with weight 1
+        w = p["cost"] if p["cost"] > 1e-9 else 1.0
+        groups = []
+        for size, frac in cluster_sizes(n, int(p["clusters"])).items():
+            local = 0
+            if policy == "spatialKL" and int(p["clusters"]) > 0:
+                local = min(k, size - 1)
+            draws = {"pot": 1, "poKL": k + L, "spatialKL": L}[policy]
+            draws = min(draws, n - 1 - local)
+            p_in = (size - 1 - local) / max(1, n - 1 - local)
+            remote = [(p_in, w, w), (1.0 - p_in, 2 * w, 2 * w)]
+            cands = [own] + [[(1.0, w, w)]] * local + [remote] * draws
+            groups.append((frac, cands))
+        return groups, True, False
+
+    far = mean_random_distance(topo, n)
+    if policy == "pot":
+        return [(1.0, [own, [(1.0, 0.0, far)]])], False, False
+    if policy == "poKL":
+        draws = min(k + L, n - 1)
+        return [(1.0, [own] + [[(1.0, 0.0, far)]] * draws)], False, False
+
+    # spatialKL on the cycle (offsets +1, -1, +2, -2, ...) or the grid
+    if topo == "cycle":
+        deg = min(k, n - 1)
+        near = [[(1.0, 0.0, float(min(o, n - o)))] for o in
+                ((i // 2 + 1) for i in range(deg))]
+        draws = min(L, n - 1 - deg)
+        return [(1.0, [own] + near + [[(1.0, 0.0, far)]] * draws)], False, True
+    groups = []
+    for deg, frac in grid_degrees(n, k).items():
+        draws = min(L, n - 1 - deg)
+        groups.append((frac, [own] + [[(1.0, 0.0, 1.0)]] * deg + [[(1.0, 0.0, far)]] * draws))
+    return groups, False, True
+
+def group_degrees(groups):
+    """{number of candidates: fraction} of a cost-free model."""
+    degrees = {}
+    for frac, cands in groups:
+        degrees[len(cands)] = degrees.get(len(cands), 0.0) + frac
+    return degrees
+
+# ------------------------------------------
+# Choice probabilities
+# ------------------------------------------
+def shifted(s, j):
+    """s_{m+j} for m = 0..K, with s = 1 below level 1 and 0 above level K."""
+    K1 = s.shape[-1]
+    idx = np.arange(K1) + j
+    out = np.take(s, np.clip(idx, 0, K1 - 1), axis=-1)
+    out = np.where(idx <= 0, 1.0, out)
+    return np.where(idx >= K1, 0.0, out)
+
+def choice(s, cands):
+    """
+    wins[j][o][..., m]: probability that candidate j, with option o, is
+    chosen with queue length m. s has levels 0..K on the last axis.
+    Earlier candidates win ties, as in Simulation::select_*.
+    """
+    cache = {}
+    def tail(j):
+        if j not in cache:
+            cache[j] = shifted(s, j)
+        return cache[j]
+
+    pmf = s - tail(1)
+    wins = []
+    for j, options in enumerate(cands):
+        row = []
+        for w, c, _ in options:
+            term = w * pmf
+            for i, other in enumerate(cands):
+                if i == j:
+                    continue
+                # P(score_i > m + c) for earlier candidates, >= for later ones
+                g = 0.0
+                for w2, c2, _ in other:
+                    delta = c - c2
+                    shift = math.floor(delta + EPS) + 1 if i < j else math.ceil(delta - EPS)
+                    g = g + w2 * tail(shift)
+                term = term * g
+            row.append(term)
+        wins.append(row)
+    return wins
+
+def join_fractions(s, groups):
+    """a_m(s): fraction of arrivals joining a server of length m."""
+    a = 0.0
+    for frac, cands in groups:
+        for row in choice(s, cands):
+            for term in row:
+                a = a + frac * term
+    return a
+
+def mean_distance(s, groups):
+    """Expected distance from the arrival server to the chosen one."""
+    dist = 0.0
+    for frac, cands in groups:
+        for options, row in zip(cands, choice(s, cands)):
+            for (_, _, d), term in zip(options, row):
+                dist = dist + frac * d * term.sum(axis=-1)
+    return dist
+
+def with_level0(x):
+    return np.concatenate([np.ones(x.shape[:-1] + (1,)), x], axis=-1)
+
+def drift(x, groups, lam, mu):
+    """d s_q / dt for q = 1..K (x = s_1..s_K): arrivals at q-1 minus departures at q."""
+    s = with_level0(x)
+    a = join_fractions(s, groups)
+    return lam * a[..., :-1] - mu * (s[..., 1:] - shifted(s, 1)[..., 1:])
+
+# ------------------------------------------
+# Fixed points
+# ------------------------------------------
+def all_at_least(x, degrees, n=None):
+    """
+    P(every candidate has a queue >= q) given x = s_q, for {d: fraction}
+    candidate counts: x^d, or with n, d distinct servers out of n.
+    """
+    total = 0.0
+    for d, frac in degrees.items():
+        if n is None:
+            total = total + frac * x ** d
+        else:
+            prod = 1.0
+            for i in range(d):
+                prod = prod * np.maximum(n * x - i, 0.0) / (n - i)
+            total = total + frac * prod
+    return total
+
+def jsq_tails(lam, degrees, levels, mu=1.0):
+    """
+    Tails s_0..s_levels of the cost-free model for every lambda, by the
+    recursion s_q = rho * P(s_{q-1}) (see all_at_least).
+    lam broadcasts: shape (...,) gives tails of shape (..., levels + 1).
+    """
+    rho = np.asarray(lam, dtype=float) / mu
+    s = np.empty(rho.shape + (levels + 1,))
+    s[..., 0] = 1.0
+    for q in range(1, levels + 1):
+        s[..., q] = np.minimum(rho * all_at_least(s[..., q - 1], degrees), 1.0)
+    return s
+
+def jsq_mean_queue(lambdas, ds, mu=1.0, qmax=100):
+    """
+    E[Q] per server of JSQ(d) (poKL with d = 1 + k + L) over a whole grid:
+    shape (len(lambdas), len(ds)), truncated at qmax like the simulator's
+    histogram.
+    """
+    lam = np.asarray(lambdas, dtype=float)[:, None]
+    out = np.empty((lam.shape[0], len(ds)))
+    for i, d in enumerate(ds):
+        out[:, i] = jsq_tails(lam[:, 0], {int(d): 1.0}, qmax, mu)[..., 1:].sum(axis=-1)
+    return out
+
+def solve_cost_aware(groups, lam, mu, levels):
+    """Newton's method on s_q = rho * sum_{m >= q-1} a_m(s), batched over lambda."""
+    lam = np.atleast_1d(np.asarray(lam, dtype=float))
+    rho = (lam / mu)[:, None]
+    d = max(len(c) for _, c in groups)
+    x = jsq_tails(lam, {d: 1.0}, levels, mu)[:, 1:]   # start from the cost-free fixed point
+
+    def residual(x):
+        a = join_fractions(with_level0(x), groups)
+        tails = np.cumsum(a[..., ::-1], axis=-1)[..., ::-1]
+        return rho.reshape(rho.shape + (1,) * (x.ndim - 2)) * tails[..., :-1] - x
+
+    h = 1e-7
+    eye = np.eye(levels)
+    for _ in range(NEWTON_MAX_ITER):
+        F = residual(x)
+        err = np.abs(F).max()
+        if err < NEWTON_TOL:
+            break
+        J = (residual(x[:, None, :] + h * eye) - F[:, None, :]) / h   # J[b, j, q] = dF_q / dx_j
+        step = np.linalg.solve(np.swapaxes(J, 1, 2), -F[..., None])[..., 0]
+        t = 1.0
+        while t > 1e-4:
+            trial = np.clip(x + t * step, 0.0, 1.0)
+            if np.abs(residual(trial)).max() < err:
+                break
+            t *= 0.5
+        x = trial
+    return with_level0(x)
+
+def refined_correction(s, groups, lam, mu):
+    """
+    V with E[s] = s + V / n + o(1/n) (refined mean field): solves the
+    Lyapunov equation A W + W A^T + Q = 0 of the fluctuations around the
+    fixed point and V = -A^{-1} (1/2 D^2 f : W). s: (B, K + 1).
+    """
+    x = s[:, 1:]
+    B, K = x.shape
+    lam_b = np.asarray(lam, dtype=float).reshape(B, 1)
+    lam_j = lam_b[:, :, None]
+
+    # Jacobian by central differences: A[b, q, j] = d f_q / d x_j
+    h = 1e-6
+    eye = np.eye(K)
+    fp = drift(x[:, None, :] + h * eye, groups, lam_j, mu)
+    fm = drift(x[:, None, :] - h * eye, groups, lam_j, mu)
+    A = np.swapaxes((fp - fm) / (2 * h), 1, 2)
+
+    # Jump covariance: every transition moves one coordinate by 1/n
+    a = join_fractions(s, groups)
+    Q = lam_b * a[:, :-1] + mu * (x - shifted(s, 1)[:, 1:])
+    evals, P = np.linalg.eig(A)
+    Pinv = np.linalg.inv(P)
+    Qt = Pinv @ (Q[:, :, None] * np.swapaxes(Pinv, 1, 2))
+    Wt = -Qt / (evals[:, :, None] + evals[:, None, :])
+    W = np.real(P @ Wt @ np.swapaxes(P, 1, 2))
+    W = 0.5 * (W + np.swapaxes(W, 1, 2))
+
+    # 1/2 D^2 f : W along the eigenvectors of W
+    sig, U = np.linalg.eigh(W)
+    dirs = np.swapaxes(U, 1, 2)                       # dirs[b, r] = r-th eigenvector
+    e = 1e-4
+    f0 = drift(x, groups, lam_b, mu)[:, None, :]
+    second = (drift(x[:, None, :] + e * dirs, groups, lam_j, mu)
+              + drift(x[:, None, :] - e * dirs, groups, lam_j, mu) - 2 * f0) / (e * e)
+    curvature = 0.5 * np.einsum("br,brq->bq", sig, second)
+    return -np.linalg.solve(A, curvature[..., None])[..., 0], A
+
+# ------------------------------------------
+# Points in the simulator's schema
+# ------------------------------------------
+def solve(points, finite_n=False):
+    """
+    Stationary tails for a list of parameter dicts; points that share
+    everything but lambda are solved as one batch. Returns one
+    (s, avg_req_dist, approximate) per point, s on levels 0..qmax.
+    """
+    batches = {}
+    for i, p in enumerate(points):
+        key = tuple(sorted((k, v) for k, v in p.items() if k != "lambda"))
+        batches.setdefault(key, []).append(i)
+
+    out = [None] * len(points)
+    for idx in batches.values():
+        p = points[idx[0]]
+        lam = np.array([points[i]["lambda"] for i in idx], dtype=float)
+        mu, qmax, n = float(p["mu"]), int(p["qmax"]), int(p["n"])
+        groups, cost_aware, approximate = build_model(p)
+
+        if cost_aware:
+            # Costs couple levels up to 2 * cost apart: solve a bit past qmax
+            top = max(c for _, cands in groups for opts in cands for _, c, _ in opts)
+            s = solve_cost_aware(groups, lam, mu, qmax + 2 * math.ceil(top) + 8)
+        else:
+            s = jsq_tails(lam, group_degrees(groups), qmax, mu)
+        dist = mean_distance(s, groups)
+
+        if finite_n and n > 1:
+            used = np.nonzero((s > TAIL_CUTOFF).any(axis=0))[0].max() + 2
+            used = min(used, s.shape[1])
+            V, A = refined_correction(s[:, :used], groups, lam, mu)
+            corr = V / n
+            if not cost_aware:
+                # Candidates are distinct servers: the arrival term of the
+                # finite system differs from the mean field's by O(1/n)
+                degrees = group_degrees(groups)
+                top = s[:, :used]
+                diff = all_at_least(top, degrees, n) - all_at_least(top, degrees)
+                diff_next = np.concatenate([diff[:, 1:], np.zeros((len(idx), 1))], axis=1)
+                f1 = lam[:, None] * (diff - diff_next)[:, :-1]
+                corr = corr - np.linalg.solve(A, f1[..., None])[..., 0]
+            s = s.copy()
+            s[:, 1:used] = np.clip(s[:, 1:used] + corr, 0.0, 1.0)
+            s[:, 1:] = np.minimum.accumulate(s[:, 1:], axis=1)
+
+        for j, i in enumerate(idx):
+            out[i] = (s[j, :qmax + 1], float(dist[j]), approximate)
+    return out
+
+def to_metrics(p, s, dist, approximate, seconds, finite_n):
+    """(hist, metrics) with the simulator's field names."""
+    hist = s - shifted(s, 1)
+    hist[-1] = s[-1]                    # lengths >= qmax share the overflow bin
+    mean_Q = float(s[1:].sum())
+    metrics = {
+        "policy": p["policy"], "graph": p["topo"], "n": int(p["n"]), "m": int(p["m"]),
+        "lambda": p["lambda"], "mu": p["mu"], "k": int(p["k"]), "L": int(p["L"]),
+        "qmax": int(p["qmax"]), "num_clusters": int(p["clusters"]),
+        "comm_cost": p["cost"], "engine": "mean_field", "seed": 0,
+        "replications": 1, "threads": 1,
+        "total_req_dist": 0.0,
+        "mean_Q": mean_Q,
+        "mean_W": mean_Q / p["lambda"] if p["lambda"] > 0 else 0.0,
+        "avg_req_dist": dist,
+        "loop_heap_allocs": 0, "jobs_used": 0, "warmup_jobs": 0, "events": 0,
+        "setup_seconds": 0.0, "run_seconds": seconds,
+        "neighbor_table_bytes": 0, "peak_rss_kb": 0,
+        "solver": "mean_field", "finite_n": bool(finite_n), "approximate": approximate,
+    }
+    return hist, metrics
+
+def run_points(points, finite_n=False):
+    """[(hist, metrics)] for a list of parameter dicts (binary flag names)."""
+    points = [{**DEFAULTS, **p} for p in points]
+    start = time.perf_counter()
+    solved = solve(points, finite_n)
+    seconds = (time.perf_counter() - start) / max(1, len(points))
+    return [to_metrics(p, *res, seconds, finite_n) for p, res in zip(points, solved)]
+
+def run_point(params, finite_n=False):
+    """Mean-field counterpart of sim_runner.run_point: (hist, metrics)."""
+    return run_points([params], finite_n)[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Mean-field screening of simulation points")
+    parser.add_argument("--policy", default="pot", choices=["pot", "poKL", "spatialKL"])
+    parser.add_argument("--topo", default="cycle", choices=["cycle", "grid", "cluster"])
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--lambda", dest="lam", type=float, nargs="+", default=[0.9])
+    parser.add_argument("--mu", type=float, default=1.0)
+    parser.add_argument("--k", type=int, nargs="+", default=[1])
+    parser.add_argument("--L", type=int, nargs="+", default=[1])
+    parser.add_argument("--qmax", type=int, default=100)
+    parser.add_argument("--clusters", type=int, default=1)
+    parser.add_argument("--cost", type=float, default=0.0)
+    parser.add_argument("--finite-n", action="store_true",
+                        help="Add the O(1/n) correction for n servers")
+    parser.add_argument("--outdir", default=None,
+                        help="Write <point>_metrics.json and <point>_hist.csv here")
+    args = parser.parse_args()
+
+    points = [{"n": args.n, "lambda": lam, "mu": args.mu, "policy": args.policy,
+               "topo": args.topo, "k": k, "L": L, "qmax": args.qmax,
+               "clusters": args.clusters, "cost": args.cost}
+              for k in args.k for L in args.L for lam in args.lam]
+    start = time.perf_counter()
+    try:
+        results = run_points(points, args.finite_n)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    elapsed = time.perf_counter() - start
+
+    print(f"{'k':>3} {'L':>3} {'lambda':>8} {'E[Q]':>10} {'E[W]':>10} {'dist':>8}")
+    for hist, m in results:
+        print(f"{m['k']:>3} {m['L']:>3} {m['lambda']:>8.4f} {m['mean_Q']:>10.5f} "
+              f"{m['mean_W']:>10.5f} {m['avg_req_dist']:>8.3f}"
+              + ("  (approximate)" if m["approximate"] else ""))
+    print(f"{len(results)} points in {elapsed * 1e3:.1f} ms")
+
+    if args.outdir:
+        out = Path(args.outdir)
+        out.mkdir(parents=True, exist_ok=True)
+        for hist, m in results:
+            base = f"{m['policy']}_{m['graph']}_n{m['n']}_lam{m['lambda']:.2f}_k{m['k']}_L{m['L']}_mf"
+            (out / f"{base}_metrics.json").write_text(json.dumps(m, indent=2) + "\n")
+            with open(out / f"{base}_hist.csv", "w") as f:
+                f.write("QueueLength,Probability\n")
+                for i, v in enumerate(hist):
+                    if v > 0.0:
+                        f.write(f"{i},{v!r}\n")
+        print(f"Wrote {len(results)} points to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,23 @@
 import matplotlib.pyplot as plt
-import json
 import pandas as pd
 from pathlib import Path
 import sys
 
+import results_store
+
 # Update this path if your results are elsewhere
 RESULTS_DIR = Path("experiments_10_12_2025/results_large_scale") 
 
 def plot_cost_vs_lambda():
-    json_files = sorted(RESULTS_DIR.glob("*_metrics.json"))
+    df = results_store.load_metrics(RESULTS_DIR)
     
-    if not json_files:
-        print(f"No metrics.json files found in {RESULTS_DIR}")
-        return
-
-    data = []
-    print(f"Found {len(json_files)} files. Parsing...")
-
-    for f in json_files:
-        try:
-            with open(f, 'r') as file:
-                content = json.load(file)
-                # 'avg_req_dist' is your E[c]
-                if "avg_req_dist" in content:
-                    data.append({
-                        "Policy": content.get("policy", "Unknown"),
-                        "Lambda": content.get("lambda", 0.0),
-                        "Cost": content["avg_req_dist"]
-                    })
-        except Exception as e:
-            print(f"Skipping {f.name}: {e}")
-
-    if not data:
-        print("No valid data found.")
+    if df.empty or "avg_req_dist" not in df:
+        print(f"No results found in {RESULTS_DIR}")
         return
 
-    df = pd.DataFrame(data)
+    print(f"Loaded {len(df)} runs.")
+    # 'avg_req_dist' is your E[c]
+    df = df.rename(columns={"policy": "Policy", "lambda": "Lambda", "avg_req_dist": "Cost"})
     df = df.sort_values("Lambda")
 
     plt.figure(figsize=(10, 6))
@@ -1,58 +1,34 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 from pathlib import Path
-import re
+import numpy as np
 
-RESULTS_DIR = Path("experiments_10_12_2025/results_large_scale")
+import results_store
 
-def get_hist_data(file_path):
-    """Reads CSV and returns {QueueLength: Probability} series."""
-    try:
-        df = pd.read_csv(file_path)
-        # Clean potential whitespace in headers
-        df.columns = [c.strip() for c in df.columns] 
-        return df.set_index("QueueLength")["Probability"]
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-        return None
+RESULTS_DIR = Path("experiments_10_12_2025/results_large_scale")
 
 def calculate_distribution_distance():
-    # Find all histogram files
-    files = sorted(RESULTS_DIR.glob("*_hist.csv"))
-    
-    # Group files by Lambda
-    # We expect filenames like: policy_cluster_n525_lam0.9500_...
-    # We will group by 'lam0.XXXX'
-    groups = {}
-    pattern = re.compile(r"(?P<policy>[a-zA-Z]+)_.*_lam(?P<lam>0\.\d+)")
-
-    for f in files:
-        match = pattern.search(f.name)
-        if match:
-            pol = match.group("policy")
-            lam = float(match.group("lam"))
-            
-            if lam not in groups: groups[lam] = {}
-            groups[lam][pol] = f
+    runs = results_store.load_metrics(RESULTS_DIR)
+    if runs.empty:
+        print(f"No results found in {RESULTS_DIR}")
+        return
 
     results = []
     
     # Compare poKL vs spatialKL for each Lambda
-    for lam, pair in sorted(groups.items()):
+    for lam, group in runs.groupby(runs["lambda"].round(4)):
+        pair = {row["policy"]: row["hist"] for _, row in group.iterrows()}
         if 'poKL' in pair and 'spatialKL' in pair:
             print(f"Processing Lambda {lam}...")
             
-            # 1. Load Distributions
-            s1 = get_hist_data(pair['poKL'])
-            s2 = get_hist_data(pair['spatialKL'])
-            
-            if s1 is None or s2 is None: continue
-
-            # 2. Align DataFrames (fill missing queue lengths with 0)
-            df = pd.DataFrame({'p1': s1, 'p2': s2}).fillna(0.0)
+            # 1. Align distributions (missing queue lengths are 0)
+            p1, p2 = pair['poKL'], pair['spatialKL']
+            width = max(len(p1), len(p2))
+            p1 = np.pad(p1, (0, width - len(p1)))
+            p2 = np.pad(p2, (0, width - len(p2)))
             
-            # 3. Calculate L1 Distance: Sum |P1 - P2|
-            l1_dist = (df['p1'] - df['p2']).abs().sum()
+            # 2. Calculate L1 Distance: Sum |P1 - P2|
+            l1_dist = np.abs(p1 - p2).sum()
             
             results.append({"Lambda": lam, "L1_Distance": l1_dist})
 
@@ -1,42 +1,36 @@
 import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
 from pathlib import Path
 import sys
 from matplotlib.ticker import MultipleLocator
+
+import results_store
+
 # Directory containing results
 RESULTS_DIR = Path("experiments_10_12_2025/large_scale_queue")
 
 def plot_distributions():
-    # Find all histogram files
-    hist_files = sorted(RESULTS_DIR.glob("*_hist.csv"))
+    runs = results_store.load_metrics(RESULTS_DIR)
     
-    if not hist_files:
-        print(f"No *_hist.csv files found in {RESULTS_DIR}. Run simulations first.")
+    if runs.empty:
+        print(f"No results found in {RESULTS_DIR}. Run simulations first.")
         return
 
     plt.figure(figsize=(10, 6))
     
-    # Loop through each file and plot
-    for file_path in hist_files:
-        try:
-            # Parse filename to get a label (e.g., "pot_cycle_n1000_lam0.95")
-            label = file_path.stem.replace("_hist", "")
-            
-            # Read CSV
-            df = pd.read_csv(file_path)
-            
-            # Clean column names (remove leading spaces/comments)
-            df.columns = [c.strip().replace("# ", "") for c in df.columns]
-            
-            if "QueueLength" not in df.columns or "Probability" not in df.columns:
-                print(f"Skipping {file_path.name}: Unexpected columns {df.columns}")
-                continue
-
-            # Plot Line with Markers
-            plt.plot(df["QueueLength"], df["Probability"], marker='o', linewidth=2, label=label)
-            
-        except Exception as e:
-            print(f"Error processing {file_path.name}: {e}")
+    # Plot every run's histogram
+    for _, run in runs.iterrows():
+        hist = run["hist"]
+        # Label: tag, or for per-run files the filename (e.g. "pot_cycle_n1000_lam0.95")
+        label = run["name"] or f"{run['policy']}_{run['graph']}_lam{run['lambda']:.2f}"
+        
+        k = np.nonzero(hist)[0]
+        if len(k) == 0:
+            print(f"Skipping {label}: no histogram")
+            continue
+
+        # Plot Line with Markers
+        plt.plot(k, hist[k], marker='o', linewidth=2, label=label)
 
     # Formatting
     plt.title("Queue Length Distribution Comparison", fontsize=14)
@@ -1,42 +1,24 @@
 import matplotlib.pyplot as plt
-import json
 import pandas as pd
 from pathlib import Path
 
+import results_store
+
 RESULTS_DIR = Path("experiments_10_12_2025/results_large_scale") 
 
 def plot_waiting_time():
-    json_files = sorted(RESULTS_DIR.glob("*_metrics.json"))
-    data = []
-
-    for f in json_files:
-        try:
-            with open(f, 'r') as file:
-                content = json.load(file)
-                
-                # 1. Get E[R] (mean_W in your code)
-                e_r = content.get("mean_W", 0.0)
-                
-                # 2. Get Service Rate (mu)
-                mu = content.get("mu", 1.0)
-                
-                # 3. Calculate E[W] = E[R] - 1/mu
-                avg_service_time = 1.0 / mu if mu > 0 else 0
-                e_w = e_r - avg_service_time
-                
-                # Safety check: E[W] theoretically can't be negative, 
-                # but statistical noise in low-load sims might make it slightly < 0.
-                if e_w < 0: e_w = 0 
-
-                data.append({
-                    "Policy": content.get("policy", "Unknown"),
-                    "Lambda": content.get("lambda", 0.0),
-                    "WaitingTime": e_w
-                })
-        except Exception as e:
-            print(f"Skipping {f.name}: {e}")
-
-    df = pd.DataFrame(data)
+    df = results_store.load_metrics(RESULTS_DIR)
+    if df.empty:
+        print(f"No results found in {RESULTS_DIR}")
+        return
+
+    # E[W] = E[R] - 1/mu, with E[R] being mean_W in your code.
+    # E[W] theoretically can't be negative, but statistical noise in
+    # low-load sims might make it slightly < 0.
+    mu = df["mu"].fillna(1.0)
+    avg_service_time = (1.0 / mu).where(mu > 0, 0.0)
+    df["WaitingTime"] = (df["mean_W"].fillna(0.0) - avg_service_time).clip(lower=0)
+    df = df.rename(columns={"policy": "Policy", "lambda": "Lambda"})
     df = df.sort_values("Lambda")
 
     plt.figure(figsize=(10, 6))
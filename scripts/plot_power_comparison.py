@@ -1,9 +1,9 @@
 import matplotlib.pyplot as plt
 import pandas as pd
-import json
-import re
 from pathlib import Path
 
+import results_store
+
 # ==========================================
 # CONFIGURATION
 # ==========================================
@@ -27,47 +27,27 @@ STYLES = {
 }
 
 def load_data():
-    data = []
-    # Recursively find all json files
-    files = sorted(RESULTS_DIR.rglob("*_metrics.json"))
+    runs = results_store.load_metrics(RESULTS_DIR)
     
-    if not files:
+    if runs.empty:
         print(f"No results found in {RESULTS_DIR}")
         return pd.DataFrame()
 
-    print(f"Loading {len(files)} files...")
+    print(f"Loaded {len(runs)} runs...")
     
-    # Regex to extract info from filename if needed, 
-    # but we can rely mostly on JSON content + folder name.
+    # Power (P): the own server plus k + L sampled candidates
+    power = (runs["k"].fillna(0) + runs["L"].fillna(0) + 1).astype(int)
     
-    for f in files:
-        try:
-            with open(f, 'r') as file:
-                content = json.load(file)
-                
-                # Extract Power (P) from the tag or filename
-                # Filename format: ..._P3_...
-                match = re.search(r"_P(\d+)_", f.name)
-                power = int(match.group(1)) if match else 0
-                
-                if power not in POWERS_TO_PLOT:
-                    continue
-
-                topo = f.parent.name # 'grid' or 'cycle'
-                
-                data.append({
-                    "Topology": topo,
-                    "Policy": content.get("policy"),
-                    "Power": power,
-                    "Lambda": content.get("lambda"),
-                    "E_Q": content.get("mean_Q", 0),      # E[Q]
-                    "E_R": content.get("mean_W", 0),      # E[R] (Response Time)
-                    "E_c": content.get("avg_req_dist", 0) # E[c] (Cost)
-                })
-        except Exception as e:
-            pass # Skip broken files
-
-    return pd.DataFrame(data)
+    df = pd.DataFrame({
+        "Topology": runs["graph"],                  # 'grid' or 'cycle'
+        "Policy": runs["policy"],
+        "Power": power,
+        "Lambda": runs["lambda"],
+        "E_Q": runs["mean_Q"].fillna(0),            # E[Q]
+        "E_R": runs["mean_W"].fillna(0),            # E[R] (Response Time)
+        "E_c": runs["avg_req_dist"].fillna(0),      # E[c] (Cost)
+    })
+    return df[df["Power"].isin(POWERS_TO_PLOT)]
 
 def plot_metric(df, topo, metric_col, ylabel, title_suffix, filename_suffix):
     subset = df[df["Topology"] == topo].copy()
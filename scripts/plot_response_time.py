@@ -1,44 +1,23 @@
 import matplotlib.pyplot as plt
-import json
 import pandas as pd
 from pathlib import Path
 import sys
 
+import results_store
+
 # Update this path to your results folder (e.g., results_large_scale)
 RESULTS_DIR = Path("experiments_10_12_2025/results_large_scale") 
 
 def plot_response_time():
-    # Find all JSON metric files
-    json_files = sorted(RESULTS_DIR.glob("*_metrics.json"))
+    df = results_store.load_metrics(RESULTS_DIR)
     
-    if not json_files:
-        print(f"No metrics.json files found in {RESULTS_DIR}")
-        return
-
-    data = []
-    print(f"Found {len(json_files)} files. Parsing...")
-
-    for f in json_files:
-        try:
-            with open(f, 'r') as file:
-                content = json.load(file)
-                
-                # 'mean_W' in your code is actually E[R] (Response Time)
-                if "mean_W" in content:
-                    data.append({
-                        "Policy": content.get("policy", "Unknown"),
-                        "Lambda": content.get("lambda", 0.0),
-                        "ResponseTime": content["mean_W"]
-                    })
-        except Exception as e:
-            print(f"Skipping {f.name}: {e}")
-
-    if not data:
-        print("No valid data found.")
+    if df.empty or "mean_W" not in df:
+        print(f"No results found in {RESULTS_DIR}")
         return
 
-    # Create DataFrame
-    df = pd.DataFrame(data)
+    print(f"Loaded {len(df)} runs.")
+    # 'mean_W' in your code is actually E[R] (Response Time)
+    df = df.rename(columns={"policy": "Policy", "lambda": "Lambda", "mean_W": "ResponseTime"})
     df = df.sort_values("Lambda")
 
     # Plotting
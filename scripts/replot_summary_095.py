@@ -1,9 +1,9 @@
 import matplotlib.pyplot as plt
 import pandas as pd
-import json
-import re
 from pathlib import Path
 
+import results_store
+
 # ==========================================
 # CONFIGURATION
 # ==========================================
@@ -15,47 +15,28 @@ def main():
     print(f"--- Re-plotting Summary Graphs for Lambda={TARGET_LAMBDA} ---")
     
     # 1. Load Data
-    data = []
-    files = sorted(RESULTS_DIR.rglob("*_metrics.json"))
+    runs = results_store.load_metrics(RESULTS_DIR)
     
-    if not files:
-        print("No result files found. Wait for simulation to finish.")
+    if runs.empty:
+        print("No results found. Wait for simulation to finish.")
         return
 
-    print(f"Scanning {len(files)} files...")
+    print(f"Scanning {len(runs)} runs...")
     
-    for f in files:
-        try:
-            with open(f, 'r') as file:
-                content = json.load(file)
-                
-                # Check Lambda
-                lam = content.get("lambda", 0.0)
-                # Float comparison tolerance
-                if abs(lam - TARGET_LAMBDA) > 0.001:
-                    continue
-
-                # Extract Power
-                match = re.search(r"_P(\d+)_", f.name)
-                power = int(match.group(1)) if match else 0
-                
-                topo = f.parent.name
-                
-                data.append({
-                    "Topology": topo,
-                    "Policy": content.get("policy"),
-                    "Power": power,
-                    "Mean_W": content.get("mean_W", 0),      # E[R]
-                    "Cost": content.get("avg_req_dist", 0)   # E[c]
-                })
-        except:
-            pass
-
-    if not data:
+    # Float comparison tolerance
+    runs = runs[(runs["lambda"] - TARGET_LAMBDA).abs() <= 0.001]
+    if runs.empty:
         print(f"No data found for Lambda {TARGET_LAMBDA} yet.")
         return
 
-    df = pd.DataFrame(data)
+    # Power: the own server plus k + L sampled candidates
+    df = pd.DataFrame({
+        "Topology": runs["graph"],
+        "Policy": runs["policy"],
+        "Power": (runs["k"].fillna(0) + runs["L"].fillna(0) + 1).astype(int),
+        "Mean_W": runs["mean_W"].fillna(0),        # E[R]
+        "Cost": runs["avg_req_dist"].fillna(0),    # E[c]
+    })
 
     # 2. Plotting
     for topo in TOPOLOGIES:
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# ==========================================
+# Content-addressed cache of simulation results, shared by every sweep script
+# through sim_runner.run_point.
+#
+# The key is a SHA-256 of the full canonicalized parameter set plus a
+# fingerprint of the simulator build, so changing any parameter (m, cost,
+# qmax, seed, ...) or rebuilding the simulator is always a miss. KEY_VERSION
+# is bumped to drop every entry when a fix to the way results are produced
+# does not change the build (e.g. in sim_runner). Entries are
+# single JSON files written atomically (temp file + rename), so concurrent
+# workers never see a partial entry. Hits refresh the entry's mtime, and
+# prune() evicts least recently used entries beyond max_bytes.
+#
+# Location:  $LOADBAL_CACHE_DIR          (default <repo>/.sim_cache)
+# Size cap:  $LOADBAL_CACHE_MAX_BYTES    (default 2 GiB)
+# ==========================================
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DIR = Path(os.environ.get("LOADBAL_CACHE_DIR", REPO_ROOT / ".sim_cache"))
+DEFAULT_MAX_BYTES = int(os.environ.get("LOADBAL_CACHE_MAX_BYTES", 2 << 30))
+PRUNE_EVERY = 64            # puts between automatic prune() passes
+SAMPLE_BYTES = 1 << 20      # trace head/tail hashed for its fingerprint
+KEY_VERSION = 2             # 2: the binary fallback now passes --qmax
+
+_fingerprints = {}
+
+def file_fingerprint(path, full=True):
+    """
+    SHA-256 of a file's contents (full=True), or of its size plus first and
+    last MiB (full=False, for multi-GB traces). Memoized per (path, size, mtime).
+    """
+    path = Path(path)
+    st = path.stat()
+    memo = (str(path.resolve()), st.st_size, st.st_mtime_ns, full)
+    if memo not in _fingerprints:
+        h = hashlib.sha256(str(st.st_size).encode())
+        with open(path, "rb") as f:
+            if full or st.st_size <= 2 * SAMPLE_BYTES:
+                for block in iter(lambda: f.read(SAMPLE_BYTES), b""):
+                    h.update(block)
+            else:
+                h.update(f.read(SAMPLE_BYTES))
+                f.seek(-SAMPLE_BYTES, os.SEEK_END)
+                h.update(f.read(SAMPLE_BYTES))
+        _fingerprints[memo] = h.hexdigest()
+    return _fingerprints[memo]
+
+def canonical_params(params, defaults):
+    """
+    Full parameter set with every value coerced to the type of its default,
+    so 0.9 / "0.9" / 0.90 or 1e8 / 100000000 give the same key. A trace path
+    is replaced by a fingerprint of the file it points to.
+    """
+    p = dict(defaults, **params)
+    out = {}
+    for key, value in p.items():
+        kind = type(defaults.get(key, value))
+        if kind is bool:
+            value = bool(value)
+        elif kind is int:
+            value = int(float(value))
+        elif kind is float:
+            value = float(value)
+        else:
+            value = str(value)
+        out[key] = value
+    if out.get("trace"):
+        out["trace"] = "sha256:" + file_fingerprint(out["trace"], full=False)
+    return out
+
+class ResultCache:
+    def __init__(self, build_file, defaults, root=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        build_file: the simulator binary or extension module whose contents
+        identify the build. defaults: parameter defaults (sim_runner.DEFAULTS).
+        """
+        self.root = Path(root)
+        self.build_file = Path(build_file)
+        self.defaults = defaults
+        self.max_bytes = max_bytes
+        self.puts = 0
+
+    def key(self, params):
+        build = file_fingerprint(self.build_file) if self.build_file.exists() else "unbuilt"
+        blob = json.dumps({"version": KEY_VERSION, "build": build,
+                           "params": canonical_params(params, self.defaults)},
+                          sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _path(self, key):
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, params):
+        """(hist, metrics) for these parameters, or None on a miss."""
+        path = self._path(self.key(params))
+        try:
+            entry = json.loads(path.read_text())
+            os.utime(path)   # recency for LRU eviction
+        except (OSError, ValueError):
+            return None
+        return np.asarray(entry["hist"], dtype=np.float64), entry["metrics"]
+
+    def put(self, params, hist, metrics):
+        key = self.key(params)
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "key": key,
+            "params": canonical_params(params, self.defaults),
+            "created": time.time(),
+            "metrics": metrics,
+            "hist": [float(x) for x in hist],
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.puts += 1
+        if self.puts % PRUNE_EVERY == 0:
+            self.prune()
+        return key
+
+    def prune(self):
+        """Evicts least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass   # evicted by another worker
+            total -= size
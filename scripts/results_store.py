@@ -0,0 +1,122 @@
+import json
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# Reader / writer for the SQLite result store (loadbal_sim --store).
+# One row per run: every parameter and metric under its _metrics.json name,
+# the full-precision histogram as a float64 blob and the complete JSON
+# record. Sweeps load with a single query instead of globbing files.
+# ==========================================
+STORE_NAME = "results.db"
+
+# Same table as src/ResultStore.cpp
+COLUMNS = [
+    ("policy", "TEXT"), ("graph", "TEXT"), ("n", "INTEGER"), ("m", "INTEGER"),
+    ("lambda", "REAL"), ("mu", "REAL"), ("k", "INTEGER"), ("L", "INTEGER"),
+    ("qmax", "INTEGER"), ("num_clusters", "INTEGER"), ("comm_cost", "REAL"),
+    ("trace", "TEXT"), ("tag", "TEXT"), ("engine", "TEXT"), ("seed", "INTEGER"),
+    ("replications", "INTEGER"), ("threads", "INTEGER"),
+    ("total_req_dist", "REAL"), ("mean_Q", "REAL"), ("mean_W", "REAL"),
+    ("avg_req_dist", "REAL"), ("loop_heap_allocs", "INTEGER"),
+    ("setup_seconds", "REAL"), ("run_seconds", "REAL"),
+    ("neighbor_table_bytes", "INTEGER"), ("peak_rss_kb", "INTEGER"),
+    ("hist", "BLOB"), ("record", "TEXT"),
+]
+
+def connect(path):
+    conn = sqlite3.connect(str(path), timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    cols = ", ".join(f"{name} {kind}" for name, kind in COLUMNS)
+    conn.execute("CREATE TABLE IF NOT EXISTS runs ("
+                 f"id INTEGER PRIMARY KEY, created TEXT DEFAULT CURRENT_TIMESTAMP, {cols})")
+    return conn
+
+def append(path, metrics, hist):
+    """
+    Stores one run given as (metrics dict, histogram), e.g. from
+    sim_runner.run_point. A run whose 'cache_key' is already stored is
+    skipped, so re-running a cached sweep does not duplicate rows.
+    """
+    record = dict(metrics)
+    record["hist"] = [float(p) for p in hist]
+    row = {name: metrics.get(name) for name, _ in COLUMNS}
+    if row["seed"] is not None and row["seed"] >= 2**63:
+        row["seed"] -= 2**64   # stored as signed 64-bit, as the binary does
+    row["hist"] = np.asarray(hist, dtype="<f8").tobytes()
+    row["record"] = json.dumps(record)
+    names = list(row)
+    key = metrics.get("cache_key")
+    conn = connect(path)
+    with conn:
+        stored = key and conn.execute(
+            "SELECT 1 FROM runs WHERE json_extract(record, '$.cache_key') = ?", (key,)).fetchone()
+        if not stored:
+            conn.execute(f"INSERT INTO runs ({', '.join(names)}) "
+                         f"VALUES ({', '.join('?' * len(names))})", [row[n] for n in names])
+    conn.close()
+
+def load_results(path, **filters):
+    """
+    All runs in the store as a DataFrame, one row per run; 'hist' holds
+    NumPy arrays. Keyword arguments filter on equality, e.g.
+    load_results("results.db", policy="spatialKL", graph="grid").
+    """
+    where, args = [], []
+    for key, value in filters.items():
+        if key not in dict(COLUMNS):
+            raise KeyError(f"unknown column {key}")
+        where.append(f"{key} = ?")
+        args.append(value)
+    sql = "SELECT * FROM runs" + (" WHERE " + " AND ".join(where) if where else "")
+    with connect(path) as conn:
+        df = pd.read_sql_query(sql, conn, params=args)
+    conn.close()
+    df["seed"] = df["seed"].astype("int64").astype("uint64")
+    df["hist"] = [np.frombuffer(b, dtype="<f8") if b is not None else np.zeros(0)
+                  for b in df["hist"]]
+    return df
+
+def hist_matrix(df):
+    """Histograms of the rows of `df` stacked into one (runs x bins) array."""
+    width = max((len(h) for h in df["hist"]), default=0)
+    out = np.zeros((len(df), width))
+    for i, h in enumerate(df["hist"]):
+        out[i, :len(h)] = h
+    return out
+
+def load_metrics(results_dir):
+    """
+    Results of a directory as a DataFrame with the store's columns, plus
+    'name': the run's tag, or for legacy files the filename stem. Read from
+    results_dir/results.db when present, otherwise from the per-run
+    *_metrics.json / *_hist.csv files (searched recursively).
+    """
+    results_dir = Path(results_dir)
+    store = results_dir / STORE_NAME
+    if store.exists():
+        df = load_results(store)
+        df["name"] = df["tag"].fillna("")
+        return df
+
+    rows = []
+    for f in sorted(results_dir.rglob("*_metrics.json")):
+        try:
+            content = json.loads(f.read_text())
+        except (OSError, ValueError) as e:
+            print(f"Skipping {f.name}: {e}")
+            continue
+        content["name"] = f.name[:-len("_metrics.json")]
+        hist_file = f.with_name(f.name.replace("_metrics.json", "_hist.csv"))
+        hist = np.zeros(0)
+        if hist_file.exists():
+            table = np.loadtxt(hist_file, delimiter=",", skiprows=1, ndmin=2)
+            if table.size:
+                hist = np.zeros(int(table[:, 0].max()) + 1)
+                hist[table[:, 0].astype(int)] = table[:, 1]
+        content["hist"] = hist
+        rows.append(content)
+    return pd.DataFrame(rows)
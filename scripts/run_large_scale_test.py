@@ -1,15 +1,17 @@
 import subprocess
-import json
 import matplotlib.pyplot as plt
 import pandas as pd
 import time
 import sys
 from pathlib import Path
 
+import adaptive_sweep
+import results_store
+import sim_runner
+
 # ==========================================
 # CONFIGURATION
 # ==========================================
-BIN_PATH = "./bin/loadbal_sim"
 OUT_DIR = Path("experiments_10_12_2025/results_large_scale")
 
 # System Parameters
@@ -17,13 +19,21 @@ N = 525                     # Total Servers
 SERVERS_PER_CLUSTER = 25    # Desired Cluster Size
 CLUSTERS = N // SERVERS_PER_CLUSTER  # 525 / 25 = 21 Clusters
 
-M = 100_000_000             # 10^8 Jobs (VERY LARGE!)
+M = 100_000_000             # Job cap per point (10^8)
+TARGET_REL_ERROR = 0.005    # Stop each point once E[Q] is known to +-0.5% (95% CI)
 COST = 1.0                  # Communication Cost Penalty
 
 # System Loads to Test
 # Focusing on high load where differences matter most
 LAMBDAS = [0.80, 0.85, 0.90, 0.95, 0.98, 0.99]
 
+# Adaptive loads (adaptive_sweep.py): each strategy's curve starts from
+# LAMBDAS and gets more loads only where its surrogate is unsure, until E[W]
+# is known to +-ADAPTIVE_TOL. Every load runs for both strategies, so
+# plot_dist_l1.py can pair them. False runs exactly LAMBDAS.
+ADAPTIVE = True
+ADAPTIVE_TOL = 4 * TARGET_REL_ERROR
+
 # Policies to Compare
 STRATEGIES = [
     {
@@ -44,44 +54,36 @@ STRATEGIES = [
 # ==========================================
 
 def run_simulation(lam, strategy):
-    """Runs the C++ binary and returns the parsed metrics."""
+    """Runs one simulation point and returns its metrics."""
     tag = f"{strategy['policy']}_k{strategy['k']}_L{strategy['L']}"
     
-    # Construct the command
-    cmd = [
-        BIN_PATH,
-        "--n", str(N),
-        "--m", str(M),
-        "--lambda", str(lam),
-        "--policy", strategy["policy"],
-        "--topo", "cluster",
-        "--clusters", str(CLUSTERS),
-        "--cost", str(COST),
-        "--k", str(strategy["k"]),
-        "--L", str(strategy["L"]),
-        "--outdir", str(OUT_DIR),
-        "--tag", tag
-    ]
+    params = {
+        "n": N,
+        "m": M,
+        "target-rel-error": TARGET_REL_ERROR,
+        "lambda": lam,
+        "policy": strategy["policy"],
+        "topo": "cluster",
+        "clusters": CLUSTERS,
+        "cost": COST,
+        "k": strategy["k"],
+        "L": strategy["L"],
+        "engine": "heap",
+    }
     
     print(f"  Running {strategy['name']} (Lam={lam})...", end="", flush=True)
     start_t = time.time()
     
     try:
-        # Run subprocess (suppress stdout unless error)
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        hist, metrics = sim_runner.run_point(params)
         duration = time.time() - start_t
-        print(f" Done ({duration:.1f}s)")
+        print(f" Done ({duration:.1f}s, {metrics.get('jobs_used', M)} jobs, "
+              f"rel. error {metrics.get('rel_error', float('nan')):.4f})")
         
-        # Parse Result JSON
-        json_filename = f"{strategy['policy']}_cluster_n{N}_lam{lam:.4f}_{tag}_metrics.json"
-        json_path = OUT_DIR / json_filename
-        
-        if not json_path.exists():
-            print(f"    Error: Result file {json_filename} not found.")
-            return None
-            
-        with open(json_path, 'r') as f:
-            return json.load(f)
+        # One store per experiment; the plotting scripts read it back
+        metrics["tag"] = tag
+        results_store.append(OUT_DIR / results_store.STORE_NAME, metrics, hist)
+        return metrics
             
     except subprocess.CalledProcessError:
         print(" Failed (Runtime Error)")
@@ -95,7 +97,7 @@ def main():
     print(f"--- LARGE SCALE SIMULATION SETUP ---")
     print(f"Nodes: {N}")
     print(f"Clusters: {CLUSTERS} (Size ~{N//CLUSTERS})")
-    print(f"Jobs: {M} (10^8)")
+    print(f"Jobs: up to {M} (10^8), until relative error {TARGET_REL_ERROR}")
     print(f"Output: {OUT_DIR}")
     print("-" * 40)
     
@@ -114,17 +116,37 @@ def main():
     
     total_start = time.time()
     
-    for lam in LAMBDAS:
-        print(f"\n[Testing Lambda = {lam}]")
-        for strat in STRATEGIES:
-            metrics = run_simulation(lam, strat)
-            if metrics:
-                results.append({
-                    "Strategy": strat["name"],
-                    "Lambda": lam,
-                    "Mean_W": metrics.get("mean_W", 0),
-                    "Cost": metrics.get("avg_req_dist", 0)
-                })
+    def record(lam, strat, metrics):
+        if metrics:
+            results.append({
+                "Strategy": strat["name"],
+                "Lambda": lam,
+                "Mean_W": metrics.get("mean_W", 0),
+                "Cost": metrics.get("avg_req_dist", 0)
+            })
+        return metrics
+    
+    if not ADAPTIVE:
+        for lam in LAMBDAS:
+            print(f"\n[Testing Lambda = {lam}]")
+            for strat in STRATEGIES:
+                record(lam, strat, run_simulation(lam, strat))
+    else:
+        curves = {strat["name"]: adaptive_sweep.Curve(strat["name"], min(LAMBDAS), max(LAMBDAS),
+                                                      anchors=LAMBDAS, tol=ADAPTIVE_TOL)
+                  for strat in STRATEGIES}
+        by_name = {strat["name"]: strat for strat in STRATEGIES}
+        
+        def evaluate(requests):
+            return [record(lam, by_name[c.key], run_simulation(lam, by_name[c.key]))
+                    for c, lam in requests]
+        
+        def on_round(r, requests):
+            print(f"\n[Round {r}: {len(requests)} points]")
+            for c in curves.values():
+                print(f"  {c.status()}")
+        
+        adaptive_sweep.refine(list(curves.values()), evaluate, on_round, paired=True)
     
     total_time = time.time() - total_start
     print(f"\nAll experiments completed in {total_time/60:.1f} minutes.")
@@ -134,7 +156,7 @@ def main():
         print("No results to plot.")
         return
 
-    df = pd.DataFrame(results)
+    df = pd.DataFrame(results).sort_values("Lambda")
     
     fig, ax = plt.subplots(1, 2, figsize=(16, 6))
     
@@ -145,7 +167,7 @@ def main():
                    label=strat["name"], color=strat["color"], 
                    marker=strat["marker"], linewidth=2)
     
-    ax[0].set_title(f"Response Time ($N={N}, M=10^8$)", fontsize=14)
+    ax[0].set_title(f"Response Time ($N={N}$, $\\pm${TARGET_REL_ERROR:.1%})", fontsize=14)
     ax[0].set_xlabel("System Load ($\lambda$)", fontsize=12)
     ax[0].set_ylabel("Mean Response Time ($E[W]$)", fontsize=12)
     ax[0].legend(fontsize=11)
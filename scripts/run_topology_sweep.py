@@ -1,18 +1,24 @@
 import subprocess
-import json
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import time
 import sys
 import os
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import adaptive_sweep
+import results_store
+import scheduler
+import sim_runner
+from telemetry import TelemetryServer
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
-BIN_PATH = "./bin/loadbal_sim"
 BASE_OUT_DIR = Path("results_topology_sweep") 
+STORE_PATH = BASE_OUT_DIR / results_store.STORE_NAME
 
 # System Parameters
 N = 525
@@ -23,9 +29,22 @@ COMM_COST = 1.0
 TOPOLOGIES = ["grid", "cycle"]
 POWERS = [3, 4, 5, 6, 7, 8]
 LAMBDAS = [0.6, 0.65, 0.7, 0.75, 0.8, 0.9, 0.95, 0.98, 0.99]
+TARGET_LAMBDA = 0.95        # load of the summary plots
+
+# Adaptive loads (adaptive_sweep.py): instead of the whole LAMBDAS grid,
+# each curve starts from a few loads between min(LAMBDAS) and max(LAMBDAS)
+# plus TARGET_LAMBDA, and gets more where its surrogate is least sure, until
+# E[W] is known to +-ADAPTIVE_TOL everywhere. Points then run until their
+# own relative error is ADAPTIVE_TOL / 2. False runs the fixed grid.
+ADAPTIVE = True
+ADAPTIVE_TOL = 0.02
 
 # Parallel Workers (Default: All CPU cores)
 MAX_WORKERS = os.cpu_count() 
+
+# Live progress: status line refresh and per-run table interval (seconds)
+STATUS_INTERVAL = 2
+TABLE_INTERVAL = 60
 # ==========================================
 
 def get_strategies(power):
@@ -44,117 +63,165 @@ def get_strategies(power):
         }
     ]
 
+def result_row(status, topo, lam, strategy, power, metrics):
+    return {
+        "status": status,
+        "Topology": topo, "Power": power, "Strategy": strategy["name"],
+        "Policy": strategy["policy"], "Lambda": lam,
+        "Mean_W": metrics.get("mean_W", 0), "Rel_Error": metrics.get("rel_error", 0),
+        "Cost": metrics.get("avg_req_dist", 0)
+    }
+
+def point_params(topo, lam, strategy):
+    return {
+        "n": N, "m": M, "lambda": lam,
+        "policy": strategy["policy"], "topo": topo,
+        "cost": COMM_COST,
+        "k": strategy["k"], "L": strategy["L"],
+        "engine": "heap",
+        # The surrogate needs each point's error; M stays the cap
+        "target-rel-error": ADAPTIVE_TOL / 2 if ADAPTIVE else 0.0,
+    }
+
+def store_result(topo, power, strategy, hist, data):
+    data["tag"] = f"{topo}_P{power}_{strategy['policy']}"
+    results_store.append(STORE_PATH, data, hist)
+
 def run_single_simulation(args):
     """
-    Worker function to run a single simulation.
-    args is a tuple: (topo, lam, strategy, power, output_dir)
+    Worker function to run a single simulation and append it to the store.
+    args is a tuple: (topo, lam, strategy, power, telemetry address)
     """
-    topo, lam, strategy, power, out_dir = args
+    topo, lam, strategy, power, telemetry = args
     
-    tag = f"{topo}_P{power}_{strategy['policy']}"
+    try:
+        run_id = f"{topo}_P{power}_{strategy['policy']}_lam{lam}"
+        hist, data = sim_runner.run_point(point_params(topo, lam, strategy),
+                                          telemetry=telemetry, run_id=run_id)
+        store_result(topo, power, strategy, hist, data)
+        return result_row("ran", topo, lam, strategy, power, data)
+    except Exception as e:
+        return {"status": "failed", "error": f"{str(e)} ({topo} P{power} {strategy['policy']}, Lambda: {lam})"}
+
+def run_points(points, tel):
+    """
+    Runs (topo, lam, strategy, power) points in parallel and returns their
+    result rows, failed ones included. Points already in the result cache
+    are not dispatched (resume); the cache key covers every parameter and
+    the build.
+    """
+    rows = {}
+    tasks = []
+    for i, (topo, lam, strat, power) in enumerate(points):
+        hit = sim_runner.cached(point_params(topo, lam, strat))
+        if hit is not None:
+            store_result(topo, power, strat, *hit)
+            rows[i] = result_row("cached", topo, lam, strat, power, hit[1])
+        else:
+            tasks.append(i)
     
-    # --- FIX: Changed .4f to .2f to match your C++ filenames ---
-    json_filename = f"{strategy['policy']}_{topo}_n{N}_lam{lam:.2f}_{tag}_metrics.json"
-    json_path = out_dir / json_filename
+    print(f"Queueing {len(tasks)} simulations ({len(rows)} cached)...")
+    if not tasks:
+        return [rows[i] for i in range(len(points))]
     
-    # --- RESUME CHECK ---
-    if json_path.exists():
-        try:
-            with open(json_path, 'r') as f:
-                data = json.load(f)
-            return {
-                "status": "skipped",
-                "Topology": topo, "Power": power, "Strategy": strategy["name"],
-                "Policy": strategy["policy"], "Lambda": lam,
-                "Mean_W": data.get("mean_W", 0), "Cost": data.get("avg_req_dist", 0)
-            }
-        except:
-            pass # File corrupt, re-run
-
-    # --- RUN SIMULATION ---
-    cmd = [
-        BIN_PATH,
-        "--n", str(N), "--m", str(M), "--lambda", str(lam),
-        "--policy", strategy["policy"], "--topo", topo,
-        "--cost", str(COMM_COST),
-        "--k", str(strategy["k"]), "--L", str(strategy["L"]),
-        "--outdir", str(out_dir), "--tag", tag
-    ]
+    # The native module releases the GIL and the binary fallback is a child
+    # process, so one scheduler thread per running point is enough. Points
+    # go longest-predicted-first (cost model fitted on earlier timings and
+    # the result store), each pinned to its own core. Every run streams its
+    # progress to the telemetry server.
+    sched = scheduler.Scheduler(cores=scheduler.available_cores()[:MAX_WORKERS],
+                                timings=BASE_OUT_DIR / scheduler.TIMINGS_NAME,
+                                stores=[STORE_PATH])
+    futures = sched.run([
+        scheduler.Task(run_single_simulation, (points[i] + (tel.address,),),
+                       params=point_params(*points[i][:3]))
+        for i in tasks])
+    index = dict(zip(futures, tasks))
+    pending = set(futures)
     
-    try:
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
-        
-        # If the simulation succeeded, the file MUST exist now.
-        # But wait! If C++ generated .90 and Python looks for .90, we are good.
-        if not json_path.exists():
-             # Fallback check: maybe it generated .9000? 
-             # (Unlikely given your report, but safety first)
-             pass 
-
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-        return {
-            "status": "ran",
-            "Topology": topo, "Power": power, "Strategy": strategy["name"],
-            "Policy": strategy["policy"], "Lambda": lam,
-            "Mean_W": data.get("mean_W", 0), "Cost": data.get("avg_req_dist", 0)
-        }
-    except Exception as e:
-        return {"status": "failed", "error": f"{str(e)} (Path: {json_path})"}
+    # Monitor Progress: aggregate throughput and the slowest run's ETA,
+    # with a table of every running point now and then
+    completed = 0
+    last_table = time.time()
+    while pending:
+        done, pending = wait(pending, timeout=STATUS_INTERVAL, return_when=FIRST_COMPLETED)
+        for future in done:
+            res = future.result()
+            rows[index[future]] = res
+            completed += 1
+            if res["status"] == "failed":
+                print(f"\nFailed: {res.get('error')}")
+
+        if time.time() - last_table >= TABLE_INTERVAL and tel.snapshot():
+            print("\n" + tel.table())
+            last_table = time.time()
+        sys.stdout.write(f"\r{tel.status_line(completed, len(tasks))}\033[K")
+        sys.stdout.flush()
+    
+    print("\n" + sched.report())
+    return [rows[i] for i in range(len(points))]
 
 def main():
-    print(f"--- PARALLEL SIMULATION SWEEP ({MAX_WORKERS} Cores) ---")
+    mode = "in-process threads" if sim_runner.IN_PROCESS else "processes"
+    loads = f"adaptive loads, tol {ADAPTIVE_TOL}" if ADAPTIVE else f"{len(LAMBDAS)} loads"
+    print(f"--- PARALLEL SIMULATION SWEEP ({MAX_WORKERS} Cores, {mode}, {loads}) ---")
     
     # 1. Compile
     subprocess.run(["make"], check=True, stdout=subprocess.DEVNULL)
     BASE_OUT_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # 2. Build Task List
-    tasks = []
     for topo in TOPOLOGIES:
-        current_out_dir = BASE_OUT_DIR / topo
-        current_out_dir.mkdir(parents=True, exist_ok=True)
-        
-        for power in POWERS:
-            for lam in LAMBDAS:
-                for strat in get_strategies(power):
-                    tasks.append((topo, lam, strat, power, current_out_dir))
-    
-    print(f"Queueing {len(tasks)} simulations...")
+        (BASE_OUT_DIR / topo).mkdir(parents=True, exist_ok=True)
     
-    all_results = []
     start_time = time.time()
+    rows = []
+    surrogates = {}
     
-    # 3. Execute in Parallel
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Submit all tasks
-        futures = {executor.submit(run_single_simulation, t): t for t in tasks}
-        
-        # Monitor Progress
-        completed = 0
-        skipped = 0
-        for future in as_completed(futures):
-            res = future.result()
-            completed += 1
-            
-            # Simple Progress Bar
-            sys.stdout.write(f"\rProgress: {completed}/{len(tasks)} ")
-            sys.stdout.flush()
-            
-            if res["status"] != "failed":
-                if res["status"] == "skipped": skipped += 1
-                all_results.append(res)
-            else:
-                print(f"\nFailed: {res.get('error')}")
+    # 2. Execute in Parallel: the whole grid at once, or the adaptive
+    # driver's rounds (every curve's next loads in one batch)
+    with TelemetryServer() as tel:
+        if not ADAPTIVE:
+            rows = run_points([(topo, lam, strat, power)
+                               for topo in TOPOLOGIES for power in POWERS
+                               for lam in LAMBDAS for strat in get_strategies(power)], tel)
+        else:
+            curves = {}
+            for topo in TOPOLOGIES:
+                for power in POWERS:
+                    for strat in get_strategies(power):
+                        curve = adaptive_sweep.Curve(f"{topo} P{power} {strat['policy']}",
+                                                     min(LAMBDAS), max(LAMBDAS),
+                                                     anchors=[TARGET_LAMBDA], tol=ADAPTIVE_TOL)
+                        curves[curve.key] = (curve, topo, strat, power)
+
+            def evaluate(requests):
+                batch = []
+                for curve, lam in requests:
+                    _, topo, strat, power = curves[curve.key]
+                    batch.append((topo, lam, strat, power))
+                batch_rows = run_points(batch, tel)
+                rows.extend(batch_rows)
+                return [None if r["status"] == "failed" else
+                        {"mean_W": r["Mean_W"], "rel_error": r["Rel_Error"]} for r in batch_rows]
+
+            def on_round(r, requests):
+                left = sum(not c.done() for c, *_ in curves.values())
+                print(f"Round {r}: {len(requests)} points, {left}/{len(curves)} curves still refining")
+
+            adaptive_sweep.refine([c for c, *_ in curves.values()], evaluate, on_round)
+            for curve, topo, strat, power in curves.values():
+                if len(curve.points) >= 2:
+                    surrogates[(topo, power, strat["policy"])] = curve.surrogate()
 
-    print(f"\n\nDone! (Skipped {skipped} existing files)")
+    all_results = [r for r in rows if r["status"] != "failed"]
+    skipped = sum(r["status"] == "cached" for r in rows)
+    print(f"\n\nDone! (Skipped {skipped} cached points, ran {len(rows) - skipped})")
     print(f"Total time: {(time.time() - start_time)/60:.1f} minutes.")
 
     # 4. PLOTTING
     if not all_results: return
 
     df = pd.DataFrame(all_results)
-    target_lambda = 0.95
+    target_lambda = TARGET_LAMBDA
 
     print("Generating Plots...")
     for topo in TOPOLOGIES:
@@ -169,7 +236,14 @@ def main():
             for pol in subset["Policy"].unique():
                 data = subset[subset["Policy"] == pol].sort_values("Lambda")
                 strat_name = data["Strategy"].iloc[0]
-                plt.plot(data["Lambda"], data["Mean_W"], marker='o', linewidth=2, label=strat_name)
+                fit = surrogates.get((topo, power, pol))
+                if fit is None:
+                    plt.plot(data["Lambda"], data["Mean_W"], marker='o', linewidth=2, label=strat_name)
+                else:
+                    # Adaptive loads are uneven: the surrogate draws the curve
+                    lams = np.linspace(min(LAMBDAS), max(LAMBDAS), 200)
+                    line, = plt.plot(lams, np.exp(fit.predict(lams)[0]), linewidth=2, label=strat_name)
+                    plt.plot(data["Lambda"], data["Mean_W"], 'o', color=line.get_color())
             
             plt.title(f"Response Time: {topo.capitalize()} (Power {power})")
             plt.xlabel("System Load ($\lambda$)")
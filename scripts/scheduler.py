@@ -0,0 +1,238 @@
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+# ==========================================
+# Makespan-aware dispatch for the sweep runners.
+#
+# CostModel predicts a point's wall time from earlier timings (this
+# module's timing log and/or result stores), by least squares on
+#
+#   log seconds ~ 1 + log m + log n + log(k + L + 1) + log 1/(1 - lambda)
+#                 + log threads + topology
+#
+# and falls back to a per-job prior until MIN_FIT_RUNS timings exist.
+#
+# Scheduler runs tasks longest-predicted-first on the machine's cores. A
+# task that needs t threads starts only once t cores are free and runs
+# pinned to exactly those cores (sched_setaffinity on its worker thread,
+# which the binary's process and the native module's threads inherit), so
+# the machine is never oversubscribed. When the longest waiting task does
+# not fit, the longest one that does starts instead. Every finished task is
+# appended to the timing log, and report() compares the predicted makespan
+# with the actual one:
+#
+#   sched = Scheduler(timings=out_dir / scheduler.TIMINGS_NAME, stores=[db])
+#   futures = sched.run([Task(fn, (args,), params=p) for p in points])
+#   ... wait on futures ...
+#   print(sched.report())
+# ==========================================
+TIMINGS_NAME = "task_timings.jsonl"
+MIN_FIT_RUNS = 8
+PRIOR_SECONDS_PER_JOB = 1e-7     # heap engine, one core, per candidate
+TOPOLOGIES = ["cycle", "grid", "cluster"]
+
+def features(params, threads=1):
+    lam = min(float(params.get("lambda", 0.9)), 0.999)
+    d = int(params.get("k", 1)) + int(params.get("L", 1))
+    topo = params.get("topo", params.get("graph", "cycle"))
+    return ([1.0,
+             math.log(max(1.0, float(params.get("m", 1e5)))),
+             math.log(max(2, int(params.get("n", 1000)))),
+             math.log(d + 1),
+             math.log(1.0 / (1.0 - lam)),
+             math.log(max(1, threads))]
+            + [1.0 if topo == t else 0.0 for t in TOPOLOGIES[1:]])
+
+class CostModel:
+    def __init__(self, coef=None, runs=0):
+        self.coef = coef
+        self.runs = runs
+
+    @classmethod
+    def fit(cls, records):
+        """Model of (params, threads, seconds) records; the prior if there are too few."""
+        records = [r for r in records if r[2] > 0]
+        if len(records) < MIN_FIT_RUNS:
+            return cls(None, len(records))
+        X = np.array([features(p, t) for p, t, _ in records])
+        y = np.log([s for _, _, s in records])
+        # Features that never vary in the history (one n, one topology)
+        # get the minimum-norm coefficient, i.e. no effect
+        coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+        return cls(coef, len(records))
+
+    def predict(self, params, threads=1):
+        """Expected wall time of one point in seconds."""
+        if self.coef is None:
+            d = int(params.get("k", 1)) + int(params.get("L", 1))
+            return PRIOR_SECONDS_PER_JOB * float(params.get("m", 1e5)) * (d + 1) / max(1, threads)
+        return float(np.exp(np.dot(features(params, threads), self.coef)))
+
+def load_timings(path):
+    """(params, threads, seconds) records of a timing log written by Scheduler."""
+    records = []
+    path = Path(path)
+    if path.exists():
+        for line in path.read_text().splitlines():
+            try:
+                r = json.loads(line)
+                records.append((r["params"], r.get("threads", 1), r["seconds"]))
+            except (ValueError, KeyError):
+                continue
+    return records
+
+def store_timings(path):
+    """(params, threads, seconds) records of the runs in a result store."""
+    import results_store
+    if not Path(path).exists():
+        return []
+    df = results_store.load_results(path)
+    return [({"n": r.n, "m": r.m, "lambda": r["lambda"], "k": r.k, "L": r.L, "topo": r.graph},
+             int(r.threads or 1), float(r.run_seconds or 0))
+            for _, r in df.iterrows()]
+
+class Task:
+    """fn(*args) to run on `threads` cores; `params` feed the cost model."""
+    def __init__(self, fn, args=(), params=None, threads=1):
+        self.fn = fn
+        self.args = args
+        self.params = params or {}
+        self.threads = threads
+        self.predicted = 0.0
+        self.seconds = None
+        self.cores = None
+        self.future = Future()
+
+def list_schedule(durations, threads, cores):
+    """Makespan of starting the tasks in list order whenever enough cores are free."""
+    free = cores
+    clock = 0.0
+    running = []            # (end, threads)
+    waiting = list(zip(durations, threads))
+    while waiting or running:
+        started = True
+        while started:
+            started = False
+            for i, (d, t) in enumerate(waiting):
+                if t <= free:
+                    running.append((clock + d, t))
+                    free -= t
+                    del waiting[i]
+                    started = True
+                    break
+        if not running:
+            break
+        running.sort()
+        end, t = running.pop(0)
+        clock = end
+        free += t
+    return clock
+
+def available_cores():
+    """Cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+class Scheduler:
+    def __init__(self, cores=None, timings=None, stores=(), model=None):
+        self.cores = list(cores) if cores is not None else available_cores()
+        self.timings = Path(timings) if timings else None
+        if model is None:
+            records = load_timings(self.timings) if self.timings else []
+            for store in stores:
+                records += store_timings(store)
+            model = CostModel.fit(records)
+        self.model = model
+        self.cond = threading.Condition()
+        self.log_lock = threading.Lock()
+        self.tasks = []
+        self.free = []          # idle cores
+        self.running = 0
+        self.start = None
+        self.end = None
+
+    def run(self, tasks):
+        """Starts dispatching `tasks` and returns their futures, in the given order."""
+        self.tasks = list(tasks)
+        for t in self.tasks:
+            t.threads = max(1, min(t.threads, len(self.cores)))
+            t.predicted = self.model.predict(t.params, t.threads)
+        self.start = time.time()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+        return [t.future for t in self.tasks]
+
+    def _dispatch(self):
+        waiting = sorted(self.tasks, key=lambda t: -t.predicted)
+        with self.cond:
+            self.free = list(self.cores)
+            self.running = 0
+            while waiting or self.running:
+                task = next((t for t in waiting if t.threads <= len(self.free)), None)
+                if task is None:
+                    self.cond.wait()     # until a task returns its cores
+                    continue
+                waiting.remove(task)
+                task.cores, self.free = self.free[:task.threads], self.free[task.threads:]
+                self.running += 1
+                threading.Thread(target=self._work, args=(task,), daemon=True).start()
+        self.end = time.time()
+
+    def _work(self, task):
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, task.cores)   # this thread and its children
+            except OSError:
+                pass
+        t0 = time.time()
+        try:
+            result, error = task.fn(*task.args), None
+        except Exception as e:
+            result, error = None, e
+        task.seconds = time.time() - t0
+        if error is None:
+            self._log(task)
+        with self.cond:
+            self.free += task.cores
+            self.running -= 1
+            self.cond.notify()
+        if error is None:
+            task.future.set_result(result)
+        else:
+            task.future.set_exception(error)
+
+    def _log(self, task):
+        if not self.timings:
+            return
+        line = json.dumps({"params": task.params, "threads": task.threads,
+                           "seconds": round(task.seconds, 4)})
+        with self.log_lock, open(self.timings, "a") as f:
+            f.write(line + "\n")
+
+    def predicted_makespan(self, order="lpt"):
+        """Makespan the model predicts for dispatching longest-first ("lpt") or in submission order."""
+        tasks = sorted(self.tasks, key=lambda t: -t.predicted) if order == "lpt" else self.tasks
+        return list_schedule([t.predicted for t in tasks], [t.threads for t in tasks], len(self.cores))
+
+    def report(self):
+        done = [t for t in self.tasks if t.seconds is not None]
+        actual = ((self.end or time.time()) - self.start) if self.start else 0.0
+        fitted = f"fitted on {self.model.runs} timings" if self.model.coef is not None \
+            else f"prior, {self.model.runs} timings"
+        lines = [f"Makespan: predicted {self.predicted_makespan():.1f} s "
+                 f"(submission order {self.predicted_makespan('given'):.1f} s), "
+                 f"actual {actual:.1f} s; {len(self.tasks)} tasks on {len(self.cores)} cores, "
+                 f"cost model {fitted}"]
+        if done:
+            ratios = sorted(t.seconds / t.predicted for t in done if t.predicted > 0)
+            if ratios:
+                lines.append(f"Task time actual / predicted: median {ratios[len(ratios) // 2]:.2f}, "
+                             f"range {ratios[0]:.2f} - {ratios[-1]:.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,135 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import result_cache
+
+# ==========================================
+# Shared helper for the sweep scripts: run one simulation point and get
+# (hist, metrics) back. Uses the in-process `loadbal` module when it has
+# been built (`make module`), otherwise falls back to ./bin/loadbal_sim.
+# Results go through result_cache, so a point is never simulated twice
+# (set LOADBAL_NO_CACHE=1 to bypass it).
+# ==========================================
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BIN_DIR = REPO_ROOT / "bin"
+BIN_PATH = BIN_DIR / "loadbal_sim"
+
+sys.path.insert(0, str(BIN_DIR))
+try:
+    import loadbal
+except ImportError:
+    loadbal = None
+
+IN_PROCESS = loadbal is not None
+
+DEFAULTS = {
+    "n": 1000, "m": 100000, "lambda": 0.9, "mu": 1.0,
+    "policy": "pot", "topo": "cycle", "k": 1, "L": 1, "qmax": 100,
+    "clusters": 1, "cost": 0.0, "trace": "", "engine": "heap",
+    "seed": 123456789, "target-rel-error": 0.0,
+}
+
+BUILD_FILE = Path(loadbal.__file__) if IN_PROCESS else BIN_PATH
+CACHE = None if os.environ.get("LOADBAL_NO_CACHE") else result_cache.ResultCache(BUILD_FILE, DEFAULTS)
+
+def cached(params):
+    """(hist, metrics) of a point already in the cache, else None."""
+    return CACHE.get(params) if CACHE else None
+
+def run_point(params, telemetry=None, run_id="point"):
+    """
+    Runs one simulation, or returns the cached result of an identical
+    earlier run. `params` uses the binary's flag names (n, m, lambda,
+    mu, policy, topo, k, L, qmax, clusters, cost, trace, engine, seed,
+    target-rel-error);
+    missing keys take the defaults above.
+    `telemetry` is a stream address (telemetry.TelemetryServer.address)
+    that receives the run's progress under the name `run_id`.
+    Returns (hist, metrics): a NumPy array of P(Q=i) and the metrics dict,
+    which carries the point's 'cache_key'.
+    """
+    hit = cached(params)
+    if hit is not None:
+        return hit
+    hist, metrics = simulate(params, telemetry, run_id)
+    if CACHE:
+        metrics["cache_key"] = CACHE.key(params)
+        CACHE.put(params, hist, metrics)
+    return hist, metrics
+
+def simulate(params, telemetry=None, run_id="point"):
+    """Runs one simulation, bypassing the cache."""
+    p = dict(DEFAULTS, **params)
+
+    if IN_PROCESS:
+        # Releases the GIL while simulating: safe to call from many threads
+        return loadbal.run(
+            n=p["n"], m=p["m"], lam=p["lambda"], mu=p["mu"],
+            policy=p["policy"], topo=p["topo"], k=p["k"], L=p["L"],
+            qmax=p["qmax"], clusters=p["clusters"], cost=p["cost"],
+            trace=p["trace"], engine=p["engine"], seed=p["seed"],
+            target_rel_error=p["target-rel-error"],
+            telemetry=telemetry or "", run_id=run_id)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        # The tag names the run in telemetry
+        cmd = [str(BIN_PATH), "--outdir", out_dir, "--tag", run_id]
+        for key in ["n", "m", "lambda", "mu", "policy", "topo", "k", "L", "qmax",
+                    "clusters", "cost", "engine", "seed", "target-rel-error"]:
+            cmd += [f"--{key}", str(p[key])]
+        if p["trace"]:
+            cmd += ["--trace", str(p["trace"])]
+        if telemetry:
+            cmd += ["--telemetry", telemetry]
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+
+        # Only one run in this directory, so no filename guessing is needed
+        out = Path(out_dir)
+        metrics = json.loads(next(out.glob("*_metrics.json")).read_text())
+        hist = np.zeros(p["qmax"])
+        rows = np.loadtxt(next(out.glob("*_hist.csv")), delimiter=",", skiprows=1, ndmin=2)
+        if rows.size:
+            hist[rows[:, 0].astype(int)] = rows[:, 1]
+        return hist, metrics
+
+def run_paired(params, arms, replications=10):
+    """
+    Runs the configuration of `params` and every (policy, k, L) in `arms`
+    on common random numbers: each replication's arrivals, origins and
+    service times are drawn once and shared (the binary's --paired). The
+    base configuration's metrics carry the paired differences, with 95%
+    CIs across the replications, under "paired". Returns one
+    (hist, metrics) per configuration, base first. Always simulates (not
+    cached) and always uses ./bin/loadbal_sim.
+    """
+    p = dict(DEFAULTS, **params)
+    with tempfile.TemporaryDirectory() as out_dir:
+        cmd = [str(BIN_PATH), "--outdir", out_dir, "--replications", str(replications),
+               "--paired", ",".join(f"{pol}:{k}:{L}" for pol, k, L in arms)]
+        for key in ["n", "m", "lambda", "mu", "policy", "topo", "k", "L", "qmax",
+                    "clusters", "cost", "engine", "seed"]:
+            cmd += [f"--{key}", str(p[key])]
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+
+        runs = {}
+        for path in Path(out_dir).glob("*_metrics.json"):
+            metrics = json.loads(path.read_text())
+            hist = np.zeros(p["qmax"])
+            rows = np.loadtxt(str(path).replace("_metrics.json", "_hist.csv"),
+                              delimiter=",", skiprows=1, ndmin=2)
+            if rows.size:
+                hist[rows[:, 0].astype(int)] = rows[:, 1]
+            key = "base" if "paired" in metrics else (metrics["policy"], metrics["k"], metrics["L"])
+            runs[key] = (hist, metrics)
+        return [runs["base"]] + [runs[(pol, k, L)] for pol, k, L in arms]
+
+def write_metrics_json(path, metrics):
+    """Writes metrics in the same layout as the binary's _metrics.json."""
+    with open(path, "w") as f:
+        json.dump(metrics, f, indent=2)
@@ -0,0 +1,49 @@
+import math
+
+# ==========================================
+# Response-time sketches from the metrics ("response_time" -> "sketch"; see
+# include/Sketch.hpp). Bucket b covers a 1/sub_buckets slice of the power
+# of two 2^(e-1) .. 2^e with e = b // sub_buckets + min_exponent, so
+# sketches of replications, partitions or separate runs merge by adding
+# counts:
+#
+#   merged = sketch.merge([m["response_time"]["sketch"] for m in metrics])
+#   p99 = sketch.quantile(merged, 0.99)
+# ==========================================
+
+def merge(sketches):
+    """One sketch holding the values of all `sketches` (same layout)."""
+    sketches = list(sketches)
+    if not sketches:
+        return {"sub_buckets": 128, "min_exponent": -20, "buckets": []}
+    layout = (sketches[0]["sub_buckets"], sketches[0]["min_exponent"])
+    counts = {}
+    for s in sketches:
+        if (s["sub_buckets"], s["min_exponent"]) != layout:
+            raise ValueError("sketches with different bucket layouts cannot be merged")
+        for b, c in s["buckets"]:
+            counts[b] = counts.get(b, 0) + c
+    return {"sub_buckets": layout[0], "min_exponent": layout[1],
+            "buckets": sorted([b, c] for b, c in counts.items())}
+
+def bucket_value(sketch, b):
+    """Midpoint of bucket b."""
+    sub = sketch["sub_buckets"]
+    e = b // sub + sketch["min_exponent"]
+    return math.ldexp(0.5 + (b % sub + 0.5) / (2 * sub), e)
+
+def count(sketch):
+    return sum(c for _, c in sketch["buckets"])
+
+def quantile(sketch, p):
+    """Nearest-rank p-quantile, to the sketch's bucket precision (nan if empty)."""
+    total = count(sketch)
+    if total == 0:
+        return float("nan")
+    rank = max(1, math.ceil(p * total))
+    seen = 0
+    for b, c in sorted(sketch["buckets"]):
+        seen += c
+        if seen >= rank:
+            return bucket_value(sketch, b)
+    return bucket_value(sketch, sketch["buckets"][-1][0])
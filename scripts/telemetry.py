@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+# ==========================================
+# Collector for the simulator's telemetry stream (--telemetry unix:PATH in
+# the binary, telemetry= in the loadbal module; see include/Telemetry.hpp).
+#
+# A TelemetryServer listens on a Unix socket; every simulation of a sweep
+# connects to it, from worker threads or worker processes alike, and the
+# server keeps the latest progress line of each running replication:
+#
+#   with TelemetryServer() as tel:
+#       sim_runner.run_point(params, telemetry=tel.address, run_id="grid_P3")
+#       print(tel.status_line(done, total))
+# ==========================================
+STALE_SECONDS = 30     # a run that has been silent this long no longer counts as running
+
+def format_seconds(s):
+    if s is None or s < 0:
+        return "?"
+    s = int(round(s))
+    if s >= 3600:
+        return f"{s // 3600}h{s % 3600 // 60:02d}m"
+    if s >= 60:
+        return f"{s // 60}m{s % 60:02d}s"
+    return f"{s}s"
+
+class TelemetryServer:
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="loadbal_telemetry_")
+        self.path = os.path.join(self.dir, "telemetry.sock")
+        self.address = "unix:" + self.path
+        self.lock = threading.Lock()
+        self.running = {}       # (run, rep) -> latest progress line, plus 'seen'
+        self.finished = []      # done lines
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(256)
+        self.closed = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while not self.closed:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+
+    def _read(self, conn):
+        with conn, conn.makefile("r") as lines:
+            for line in lines:
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                self._handle(msg)
+
+    def _handle(self, msg):
+        key = (msg.get("run"), msg.get("rep", 0))
+        with self.lock:
+            if msg.get("type") == "done":
+                self.running.pop(key, None)
+                self.finished.append(msg)
+            elif msg.get("type") == "start":
+                self.running[key] = {"run": key[0], "rep": key[1], "jobs": 0,
+                                     "max_jobs": msg.get("max_jobs", 0),
+                                     "events_per_sec": 0.0, "eta_seconds": -1,
+                                     "seen": time.time()}
+            elif msg.get("type") == "progress":
+                msg["seen"] = time.time()
+                self.running[key] = msg
+
+    def snapshot(self):
+        """Latest progress of every live replication, slowest (largest ETA) first."""
+        cutoff = time.time() - STALE_SECONDS
+        with self.lock:
+            runs = [dict(r) for r in self.running.values() if r["seen"] >= cutoff]
+        return sorted(runs, key=lambda r: -r.get("eta_seconds", -1))
+
+    def status_line(self, done, total):
+        runs = self.snapshot()
+        line = (f"Progress: {done}/{total} | {len(runs)} running | "
+                f"{sum(r.get('events_per_sec', 0.0) for r in runs) / 1e6:.1f}M events/s")
+        if runs:
+            slow = runs[0]
+            pct = 100.0 * slow["jobs"] / max(1, slow["max_jobs"])
+            line += f" | slowest {slow['run']} {pct:.0f}% ETA {format_seconds(slow['eta_seconds'])}"
+        return line
+
+    def table(self):
+        """One line per live replication: progress, rate, running mean_Q, ETA."""
+        rows = []
+        for r in self.snapshot():
+            pct = 100.0 * r["jobs"] / max(1, r["max_jobs"])
+            mean_q = r.get("mean_Q", -1)
+            rows.append(f"  {r['run']:<32} {pct:5.1f}%  {r.get('events_per_sec', 0.0) / 1e6:6.2f}M ev/s  "
+                        f"E[Q]={mean_q if mean_q >= 0 else float('nan'):.4f}  "
+                        f"ETA {format_seconds(r.get('eta_seconds'))}")
+        return "\n".join(rows)
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
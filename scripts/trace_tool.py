@@ -0,0 +1,286 @@
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+# ==========================================
+# Trace toolkit for the simulator's --trace input.
+#
+#   convert     CSV / Parquet job log  -> trace
+#   synthesize  fitted distributions   -> trace
+#   rescale     trace -> trace with a target load lambda per server
+#
+# Everything streams in chunks of --chunk jobs, so memory stays bounded no
+# matter how long the trace is. Output ending in .csv is written as text;
+# anything else uses the binary layout of include/Trace.hpp, which the
+# simulator maps instead of parsing (and which is far faster to write).
+# ==========================================
+MAGIC = b"LBTRACE\0"
+HEADER = struct.Struct("<8sIIQQ32x")   # magic, version, value_bytes, count, data_offset
+DATA_OFFSET = 64
+DEFAULT_CHUNK = 1 << 22
+COPY_BYTES = 1 << 24
+
+# ------------------------------------------
+# Writing
+# ------------------------------------------
+class TraceWriter:
+    """
+    Streams (inter_arrival, duration) chunks to a trace file.
+    For the binary format the duration column is spilled to a temporary
+    file next to the output and appended on close(), so the job count does
+    not need to be known in advance.
+    """
+
+    def __init__(self, path, dtype="float64"):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.text = path.endswith(".csv")
+        if self.text:
+            self.f = open(path, "w")
+            self.f.write("inter_arrival,duration\n")
+            return
+        self.f = open(path, "wb")
+        self.f.write(b"\0" * DATA_OFFSET)
+        out_dir = os.path.dirname(os.path.abspath(path))
+        self.spill = tempfile.TemporaryFile(dir=out_dir)
+
+    def write(self, inter_arrival, duration):
+        if len(inter_arrival) != len(duration):
+            raise ValueError("inter_arrival and duration chunks differ in length")
+        if self.text:
+            np.savetxt(self.f, np.column_stack([inter_arrival, duration]),
+                       fmt="%.17g", delimiter=",")
+        else:
+            self.f.write(np.asarray(inter_arrival, dtype=self.dtype).tobytes())
+            self.spill.write(np.asarray(duration, dtype=self.dtype).tobytes())
+        self.count += len(inter_arrival)
+
+    def close(self):
+        if not self.text:
+            self.spill.seek(0)
+            shutil.copyfileobj(self.spill, self.f, COPY_BYTES)
+            self.spill.close()
+            self.f.seek(0)
+            self.f.write(HEADER.pack(MAGIC, 1, self.dtype.itemsize, self.count, DATA_OFFSET))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+            os.remove(self.path)
+
+# ------------------------------------------
+# Reading
+# ------------------------------------------
+def read_header(path):
+    """Returns (value dtype, count, data offset) of a binary trace, or None for text."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size or raw[:8] != MAGIC:
+        return None
+    _, version, value_bytes, count, offset = HEADER.unpack(raw)
+    if version != 1 or value_bytes not in (4, 8):
+        sys.exit(f"Error: unsupported binary trace {path}")
+    return np.dtype("<f4" if value_bytes == 4 else "<f8"), count, offset
+
+def iter_table(path, columns, chunk):
+    """Yields chunks of the requested columns of a CSV or Parquet file as float64 arrays."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        names = [c if isinstance(c, str) else pf.schema_arrow.names[c] for c in columns]
+        for batch in pf.iter_batches(batch_size=chunk, columns=names):
+            yield [batch.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+                   for name in names]
+        return
+
+    import pandas as pd
+    with open(path) as f:
+        first = f.readline()
+    has_header = not first[:1].isdigit()
+    sep = "," if "," in first else r"\s+"
+    if has_header:
+        header = first.strip().split(",") if sep == "," else first.split()
+        columns = [header[c] if isinstance(c, int) else c for c in columns]
+    reader = pd.read_csv(path, sep=sep, header=0 if has_header else None,
+                         usecols=columns, chunksize=chunk, dtype=np.float64,
+                         float_precision="round_trip")
+    for df in reader:
+        yield [df[c].to_numpy() for c in columns]
+
+def iter_trace(path, chunk):
+    """Yields (inter_arrival, duration) float64 chunks of a simulator trace."""
+    header = read_header(path)
+    if header is None:
+        yield from iter_table(path, [0, 1], chunk)
+        return
+    dtype, count, offset = header
+    cols = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(2, count))
+    for start in range(0, count, chunk):
+        stop = min(start + chunk, count)
+        yield (cols[0, start:stop].astype(np.float64), cols[1, start:stop].astype(np.float64))
+
+def trace_means(path, chunk):
+    """One streaming pass: (jobs, mean inter-arrival, mean duration)."""
+    jobs, ia_sum, dur_sum = 0, 0.0, 0.0
+    for ia, dur in iter_trace(path, chunk):
+        jobs += len(ia)
+        ia_sum += float(ia.sum())
+        dur_sum += float(dur.sum())
+    if jobs == 0:
+        sys.exit(f"Error: {path} holds no jobs")
+    return jobs, ia_sum / jobs, dur_sum / jobs
+
+# ------------------------------------------
+# Distributions (all parameterized by their mean)
+# ------------------------------------------
+def make_sampler(kind, mean, cv, alpha, empirical, rng):
+    if kind == "exponential":
+        return lambda size: rng.exponential(mean, size)
+    if kind == "lognormal":
+        sigma2 = np.log1p(cv * cv)
+        mu = np.log(mean) - sigma2 / 2
+        return lambda size: rng.lognormal(mu, np.sqrt(sigma2), size)
+    if kind == "pareto":
+        if alpha <= 1:
+            sys.exit("Error: pareto needs --alpha > 1 for a finite mean")
+        x_min = mean * (alpha - 1) / alpha
+        return lambda size: x_min * (1.0 + rng.pareto(alpha, size))
+    if kind == "empirical":
+        if empirical is None or len(empirical) == 0:
+            sys.exit("Error: empirical sampling needs --empirical TRACE")
+        # Bootstrap from the observed values, rescaled to the requested mean
+        values = empirical * (mean / empirical.mean())
+        return lambda size: values[rng.integers(0, len(values), size)]
+    sys.exit(f"Error: unknown distribution {kind}")
+
+def load_empirical(path, limit, chunk):
+    """First `limit` jobs of a trace as (inter_arrival, duration) arrays."""
+    ia_parts, dur_parts, jobs = [], [], 0
+    for ia, dur in iter_trace(path, chunk):
+        take = min(len(ia), limit - jobs)
+        ia_parts.append(ia[:take])
+        dur_parts.append(dur[:take])
+        jobs += take
+        if jobs >= limit:
+            break
+    return np.concatenate(ia_parts), np.concatenate(dur_parts)
+
+# ------------------------------------------
+# Commands
+# ------------------------------------------
+def cmd_convert(args):
+    if args.time_col is not None:
+        columns = [args.time_col, args.dur_col]
+    else:
+        columns = [args.ia_col, args.dur_col]
+    columns = [int(c) if c.isdigit() else c for c in columns]
+
+    last_time = None
+    with TraceWriter(args.output, args.dtype) as out:
+        for first, dur in iter_table(args.input, columns, args.chunk):
+            if args.time_col is not None:
+                # Absolute arrival timestamps -> gaps; the first job arrives at 0
+                prev = first[0] if last_time is None else last_time
+                ia = np.diff(first, prepend=prev)
+                last_time = first[-1]
+                if (ia < 0).any():
+                    sys.exit("Error: arrival timestamps are not sorted")
+            else:
+                ia = first
+            out.write(ia * args.time_scale, dur * args.time_scale)
+    print(f"Wrote {out.count} jobs to {args.output}")
+
+def cmd_synthesize(args):
+    rng = np.random.default_rng(args.seed)
+    # Offered load per server: lambda = rate * E[S] / n
+    mean_ia = args.mean_service / (args.lam * args.n)
+
+    empirical = (None, None)
+    if args.empirical:
+        empirical = load_empirical(args.empirical, args.empirical_max, args.chunk)
+    arrivals = make_sampler(args.arrival, mean_ia, args.arrival_cv, args.alpha, empirical[0], rng)
+    services = make_sampler(args.service, args.mean_service, args.service_cv, args.alpha,
+                            empirical[1], rng)
+
+    with TraceWriter(args.output, args.dtype) as out:
+        for start in range(0, args.m, args.chunk):
+            size = min(args.chunk, args.m - start)
+            out.write(arrivals(size), services(size))
+    print(f"Wrote {out.count} jobs to {args.output} "
+          f"(lambda={args.lam} per server, n={args.n})")
+
+def cmd_rescale(args):
+    jobs, mean_ia, mean_dur = trace_means(args.input, args.chunk)
+    current = mean_dur / (mean_ia * args.n)
+    factor = current / args.lam
+    print(f"Input: {jobs} jobs, load {current:.4f} per server at n={args.n}; "
+          f"scaling inter-arrivals by {factor:.6g}")
+
+    with TraceWriter(args.output, args.dtype) as out:
+        for ia, dur in iter_trace(args.input, args.chunk):
+            out.write(ia * factor, dur)
+    print(f"Wrote {out.count} jobs to {args.output} (lambda={args.lam} per server)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and transform simulator job traces")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Jobs per streamed chunk")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="Value type of binary output")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="Convert a CSV/Parquet job log")
+    p.add_argument("input")
+    p.add_argument("output", help="Output trace (.csv for text, anything else binary)")
+    p.add_argument("--ia-col", default="0", help="Inter-arrival column (name or index)")
+    p.add_argument("--time-col", default=None,
+                   help="Absolute arrival time column; used instead of --ia-col")
+    p.add_argument("--dur-col", default="1", help="Duration column (name or index)")
+    p.add_argument("--time-scale", type=float, default=1.0,
+                   help="Multiply all times by this factor (e.g. 1e-3 for ms -> s)")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("synthesize", help="Draw a trace from fitted distributions")
+    p.add_argument("output")
+    p.add_argument("-m", type=int, required=True, help="Number of jobs")
+    p.add_argument("--n", type=int, required=True, help="Servers the load is meant for")
+    p.add_argument("--lambda", dest="lam", type=float, required=True,
+                   help="Offered load per server")
+    p.add_argument("--mean-service", type=float, default=1.0)
+    p.add_argument("--arrival", default="exponential",
+                   choices=["exponential", "lognormal", "pareto", "empirical"])
+    p.add_argument("--service", default="exponential",
+                   choices=["exponential", "lognormal", "pareto", "empirical"])
+    p.add_argument("--arrival-cv", type=float, default=1.0, help="Lognormal arrival CV")
+    p.add_argument("--service-cv", type=float, default=1.0, help="Lognormal service CV")
+    p.add_argument("--alpha", type=float, default=2.5, help="Pareto shape")
+    p.add_argument("--empirical", default=None, help="Trace to bootstrap empirical draws from")
+    p.add_argument("--empirical-max", type=int, default=10_000_000,
+                   help="Jobs of --empirical kept in memory")
+    p.add_argument("--seed", type=int, default=123456789)
+    p.set_defaults(func=cmd_synthesize)
+
+    p = sub.add_parser("rescale", help="Time-scale inter-arrivals to a target load")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--n", type=int, required=True, help="Servers the trace will be replayed on")
+    p.add_argument("--lambda", dest="lam", type=float, required=True,
+                   help="Target offered load per server")
+    p.set_defaults(func=cmd_rescale)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
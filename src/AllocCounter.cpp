@@ -0,0 +1,31 @@
+#include "AllocCounter.hpp"
+#include <cstdlib>
+#include <new>
+
+static thread_local std::uint64_t alloc_count = 0;
+
+std::uint64_t heap_alloc_count() {
+    return alloc_count;
+}
+
+#ifndef LOADBAL_NO_ALLOC_HOOK
+
+// Replacement global allocation functions. The array and nothrow forms
+// forward to these by default, so every allocation is counted once.
+void* operator new(std::size_t size) {
+    ++alloc_count;
+    if (size == 0) size = 1;
+    void* p = std::malloc(size);
+    if (!p) throw std::bad_alloc();
+    return p;
+}
+
+void operator delete(void* p) noexcept {
+    std::free(p);
+}
+
+void operator delete(void* p, std::size_t) noexcept {
+    std::free(p);
+}
+
+#endif
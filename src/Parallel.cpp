@@ -0,0 +1,376 @@
+#include "Parallel.hpp"
+#include <algorithm>
+#include <cmath>
+#include <condition_variable>
+#include <mutex>
+#include <random>
+#include <thread>
+#include "AllocCounter.hpp"
+#include "Distance.hpp"
+#include "EventHeap.hpp"
+#include "Fifo.hpp"
+#include "Histogram.hpp"
+#include "Runner.hpp"
+
+namespace {
+
+// A job on its way to a server of another process
+struct Message {
+    double t;        // when it joins the queue
+    double arrived;  // when it entered the system (for its response time)
+    int server;
+};
+
+// Reusable barrier whose last arriving thread runs 'on_complete' before
+// any thread is released (std::barrier is C++20)
+class WindowBarrier {
+public:
+    explicit WindowBarrier(int count_) : count(count_), waiting(0), generation(0) {}
+
+    template <class F>
+    void arrive_and_wait(F on_complete) {
+        std::unique_lock<std::mutex> lock(mtx);
+        long long gen = generation;
+        if (++waiting == count) {
+            on_complete();
+            waiting = 0;
+            generation++;
+            cv.notify_all();
+        } else {
+            cv.wait(lock, [&] { return gen != generation; });
+        }
+    }
+
+private:
+    std::mutex mtx;
+    std::condition_variable cv;
+    int count;
+    int waiting;
+    long long generation;
+};
+
+// State of one logical process: servers [lo, hi)
+struct Process {
+    int lo = 0, hi = 0;
+    std::mt19937_64 rng;
+    std::vector<int> q;              // indexed by server - lo
+    EventHeap heap;                  // completions, by server - lo
+    ServerFifos fifos;               // arrival times of the queued jobs
+    TimeWeightedHistogram hist;
+    QuantileSketch response;
+    double stats_start = 0.0;
+    std::vector<Message> inbox;      // this window's deliveries, by time
+    size_t inbox_pos = 0;
+    std::vector<int> candidates;
+    std::vector<double> cand_dist;
+    double now = 0.0;
+    double t_arr = 0.0;
+    bool recording = false;
+    long long arrivals = 0;
+    long long departures = 0;
+    long long recorded = 0;
+    long long messages = 0;
+    long long allocs = 0;
+    long long in_flight = 0;         // deliveries left when the run ended
+    double req_dist = 0.0;
+    bool draining = false;           // serving out after the end (see drain)
+
+    bool owns(int v) const { return v >= lo && v < hi; }
+
+    double exp_rv(double rate) {
+        std::uniform_real_distribution<double> U(0.0, 1.0);
+        return -std::log(1.0 - U(rng)) / rate;
+    }
+
+    void join(int v, double arrived, double mu) {
+        int i = v - lo;
+        if (!draining) hist.move(q[i], q[i] + 1, now);
+        fifos.push(i, arrived);
+        if (++q[i] == 1) heap.push(i, now + exp_rv(mu));
+    }
+
+    void depart(double mu) {
+        int i = heap.top();
+        if (!draining) hist.move(q[i], q[i] - 1, now);
+        double arrived = fifos.pop(i);
+        if (recording && arrived >= stats_start) response.add(now - arrived);
+        if (--q[i] > 0) heap.push(i, now + exp_rv(mu));
+        else heap.remove(i);
+        departures++;
+    }
+
+    // After the last window: the jobs still queued here, and those still in
+    // transfer to here ('late', by time), are served out without arrivals,
+    // so that the longest response times are not cut off. The queue
+    // statistics end with the last window.
+    void drain(std::vector<Message>& late, double mu) {
+        draining = true;
+        std::sort(late.begin(), late.end(),
+                  [](const Message& a, const Message& b) { return a.t < b.t; });
+        size_t next = 0;
+        while (!heap.empty() || next < late.size()) {
+            double t_dep = heap.empty() ? 1e30 : heap.top_time();
+            if (next < late.size() && late[next].t <= t_dep) {
+                now = late[next].t;
+                join(late[next].server, late[next].arrived, mu);
+                next++;
+            } else {
+                now = t_dep;
+                depart(mu);
+            }
+        }
+    }
+
+    // Add 'count' distinct servers of [begin, end) not picked yet. The
+    // candidate sets are a handful of servers, so membership is a scan.
+    void pick_distinct(int count, int begin, int end) {
+        std::uniform_int_distribution<int> U(begin, end - 1);
+        int target = (int)candidates.size() + count;
+        while ((int)candidates.size() < target) {
+            int v = U(rng);
+            if (std::find(candidates.begin(), candidates.end(), v) == candidates.end()) {
+                candidates.push_back(v);
+            }
+        }
+    }
+};
+
+// Windows, messages and snapshots shared by the processes. Everything is
+// double-buffered by window parity: in window w a process reads
+// snapshot[w % 2] and the outboxes[(w + 1) % 2] sent to it, and writes
+// snapshot[(w + 1) % 2] and outboxes[w % 2], so one barrier per window
+// separates every write from every read.
+struct Shared {
+    std::vector<int> snapshot[2];
+    std::vector<std::vector<Message>> outbox[2];   // [src * lps + dst]
+    std::vector<long long> arrivals;               // per process, at the boundary
+    double window_start = 0.0;
+    bool recording = false;
+    double stats_start = 0.0;
+    long long warmup_arrivals = 0;
+    bool done = false;
+};
+
+} // namespace
+
+ParallelSimulation::ParallelSimulation(int n_, double lambda__, long long m_, double mu__,
+                                       const std::string& policy_, const NeighborTable& k_nbrs_,
+                                       int k_, int L_, int qmax_, int num_clusters_,
+                                       double comm_cost_, unsigned long long seed_,
+                                       int lps, double window)
+    : n(n_), lambda_(lambda__), m(m_), mu_(mu__),
+      policy_id(policy_ == "pot" ? Policy::Pot : policy_ == "poKL" ? Policy::PoKL
+              : policy_ == "spatialKL" ? Policy::SpatialKL : Policy::Unknown),
+      k_nbrs(&k_nbrs_), k(k_), L(L_), qmax(qmax_),
+      num_clusters(num_clusters_), comm_cost(comm_cost_), seed(seed_)
+{
+    // Whole clusters per process
+    int per_cluster = num_clusters > 1 ? (n + num_clusters - 1) / num_clusters : n;
+    int clusters = (n + per_cluster - 1) / per_cluster;
+    if (lps <= 0) lps = (int)std::max(1u, std::thread::hardware_concurrency());
+    stats_.lps = std::max(1, std::min(lps, clusters));
+    stats_.window = window > 0 ? window : 0.05 / mu_;
+}
+
+SimulationResult ParallelSimulation::run() {
+    const int P = stats_.lps;
+    const double W = stats_.window;
+    const long long warmup = static_cast<long long>(m * 0.2);
+    DistanceOracle oracle(Topology::Cluster, n, num_clusters, comm_cost);
+
+    // Clusters are contiguous server ranges; process p gets clusters
+    // [p * C / P, (p + 1) * C / P)
+    int per_cluster = num_clusters > 1 ? (n + num_clusters - 1) / num_clusters : n;
+    int clusters = (n + per_cluster - 1) / per_cluster;
+    std::vector<Process> procs(P);
+    for (int p = 0; p < P; ++p) {
+        Process& pr = procs[p];
+        pr.lo = (int)std::min<long long>(n, (long long)p * clusters / P * per_cluster);
+        pr.hi = (int)std::min<long long>(n, (long long)(p + 1) * clusters / P * per_cluster);
+        pr.rng.seed(replication_seed(seed, p));
+        pr.q.assign(pr.hi - pr.lo, 0);
+        pr.heap = EventHeap(pr.hi - pr.lo);
+        pr.fifos = ServerFifos(pr.hi - pr.lo);
+        pr.hist = TimeWeightedHistogram(qmax, pr.hi - pr.lo);
+        pr.candidates.reserve(2 + std::max(0, k) + std::max(0, L) + k_nbrs->max_degree());
+        pr.cand_dist.resize(pr.candidates.capacity());
+        pr.t_arr = pr.exp_rv(lambda_ * (pr.hi - pr.lo));
+    }
+
+    Shared sh;
+    sh.snapshot[0].assign(n, 0);
+    sh.snapshot[1].assign(n, 0);
+    sh.outbox[0].resize((size_t)P * P);
+    sh.outbox[1].resize((size_t)P * P);
+    sh.arrivals.assign(P, 0);
+    sh.recording = (warmup == 0);
+    long long windows = 0;
+
+    // Serial step between windows, run by the last process to arrive
+    auto boundary = [&] {
+        long long total = 0;
+        for (long long a : sh.arrivals) total += a;
+        sh.window_start += W;
+        windows++;
+        if (!sh.recording && total >= warmup) {
+            sh.recording = true;
+            sh.stats_start = sh.window_start;
+            sh.warmup_arrivals = total;
+        }
+        if (total >= m) sh.done = true;
+    };
+
+    WindowBarrier barrier(P);
+    auto process = [&](int p) {
+        Process& pr = procs[p];
+        std::uint64_t alloc_base = heap_alloc_count();
+        long long w = 0;
+        for (; !sh.done; ++w) {
+            int cur = (int)(w & 1);
+            const int* snap = sh.snapshot[cur].data();
+
+            // Deliveries sent in the previous window, in time order. They
+            // are gathered by sender, so the order never depends on thread
+            // timing; sorting in place keeps the window free of allocations.
+            pr.inbox.clear();
+            pr.inbox_pos = 0;
+            for (int src = 0; src < P; ++src) {
+                const std::vector<Message>& in = sh.outbox[cur ^ 1][(size_t)src * P + p];
+                pr.inbox.insert(pr.inbox.end(), in.begin(), in.end());
+            }
+            std::sort(pr.inbox.begin(), pr.inbox.end(),
+                      [](const Message& a, const Message& b) { return a.t < b.t; });
+            for (int dst = 0; dst < P; ++dst) sh.outbox[cur][(size_t)p * P + dst].clear();
+
+            if (sh.recording && !pr.recording) {
+                pr.hist.start(sh.window_start);
+                pr.stats_start = sh.window_start;
+                pr.recording = true;
+            }
+
+            auto length = [&](int v) { return pr.owns(v) ? pr.q[v - pr.lo] : snap[v]; };
+            double end = sh.window_start + W;
+            while (true) {
+                double t_dep = pr.heap.empty() ? 1e30 : pr.heap.top_time();
+                double t_msg = pr.inbox_pos < pr.inbox.size() ? pr.inbox[pr.inbox_pos].t : 1e30;
+                double t = std::min(pr.t_arr, std::min(t_dep, t_msg));
+                if (t >= end) break;
+                pr.now = t;
+
+                if (t == t_msg) {
+                    const Message& msg = pr.inbox[pr.inbox_pos++];
+                    pr.join(msg.server, msg.arrived, mu_);
+                } else if (t == pr.t_arr) {
+                    pr.arrivals++;
+                    std::uniform_int_distribution<int> U(pr.lo, pr.hi - 1);
+                    int s = U(pr.rng);
+
+                    // Candidates as in Simulation::choose_node
+                    pr.candidates.clear();
+                    pr.candidates.push_back(s);
+                    if (policy_id == Policy::Pot) {
+                        pr.pick_distinct(std::min(1, n - 1), 0, n);
+                    } else if (policy_id == Policy::PoKL) {
+                        pr.pick_distinct(std::min(k + L, n - 1), 0, n);
+                    } else if (policy_id == Policy::SpatialKL) {
+                        int size = k_nbrs->degree(s);
+                        if (size > 0) {
+                            pr.pick_distinct(std::min(k, size), k_nbrs->cluster_begin(s),
+                                             k_nbrs->cluster_end(s));
+                        }
+                        pr.pick_distinct(std::min(L, n - (int)pr.candidates.size()), 0, n);
+                    }
+
+                    int count = (int)pr.candidates.size();
+                    oracle.distances(s, pr.candidates.data(), count, pr.cand_dist.data());
+                    int best = 0;
+                    double best_score = 1e30;
+                    for (int i = 0; i < count; ++i) {
+                        double score = length(pr.candidates[i]) + pr.cand_dist[i];
+                        if (score < best_score) {
+                            best_score = score;
+                            best = i;
+                        }
+                    }
+                    int chosen = pr.candidates[best];
+
+                    if (pr.recording) {
+                        pr.req_dist += pr.cand_dist[best];
+                        pr.recorded++;
+                    }
+                    if (pr.owns(chosen)) {
+                        pr.join(chosen, t, mu_);
+                    } else {
+                        int dst = 0;
+                        while (!procs[dst].owns(chosen)) dst++;
+                        sh.outbox[cur][(size_t)p * P + dst].push_back({t + W, t, chosen});
+                        pr.messages++;
+                    }
+                    pr.t_arr = t + pr.exp_rv(lambda_ * (pr.hi - pr.lo));
+                } else {
+                    pr.depart(mu_);
+                }
+            }
+
+            // Publish this process's queues for the next window
+            std::copy(pr.q.begin(), pr.q.end(), sh.snapshot[cur ^ 1].begin() + pr.lo);
+            sh.arrivals[p] = pr.arrivals;
+            barrier.arrive_and_wait(boundary);
+        }
+
+        // What the last window sent here lands after the end
+        pr.inbox.clear();
+        for (int src = 0; src < P; ++src) {
+            const std::vector<Message>& in = sh.outbox[(w - 1) & 1][(size_t)src * P + p];
+            pr.inbox.insert(pr.inbox.end(), in.begin(), in.end());
+        }
+        pr.in_flight = (long long)pr.inbox.size();
+        pr.drain(pr.inbox, mu_);
+        pr.allocs = (long long)(heap_alloc_count() - alloc_base);
+    };
+
+    std::vector<std::thread> threads;
+    for (int p = 1; p < P; ++p) threads.emplace_back(process, p);
+    process(0);
+    for (std::thread& t : threads) t.join();
+
+    // --- Combine the processes ---
+    double end_time = sh.window_start;
+    std::vector<double> hist(qmax, 0.0);
+    SimulationResult res{};
+    double dist = 0.0;
+    long long recorded = 0, arrivals = 0, departures = 0;
+    for (Process& pr : procs) {
+        pr.hist.flush_all(end_time);
+        const std::vector<double>& areas = pr.hist.areas();
+        for (size_t b = 0; b < hist.size() && b < areas.size(); ++b) hist[b] += areas[b];
+        dist += pr.req_dist;
+        recorded += pr.recorded;
+        arrivals += pr.arrivals;
+        departures += pr.departures;
+        stats_.messages += pr.messages;
+        stats_.in_flight += pr.in_flight;
+        res.loop_heap_allocs += pr.allocs;
+        res.response.merge(pr.response);
+    }
+    stats_.windows = windows;
+
+    double total_time_n = sh.recording ? (end_time - sh.stats_start) * n : 0.0;
+    if (total_time_n > 0) {
+        for (double& v : hist) v /= total_time_n;
+    }
+    double mean_q = 0.0;
+    for (size_t b = 0; b < hist.size(); ++b) mean_q += b * hist[b];
+
+    res.hist = hist;
+    res.total_req_dist = dist;
+    res.mean_Q = mean_q;
+    res.mean_W = lambda_ > 0 ? mean_q / lambda_ : 0;
+    res.avg_req_dist = recorded > 0 ? dist / recorded : 0;
+    res.jobs_used = arrivals;
+    res.warmup_jobs = sh.warmup_arrivals;
+    res.events = arrivals + departures;
+    res.rel_error = -1.0;
+    res.batches = 0;
+    return res;
+}
@@ -0,0 +1,116 @@
+#include "ResultStore.hpp"
+#include <iostream>
+#include <sstream>
+
+#ifdef LOADBAL_SQLITE
+#include <sqlite3.h>
+
+// Column names and types of the 'runs' table, in insert order.
+// scripts/results_store.py creates the same table.
+static const char* const COLUMNS[][2] = {
+    {"policy", "TEXT"}, {"graph", "TEXT"}, {"n", "INTEGER"}, {"m", "INTEGER"},
+    {"lambda", "REAL"}, {"mu", "REAL"}, {"k", "INTEGER"}, {"L", "INTEGER"},
+    {"qmax", "INTEGER"}, {"num_clusters", "INTEGER"}, {"comm_cost", "REAL"},
+    {"trace", "TEXT"}, {"tag", "TEXT"}, {"engine", "TEXT"}, {"seed", "INTEGER"},
+    {"replications", "INTEGER"}, {"threads", "INTEGER"},
+    {"total_req_dist", "REAL"}, {"mean_Q", "REAL"}, {"mean_W", "REAL"},
+    {"avg_req_dist", "REAL"}, {"loop_heap_allocs", "INTEGER"},
+    {"setup_seconds", "REAL"}, {"run_seconds", "REAL"},
+    {"neighbor_table_bytes", "INTEGER"}, {"peak_rss_kb", "INTEGER"},
+    {"hist", "BLOB"}, {"record", "TEXT"},
+};
+static const int NUM_COLUMNS = sizeof(COLUMNS) / sizeof(COLUMNS[0]);
+
+ResultStore::~ResultStore() {
+    close();
+}
+
+void ResultStore::close() {
+    if (insert) sqlite3_finalize(insert);
+    if (db) sqlite3_close(db);
+    insert = nullptr;
+    db = nullptr;
+}
+
+bool ResultStore::open(const std::string& path) {
+    close();
+    std::ostringstream ddl, ins;
+    ddl << "CREATE TABLE IF NOT EXISTS runs ("
+        << "id INTEGER PRIMARY KEY, created TEXT DEFAULT CURRENT_TIMESTAMP";
+    ins << "INSERT INTO runs (";
+    for (int i = 0; i < NUM_COLUMNS; ++i) {
+        ddl << ", " << COLUMNS[i][0] << " " << COLUMNS[i][1];
+        ins << (i ? ", " : "") << COLUMNS[i][0];
+    }
+    ddl << ")";
+    ins << ") VALUES (";
+    for (int i = 0; i < NUM_COLUMNS; ++i) ins << (i ? ", ?" : "?");
+    ins << ")";
+
+    bool ok = sqlite3_open(path.c_str(), &db) == SQLITE_OK &&
+              sqlite3_busy_timeout(db, 60000) == SQLITE_OK &&
+              sqlite3_exec(db, "PRAGMA journal_mode=WAL", nullptr, nullptr, nullptr) == SQLITE_OK &&
+              sqlite3_exec(db, ddl.str().c_str(), nullptr, nullptr, nullptr) == SQLITE_OK &&
+              sqlite3_prepare_v2(db, ins.str().c_str(), -1, &insert, nullptr) == SQLITE_OK;
+    if (!ok) {
+        std::cerr << "Error: Could not open result store " << path << ": "
+                  << (db ? sqlite3_errmsg(db) : "out of memory") << "\n";
+        close();
+    }
+    return ok;
+}
+
+bool ResultStore::append(const RunReport& report) {
+    if (!insert) return false;
+    const SimConfig& c = report.config;
+    const SimulationResult& res = report.combined;
+    std::ostringstream record;
+    write_metrics_json(report, record, false);
+    std::string rec = record.str();
+
+    int i = 0;
+    auto text = [&](const std::string& s) {
+        if (s.empty()) sqlite3_bind_null(insert, ++i);
+        else sqlite3_bind_text(insert, ++i, s.c_str(), (int)s.size(), SQLITE_TRANSIENT);
+    };
+    auto integer = [&](long long v) { sqlite3_bind_int64(insert, ++i, v); };
+    auto real = [&](double v) { sqlite3_bind_double(insert, ++i, v); };
+
+    text(c.policy); text(c.topo); integer(c.n); integer(c.m);
+    real(c.lambda); real(c.mu); integer(c.k); integer(c.L);
+    integer(c.qmax); integer(c.num_clusters); real(c.comm_cost);
+    text(c.trace_file); text(c.tag); text(c.engine);
+    integer((long long)c.seed);    // two's complement for seeds >= 2^63
+    integer((long long)report.reps.size()); integer(report.threads);
+    real(res.total_req_dist); real(res.mean_Q); real(res.mean_W);
+    real(res.avg_req_dist); integer(res.loop_heap_allocs);
+    real(report.setup_seconds); real(report.run_seconds);
+    integer((long long)report.neighbor_bytes); integer(report.peak_rss_kb);
+    sqlite3_bind_blob(insert, ++i, res.hist.data(), (int)(res.hist.size() * sizeof(double)),
+                      SQLITE_TRANSIENT);
+    text(rec);
+
+    bool ok = sqlite3_step(insert) == SQLITE_DONE;
+    if (!ok) std::cerr << "Error: Could not store result: " << sqlite3_errmsg(db) << "\n";
+    sqlite3_reset(insert);
+    sqlite3_clear_bindings(insert);
+    return ok;
+}
+
+#else
+
+ResultStore::~ResultStore() {}
+
+void ResultStore::close() {}
+
+bool ResultStore::open(const std::string& path) {
+    std::cerr << "Error: Cannot open result store " << path
+              << ": built without SQLite (make SQLITE=1)\n";
+    return false;
+}
+
+bool ResultStore::append(const RunReport&) {
+    return false;
+}
+
+#endif
@@ -0,0 +1,584 @@
+#include "Runner.hpp"
+#include "Json.hpp"
+#include "Stats.hpp"
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <fstream>
+#include <iostream>
+#include <limits>
+#include <sstream>
+#include <stdexcept>
+#include <sys/resource.h>
+#include <thread>
+#include <unistd.h>
+
+unsigned long long replication_seed(unsigned long long base, int r) {
+    if (r == 0) return base;
+    unsigned long long z = base + (unsigned long long)r * 0x9E3779B97F4A7C15ULL;
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
+}
+
+std::string checkpoint_file(const SimConfig& cfg, int r) {
+    if (cfg.checkpoint.empty() || r == 0) return cfg.checkpoint;
+    return cfg.checkpoint + ".r" + std::to_string(r);
+}
+
+std::string run_name(const SimConfig& cfg) {
+    if (!cfg.tag.empty()) return cfg.tag;
+    std::ostringstream name;
+    name << cfg.policy << "_" << cfg.topo << "_n" << cfg.n << "_lam" << cfg.lambda;
+    return name.str();
+}
+
+std::vector<PairedArm> parse_paired_arms(const std::string& spec) {
+    std::vector<PairedArm> arms;
+    std::stringstream list(spec);
+    std::string item;
+    while (std::getline(list, item, ',')) {
+        std::stringstream fields(item);
+        PairedArm arm;
+        std::string k, L, rest;
+        if (!std::getline(fields, arm.policy, ':') || !std::getline(fields, k, ':') ||
+            !std::getline(fields, L, ':') || std::getline(fields, rest) ||
+            (arm.policy != "pot" && arm.policy != "poKL" && arm.policy != "spatialKL")) {
+            throw std::invalid_argument("expected policy:k:L[,policy:k:L...], got '" + item + "'");
+        }
+        arm.k = std::stoi(k);
+        arm.L = std::stoi(L);
+        arms.push_back(arm);
+    }
+    if (arms.empty()) throw std::invalid_argument("expected policy:k:L[,policy:k:L...]");
+    return arms;
+}
+
+long peak_rss_kb() {
+    struct rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+    return usage.ru_maxrss;
+}
+
+static SimulationResult average(const std::vector<SimulationResult>& reps) {
+    SimulationResult avg{};
+    if (reps.empty()) return avg;
+    avg.hist.assign(reps[0].hist.size(), 0.0);
+    for (const SimulationResult& r : reps) {
+        for (size_t i = 0; i < avg.hist.size(); ++i) avg.hist[i] += r.hist[i];
+        avg.total_req_dist += r.total_req_dist;
+        avg.mean_Q += r.mean_Q;
+        avg.mean_W += r.mean_W;
+        avg.avg_req_dist += r.avg_req_dist;
+        avg.loop_heap_allocs += r.loop_heap_allocs;
+        avg.jobs_used += r.jobs_used;
+        avg.warmup_jobs += r.warmup_jobs;
+        avg.events += r.events;
+        avg.profile.add(r.profile);   // totals, not averages
+        avg.response.merge(r.response);  // all replications' jobs
+    }
+    // Precision of the least precise replication
+    avg.rel_error = reps[0].rel_error;
+    avg.batches = reps[0].batches;
+    for (const SimulationResult& r : reps) {
+        if (r.rel_error > avg.rel_error) avg.rel_error = r.rel_error;
+        avg.batches = std::min(avg.batches, r.batches);
+    }
+    double R = (double)reps.size();
+    for (double& v : avg.hist) v /= R;
+    avg.total_req_dist /= R;
+    avg.mean_Q /= R;
+    avg.mean_W /= R;
+    avg.avg_req_dist /= R;
+    avg.jobs_used = (long long)std::llround(avg.jobs_used / R);
+    avg.warmup_jobs = (long long)std::llround(avg.warmup_jobs / R);
+    avg.events = (long long)std::llround(avg.events / R);
+    return avg;
+}
+
+// One replication of the pdes engine, then (compare_sequential) the heap
+// engine on the same seed. Returns when the parallel run ended.
+// By default the processes get the cores that the 'outer' threads running
+// replications (and sweep points) next to this one leave free.
+static std::chrono::steady_clock::time_point run_parallel_replication(
+        RunReport& rep, int r, const NeighborTable& k_nbrs, int outer) {
+    const SimConfig& c = rep.config;
+    int cores = (int)std::max(1u, std::thread::hardware_concurrency());
+    int lps = c.lps > 0 ? c.lps : std::max(1, cores / std::max(1, outer));
+    auto t0 = std::chrono::steady_clock::now();
+    ParallelSimulation psim(c.n, c.lambda, c.m, c.mu, c.policy, k_nbrs, c.k, c.L, c.qmax,
+                            c.num_clusters, c.comm_cost, rep.seeds[r], lps, c.window);
+    rep.reps[r] = psim.run();
+    rep.parallel[r] = psim.stats();
+    auto t1 = std::chrono::steady_clock::now();
+    rep.rep_seconds[r] = std::chrono::duration<double>(t1 - t0).count();
+
+    if (c.compare_sequential) {
+        Simulation sim(c.n, c.lambda, c.m, c.mu, c.policy, c.topo, k_nbrs, c.k, c.L, c.qmax,
+                       c.num_clusters, c.comm_cost, nullptr, "heap", rep.seeds[r]);
+        rep.sequential[r] = sim.run();
+        rep.sequential_seconds[r] = std::chrono::duration<double>(
+            std::chrono::steady_clock::now() - t1).count();
+    }
+    return t1;
+}
+
+void submit_replications(const SimConfig& cfg, const NeighborTable& k_nbrs,
+                         const Trace* trace, ThreadPool& pool,
+                         std::function<void(RunReport&)> on_done,
+                         Telemetry* telemetry) {
+    // Shared by the replication tasks; the last one to finish reports
+    struct Batch {
+        RunReport report;
+        std::atomic<int> remaining;
+        std::atomic<int> failed{0};
+        std::chrono::steady_clock::time_point start;
+        std::function<void(RunReport&)> on_done;
+    };
+    auto batch = std::make_shared<Batch>();
+    RunReport& report = batch->report;
+    int R = std::max(1, cfg.replications);
+    report.config = cfg;
+    report.seeds.resize(R);
+    report.reps.resize(R);
+    report.rep_seconds.resize(R);
+    if (cfg.engine == "pdes") {
+        report.parallel.resize(R);
+        if (cfg.compare_sequential) {
+            report.sequential.resize(R);
+            report.sequential_seconds.resize(R);
+        }
+    }
+    report.threads = std::min(R, pool.size());
+    report.neighbor_bytes = k_nbrs.memory_bytes();
+    batch->remaining = R;
+    batch->start = std::chrono::steady_clock::now();
+    batch->on_done = std::move(on_done);
+
+    int outer = pool.size();
+    for (int r = 0; r < R; ++r) {
+        report.seeds[r] = replication_seed(cfg.seed, r);
+        pool.submit([batch, &k_nbrs, trace, telemetry, r, outer] {
+            RunReport& rep = batch->report;
+            const SimConfig& c = rep.config;
+            std::string name = run_name(c);
+            if (c.engine == "pdes") {
+                if (telemetry) telemetry->start(name, r, c.n, c.lambda, c.m);
+                auto t1 = run_parallel_replication(rep, r, k_nbrs, outer);
+                if (telemetry) {
+                    telemetry->done(name, r, rep.reps[r].jobs_used, rep.reps[r].mean_Q,
+                                    rep.rep_seconds[r]);
+                }
+                if (--batch->remaining == 0) {
+                    rep.run_seconds = std::chrono::duration<double>(t1 - batch->start).count();
+                    rep.combined = average(rep.reps);
+                    rep.peak_rss_kb = peak_rss_kb();
+                    if (batch->on_done) batch->on_done(rep);
+                }
+                return;
+            }
+
+            auto t0 = std::chrono::steady_clock::now();
+            Simulation sim(c.n, c.lambda, c.m, c.mu, c.policy, c.topo,
+                           k_nbrs, c.k, c.L, c.qmax,
+                           c.num_clusters, c.comm_cost, trace,
+                           c.engine, rep.seeds[r], c.target_rel_error);
+            std::string ckpt = checkpoint_file(c, r);
+            bool ok = true;
+            if (!ckpt.empty()) {
+                sim.set_checkpoint(ckpt, c.checkpoint_events, c.checkpoint_seconds);
+                std::string error;
+                if (c.resume && access(ckpt.c_str(), F_OK) != 0) {
+                    // Killed before its first checkpoint
+                    std::cerr << "Warning: No checkpoint " << ckpt << ", replication "
+                              << r << " starts from the beginning\n";
+                } else if (c.resume && !sim.resume(ckpt, error)) {
+                    std::cerr << "Error: Cannot resume: " << error << "\n";
+                    batch->failed++;
+                    ok = false;
+                }
+            }
+            if (ok && telemetry) {
+                sim.set_telemetry(telemetry, name, r);
+                telemetry->start(name, r, c.n, c.lambda, trace ? (long long)trace->size() : c.m);
+            }
+            if (ok) rep.reps[r] = sim.run();
+            auto t1 = std::chrono::steady_clock::now();
+            rep.rep_seconds[r] = std::chrono::duration<double>(t1 - t0).count();
+            if (ok && telemetry) {
+                telemetry->done(name, r, rep.reps[r].jobs_used, rep.reps[r].mean_Q,
+                                rep.rep_seconds[r]);
+            }
+
+            if (--batch->remaining == 0) {
+                rep.run_seconds = std::chrono::duration<double>(t1 - batch->start).count();
+                rep.failed = batch->failed;
+                if (!rep.failed) rep.combined = average(rep.reps);
+                rep.peak_rss_kb = peak_rss_kb();
+                if (batch->on_done) batch->on_done(rep);
+            }
+        });
+    }
+}
+
+RunReport run_replications(const SimConfig& cfg, const NeighborTable& k_nbrs,
+                           const Trace* trace, ThreadPool& pool, Telemetry* telemetry) {
+    RunReport result;
+    submit_replications(cfg, k_nbrs, trace, pool,
+                        [&result](RunReport& r) { result = r; }, telemetry);
+    pool.wait();
+    return result;
+}
+
+SimConfig paired_config(const SimConfig& cfg, size_t i) {
+    SimConfig c = cfg;
+    c.policy = cfg.paired[i].policy;
+    c.k = cfg.paired[i].k;
+    c.L = cfg.paired[i].L;
+    c.paired.clear();
+    return c;
+}
+
+RunReport run_paired(const SimConfig& cfg, const NeighborTable& k_nbrs,
+                     const std::vector<const NeighborTable*>& arm_nbrs,
+                     ThreadPool& pool, Telemetry* telemetry) {
+    int R = std::max(1, cfg.replications);
+    size_t C = 1 + cfg.paired.size();
+    std::vector<const NeighborTable*> tables{&k_nbrs};
+    tables.insert(tables.end(), arm_nbrs.begin(), arm_nbrs.end());
+
+    std::vector<RunReport> reports(C);
+    for (size_t i = 0; i < C; ++i) {
+        RunReport& rep = reports[i];
+        rep.config = i == 0 ? cfg : paired_config(cfg, i - 1);
+        rep.seeds.resize(R);
+        rep.reps.resize(R);
+        rep.rep_seconds.resize(R);
+        rep.threads = std::min(R, pool.size());
+        rep.neighbor_bytes = tables[i]->memory_bytes();
+        for (int r = 0; r < R; ++r) rep.seeds[r] = replication_seed(cfg.seed, r);
+    }
+
+    auto start = std::chrono::steady_clock::now();
+    std::string name = run_name(cfg);
+    for (int r = 0; r < R; ++r) {
+        pool.submit([&, r] {
+            const SimConfig& c = cfg;
+            unsigned long long seed = reports[0].seeds[r];
+            JobStream jobs(c.n, c.lambda, c.mu, c.m, seed);
+            jobs.fill();
+            std::vector<std::unique_ptr<Simulation>> sims;
+            for (size_t i = 0; i < C; ++i) {
+                const SimConfig& ci = reports[i].config;
+                sims.emplace_back(new Simulation(c.n, c.lambda, c.m, c.mu, ci.policy, c.topo,
+                                                 *tables[i], ci.k, ci.L, c.qmax,
+                                                 c.num_clusters, c.comm_cost, nullptr,
+                                                 c.engine, seed, 0.0, &jobs));
+            }
+            if (telemetry) {
+                sims[0]->set_telemetry(telemetry, name, r);
+                telemetry->start(name, r, c.n, c.lambda, c.m);
+            }
+            // Every simulation uses up a block before the next one is drawn
+            std::vector<double> seconds(C, 0.0);
+            bool done = false;
+            while (!done) {
+                done = true;
+                for (size_t i = 0; i < C; ++i) {
+                    auto t0 = std::chrono::steady_clock::now();
+                    done &= sims[i]->advance();
+                    seconds[i] += std::chrono::duration<double>(
+                        std::chrono::steady_clock::now() - t0).count();
+                }
+                if (!done) jobs.fill();
+            }
+            for (size_t i = 0; i < C; ++i) {
+                reports[i].reps[r] = sims[i]->result();
+                reports[i].rep_seconds[r] = seconds[i];
+            }
+            if (telemetry) {
+                telemetry->done(name, r, reports[0].reps[r].jobs_used, reports[0].reps[r].mean_Q,
+                                seconds[0]);
+            }
+        });
+    }
+    pool.wait();
+
+    double run_seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+    long rss = peak_rss_kb();
+    for (RunReport& rep : reports) {
+        rep.run_seconds = run_seconds;
+        rep.peak_rss_kb = rss;
+        rep.combined = average(rep.reps);
+    }
+    RunReport base = std::move(reports[0]);
+    base.paired.assign(std::make_move_iterator(reports.begin() + 1),
+                       std::make_move_iterator(reports.end()));
+    return base;
+}
+
+void write_hist_csv(const std::vector<double>& hist, const std::string& path) {
+    std::ofstream out(path);
+    // Full precision: the tail probabilities are tiny
+    out.precision(std::numeric_limits<double>::max_digits10);
+    out << "QueueLength,Probability\n";
+    for (size_t i = 0; i < hist.size(); ++i) {
+        if (hist[i] > 0.0)
+            out << i << "," << hist[i] << "\n";
+    }
+}
+
+// Profile of the event loop(s), all replications summed (make PROFILE=1)
+static void write_profile(std::ostream& out, const Profile& p, bool pretty) {
+    const char* nl = pretty ? "\n" : "";
+    const char* in2 = pretty ? "    " : "";
+    const char* in3 = pretty ? "      " : "";
+    std::string sep = std::string(",") + (pretty ? "\n" : " ");
+    double rate = p.ticks_per_second();
+    auto seconds = [rate](double ticks) { return rate > 0 ? ticks / rate : 0.0; };
+    auto share = [&p](double ticks) { return p.loop_ticks ? ticks / p.loop_ticks : 0.0; };
+
+    out << "{" << nl;
+    out << in2 << "\"loop_seconds\": " << p.loop_seconds << sep;
+    out << in2 << "\"ticks_per_second\": " << rate << sep;
+    out << in2 << "\"phases\": {" << nl;
+    for (int i = 0; i < NUM_PHASES; ++i) {
+        out << in3 << "\"" << PROFILE_PHASE_NAMES[i] << "\": {\"seconds\": "
+            << seconds(p.phase_ticks(i)) << ", \"share\": " << share(p.phase_ticks(i))
+            << ", \"calls\": " << p.calls[i] << "}" << sep;
+    }
+    double other = p.phase_ticks(PHASE_OTHER);
+    out << in3 << "\"other\": {\"seconds\": " << seconds(other)
+        << ", \"share\": " << share(other) << "}" << nl << in2 << "}" << sep;
+    out << in2 << "\"events\": " << p.events << sep;
+    out << in2 << "\"arrivals\": " << p.arrivals << sep;
+    out << in2 << "\"departures\": " << p.departures << sep;
+    out << in2 << "\"rejection_retries\": " << p.rejection_retries << sep;
+    out << in2 << "\"dense_samples\": " << p.dense_samples << sep;
+    out << in2 << "\"candidates_scored\": " << p.candidates_scored << sep;
+    out << in2 << "\"heap_allocs\": " << p.heap_allocs << nl;
+    out << (pretty ? "  " : "") << "}";
+}
+
+// pdes engine: synchronization counters (totals over replications) and the
+// comparison with the heap engine
+static void write_parallel(std::ostream& out, const RunReport& report, bool pretty) {
+    const char* nl = pretty ? "\n" : "";
+    const char* in2 = pretty ? "    " : "";
+    std::string sep = std::string(",") + (pretty ? "\n" : " ");
+    long long windows = 0, messages = 0, in_flight = 0;
+    double parallel_seconds = 0.0, sequential_seconds = 0.0;
+    for (size_t r = 0; r < report.parallel.size(); ++r) {
+        windows += report.parallel[r].windows;
+        messages += report.parallel[r].messages;
+        in_flight += report.parallel[r].in_flight;
+        parallel_seconds += report.rep_seconds[r];
+    }
+    for (double s : report.sequential_seconds) sequential_seconds += s;
+    const ParallelStats& first = report.parallel[0];
+
+    out << "{" << nl;
+    out << in2 << "\"lps\": " << first.lps << sep;
+    out << in2 << "\"window\": " << first.window << sep;
+    out << in2 << "\"windows\": " << windows << sep;
+    out << in2 << "\"messages\": " << messages << sep;
+    out << in2 << "\"in_flight\": " << in_flight << sep;
+    out << in2 << "\"parallel_seconds\": " << parallel_seconds;
+    if (!report.sequential.empty()) {
+        SimulationResult seq = average(report.sequential);
+        const SimulationResult& res = report.combined;
+        auto rel = [](double x, double ref) { return ref != 0 ? (x - ref) / ref : 0.0; };
+        out << sep << in2 << "\"sequential_seconds\": " << sequential_seconds << sep;
+        out << in2 << "\"speedup\": "
+            << (parallel_seconds > 0 ? sequential_seconds / parallel_seconds : 0.0) << sep;
+        out << in2 << "\"sequential_mean_Q\": " << seq.mean_Q << sep;
+        out << in2 << "\"sequential_avg_req_dist\": " << seq.avg_req_dist << sep;
+        out << in2 << "\"mean_Q_rel_diff\": " << rel(res.mean_Q, seq.mean_Q) << sep;
+        out << in2 << "\"avg_req_dist_rel_diff\": " << rel(res.avg_req_dist, seq.avg_req_dist);
+    }
+    out << nl << (pretty ? "  " : "") << "}";
+}
+
+// Response-time percentiles and the sketch itself (non-empty buckets as
+// [index, count]; see Sketch.hpp for the bucket layout)
+static void write_response(std::ostream& out, const QuantileSketch& s, bool pretty) {
+    const char* nl = pretty ? "\n" : "";
+    const char* in2 = pretty ? "    " : "";
+    std::string sep = std::string(",") + (pretty ? "\n" : " ");
+    out << "{" << nl;
+    out << in2 << "\"count\": " << s.count() << sep;
+    out << in2 << "\"mean\": " << s.mean() << sep;
+    out << in2 << "\"p50\": " << s.quantile(0.5) << sep;
+    out << in2 << "\"p90\": " << s.quantile(0.9) << sep;
+    out << in2 << "\"p99\": " << s.quantile(0.99) << sep;
+    out << in2 << "\"p999\": " << s.quantile(0.999) << sep;
+    out << in2 << "\"max\": " << s.max() << sep;
+    out << in2 << "\"sketch\": {\"sub_buckets\": " << QuantileSketch::SUB_BUCKETS
+        << ", \"min_exponent\": " << QuantileSketch::MIN_EXPONENT << ", \"buckets\": [";
+    const std::vector<uint64_t>& counts = s.bucket_counts();
+    bool first = true;
+    for (size_t b = 0; b < counts.size(); ++b) {
+        if (!counts[b]) continue;
+        out << (first ? "" : ", ") << "[" << b << ", " << counts[b] << "]";
+        first = false;
+    }
+    out << "]}" << nl << (pretty ? "  " : "") << "}";
+}
+
+// Paired runs: each arm's means and its paired difference to the base
+// configuration across replications (95% CI), next to the standard error
+// the difference would have had with independent runs
+static void write_paired(std::ostream& out, const RunReport& report, bool pretty) {
+    const char* nl = pretty ? "\n" : "";
+    const char* in2 = pretty ? "    " : "";
+    const char* in3 = pretty ? "      " : "";
+    struct Field { const char* name; double SimulationResult::*ptr; };
+    const Field fields[] = {{"mean_Q", &SimulationResult::mean_Q},
+                            {"mean_W", &SimulationResult::mean_W},
+                            {"avg_req_dist", &SimulationResult::avg_req_dist}};
+    auto values = [](const std::vector<SimulationResult>& reps, double SimulationResult::*f) {
+        std::vector<double> xs;
+        for (const SimulationResult& r : reps) xs.push_back(r.*f);
+        return xs;
+    };
+
+    out << "[" << nl;
+    for (size_t a = 0; a < report.paired.size(); ++a) {
+        const RunReport& arm = report.paired[a];
+        const SimConfig& c = arm.config;
+        const SimulationResult& res = arm.combined;
+        double seconds = 0.0;
+        for (double s : arm.rep_seconds) seconds += s;
+        out << in2 << "{\"policy\": \"" << c.policy << "\", \"k\": " << c.k
+            << ", \"L\": " << c.L << ", \"mean_Q\": " << res.mean_Q
+            << ", \"mean_W\": " << res.mean_W << ", \"avg_req_dist\": " << res.avg_req_dist
+            << ", \"p99_response\": " << res.response.quantile(0.99)
+            << ", \"run_seconds\": " << seconds << "," << (pretty ? "\n" : " ");
+        out << in3 << "\"diff\": {";
+        for (size_t f = 0; f < 3; ++f) {
+            std::vector<double> base = values(report.reps, fields[f].ptr);
+            std::vector<double> other = values(arm.reps, fields[f].ptr);
+            std::vector<double> diff(base.size());
+            for (size_t r = 0; r < base.size(); ++r) diff[r] = other[r] - base[r];
+            Estimate d = estimate(diff), eb = estimate(base), eo = estimate(other);
+            out << (f ? ", " : "") << "\"" << fields[f].name << "\": {\"mean\": " << d.mean
+                << ", \"std_err\": " << d.std_err
+                << ", \"ci95_low\": " << d.ci_low << ", \"ci95_high\": " << d.ci_high
+                << ", \"unpaired_std_err\": "
+                << std::sqrt(eb.std_err * eb.std_err + eo.std_err * eo.std_err) << "}";
+        }
+        out << "}}" << (a + 1 < report.paired.size() ? "," : "") << nl;
+    }
+    out << (pretty ? "  " : "") << "]";
+}
+
+static void write_estimate(std::ostream& out, const char* name,
+                           const std::vector<SimulationResult>& reps,
+                           double SimulationResult::*field) {
+    std::vector<double> xs;
+    for (const SimulationResult& r : reps) xs.push_back(r.*field);
+    Estimate e = estimate(xs);
+    out << "\"" << name << "\": {\"mean\": " << e.mean
+        << ", \"std_err\": " << e.std_err
+        << ", \"ci95_low\": " << e.ci_low
+        << ", \"ci95_high\": " << e.ci_high << "}";
+}
+
+void write_metrics_json(const RunReport& report, std::ostream& out, bool pretty) {
+    const SimConfig& c = report.config;
+    const SimulationResult& res = report.combined;
+    const char* nl = pretty ? "\n" : "";
+    const char* in1 = pretty ? "  " : "";
+    const char* in2 = pretty ? "    " : "";
+    std::string sep = std::string(",") + (pretty ? "\n" : " ") + in1;
+
+    out << "{" << nl << in1;
+    out << "\"policy\": \"" << c.policy << "\"" << sep;
+    out << "\"graph\": \"" << c.topo << "\"" << sep;
+    out << "\"n\": " << c.n << sep;
+    out << "\"m\": " << c.m << sep;
+    out << "\"lambda\": " << c.lambda << sep;
+    out << "\"mu\": " << c.mu << sep;
+    out << "\"k\": " << c.k << sep;
+    out << "\"L\": " << c.L << sep;
+    out << "\"qmax\": " << c.qmax << sep;
+    out << "\"num_clusters\": " << c.num_clusters << sep;
+    out << "\"comm_cost\": " << c.comm_cost << sep;
+    if (!c.trace_file.empty()) out << "\"trace\": \"" << json_escape(c.trace_file) << "\"" << sep;
+    if (!c.tag.empty()) out << "\"tag\": \"" << json_escape(c.tag) << "\"" << sep;
+    out << "\"engine\": \"" << c.engine << "\"" << sep;
+    out << "\"seed\": " << c.seed << sep;
+    out << "\"replications\": " << report.reps.size() << sep;
+    out << "\"threads\": " << report.threads << sep;
+    out << "\"total_req_dist\": " << res.total_req_dist << sep;
+    out << "\"mean_Q\": " << res.mean_Q << sep;
+    out << "\"mean_W\": " << res.mean_W << sep;
+    out << "\"avg_req_dist\": " << res.avg_req_dist << sep;
+    out << "\"loop_heap_allocs\": " << res.loop_heap_allocs << sep;
+    out << "\"jobs_used\": " << res.jobs_used << sep;
+    out << "\"warmup_jobs\": " << res.warmup_jobs << sep;
+    out << "\"events\": " << res.events << sep;
+    out << "\"response_time\": ";
+    write_response(out, res.response, pretty);
+    out << sep;
+    if (c.target_rel_error > 0) {
+        // Sequential stopping: requested and achieved relative CI half-width
+        out << "\"target_rel_error\": " << c.target_rel_error << sep;
+        out << "\"rel_error\": " << res.rel_error << sep;
+        out << "\"target_met\": " << (res.rel_error <= c.target_rel_error ? "true" : "false") << sep;
+        out << "\"batches\": " << res.batches << sep;
+    }
+    out << "\"setup_seconds\": " << report.setup_seconds << sep;
+    out << "\"run_seconds\": " << report.run_seconds << sep;
+    out << "\"neighbor_table_bytes\": " << report.neighbor_bytes << sep;
+    out << "\"peak_rss_kb\": " << report.peak_rss_kb;
+    if (!report.parallel.empty()) {
+        out << sep << "\"pdes\": ";
+        write_parallel(out, report, pretty);
+    }
+    if (!report.paired.empty()) {
+        out << sep << "\"paired\": ";
+        write_paired(out, report, pretty);
+    }
+    if (PROFILE_ENABLED) {
+        out << sep << "\"profile\": ";
+        write_profile(out, res.profile, pretty);
+    }
+
+    if (report.reps.size() > 1) {
+        // Across-replication confidence intervals
+        out << sep << "\"ci\": {" << nl << in2;
+        write_estimate(out, "mean_Q", report.reps, &SimulationResult::mean_Q);
+        out << "," << (pretty ? "\n" : " ") << in2;
+        write_estimate(out, "mean_W", report.reps, &SimulationResult::mean_W);
+        out << "," << (pretty ? "\n" : " ") << in2;
+        write_estimate(out, "avg_req_dist", report.reps, &SimulationResult::avg_req_dist);
+        out << nl << in1 << "}";
+
+        out << sep << "\"per_replication\": [" << nl;
+        for (size_t r = 0; r < report.reps.size(); ++r) {
+            const SimulationResult& rr = report.reps[r];
+            out << in2 << "{\"seed\": " << report.seeds[r]
+                << ", \"mean_Q\": " << rr.mean_Q
+                << ", \"mean_W\": " << rr.mean_W
+                << ", \"avg_req_dist\": " << rr.avg_req_dist
+                << ", \"total_req_dist\": " << rr.total_req_dist
+                << ", \"jobs_used\": " << rr.jobs_used
+                << ", \"run_seconds\": " << report.rep_seconds[r] << "}"
+                << (r + 1 < report.reps.size() ? "," : "") << (pretty ? "\n" : " ");
+        }
+        out << in1 << "]";
+    }
+
+    if (!pretty) {
+        std::streamsize precision = out.precision(std::numeric_limits<double>::max_digits10);
+        out << sep << "\"hist\": [";
+        for (size_t i = 0; i < res.hist.size(); ++i) {
+            out << (i ? ", " : "") << res.hist[i];
+        }
+        out << "]";
+        out.precision(precision);
+    }
+    out << nl << "}" << nl;
+}
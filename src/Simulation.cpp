@@ -1,337 +1,1005 @@
 #include "Simulation.hpp" 
 #include <algorithm>
 #include <cmath>
+#include <cstdio>
 #include <iostream>
-#include <fstream>
-#include <unordered_set>
+#include <sstream>
+#include "AllocCounter.hpp"
+#include "Json.hpp"
+#include "Stats.hpp"
+
+// Sequential stopping parameters
+static const int MIN_BLOCK_JOBS = 1000;        // arrivals per block, at least ...
+static const int BLOCK_JOBS_PER_SERVER = 10;   // ... or this many per server
+static const int MAX_BLOCKS = 256;             // then adjacent blocks are merged
+static const int MSER_GROUP = 5;               // blocks per MSER batch
+static const int CI_BATCHES = 20;              // batches for the batch-means CI
+
+// Checkpointing: payload layout version (see save_state). The wall clock
+// is read every CLOCK_CHECK_EVENTS events for time-based checkpoints and
+// telemetry.
+static const uint32_t CHECKPOINT_VERSION = 5;
+static const int CLOCK_CHECK_EVENTS = 4096;
+
+static Policy parse_policy(const std::string& name) {
+    if (name == "pot") return Policy::Pot;
+    if (name == "poKL") return Policy::PoKL;
+    if (name == "spatialKL") return Policy::SpatialKL;
+    return Policy::Unknown;
+}
+
+static Engine parse_engine(const std::string& name) {
+    if (name == "heap") return Engine::Heap;
+    if (name == "occupancy") return Engine::Occupancy;
+    return Engine::Scan;
+}
+
+std::string engine_error(const std::string& engine, const std::string& policy,
+                         const std::string& topology, bool trace) {
+    if (engine == "scan" || engine == "heap") return "";
+    if (engine == "pdes") {
+        if (topology != "cluster") return "The pdes engine partitions clusters: use --topo cluster";
+        if (trace) return "The pdes engine needs exponential service times (no --trace)";
+        return "";
+    }
+    if (engine != "occupancy") {
+        return "Unknown engine '" + engine + "' (expected scan, heap, occupancy or pdes)";
+    }
+    // Only then is every server interchangeable with every other one
+    if (policy != "pot" && policy != "poKL") {
+        return "The occupancy engine supports the pot and poKL policies only";
+    }
+    if (topology != "cycle" && topology != "grid") {
+        return "The occupancy engine supports the cycle and grid topologies only";
+    }
+    if (trace) return "The occupancy engine needs exponential service times (no --trace)";
+    return "";
+}
 
-Simulation::Simulation(int n_, double lambda__, int m_, double mu__,
+
+Simulation::Simulation(int n_, double lambda__, long long m_, double mu__,
                        const std::string &policy_,
                        const std::string &topology_,
-                       const std::vector<std::vector<int>> &dist_,
-                       const std::vector<std::vector<int>> &k_nbrs_,
+                       const NeighborTable &k_nbrs_,
                        int k_, int L_, int qmax_,
                        int num_clusters_, double comm_cost_,
-                       const std::string& trace_file_path)
+                       const Trace* trace_,
+                       const std::string& engine_,
+                       unsigned long long seed_,
+                       double target_rel_error_,
+                       const JobStream* jobs_)
     : n(n_), lambda_(lambda__), m(m_), mu_(mu__), 
       policy(policy_), topology(topology_),
-      dist(dist_), k_nbrs(k_nbrs_), k(k_), L(L_), qmax(qmax_),
+      k_nbrs(&k_nbrs_), k(k_), L(L_), qmax(qmax_),
       num_clusters(num_clusters_), comm_cost(comm_cost_),
-      T(0.0), q(n_, 0), s_time(n_, 1e30), t_arr(0.0), 
-      req_dist(0.0), q_mid_hist(qmax_, 0.0), 
+      engine(parse_engine(engine_)),
+      policy_id(parse_policy(policy_)), topology_id(parse_topology(topology_)),
+      oracle(engine == Engine::Occupancy ? Topology::Unknown : topology_id,
+             n_, num_clusters_, comm_cost_),
+      epoch(0), picked(0),
+      T(0.0), now(0.0),
+      q(engine == Engine::Occupancy ? 0 : n_, 0),
+      s_time(engine == Engine::Occupancy ? 0 : n_, 1e30),
+      fifos(engine == Engine::Occupancy ? 0 : n_),
+      joined_own(false), occ_width(1), t_arr(0.0), 
+      req_dist(0.0), q_mid_hist(qmax_, n_), 
       arrivals_recorded(0),
-      trace_idx(0), use_trace(false)
+      trace(trace_), trace_idx(0), use_trace(trace_ && !trace_->empty()), jobs(jobs_),
+      seed(seed_), arrivals(1), stats_start(0.0), end_time(0.0), finished(false), resumed(false),
+      started(false),
+      loop_allocs(0), alloc_base(0),
+      checkpoint_events(0), checkpoint_seconds(0.0), check_interval(0), check_countdown(0),
+      events_done(0), events_since_checkpoint(0), telemetry(nullptr),
+      events_at_report(0), arrivals_at_start(0), checkpoint_warned(false),
+      target_rel_error(target_rel_error_), block_jobs(0), next_boundary(0),
+      trunc_block(0), achieved_rel_error(-1.0), batches_used(0)
 {
-    rng.seed(123456789ULL);
-    
-    // Load Trace if provided
-    if (!trace_file_path.empty()) {
-        load_trace(trace_file_path);
+    if (engine == Engine::Heap) events = EventHeap(n);
+    if (jobs) sizes = ServerFifos(n);
+    if (engine == Engine::Occupancy) {
+        occ.reset(std::max(qmax + 2, 64), n);
+        if (topology_id == Topology::Grid) occ_width = grid_width(n);
+    }
+
+    // Resolve the candidate sampler and the scoring rule once
+    switch (policy_id) {
+        case Policy::Pot:       sample_candidates = &Simulation::sample_pot; break;
+        case Policy::PoKL:      sample_candidates = &Simulation::sample_pokl; break;
+        case Policy::SpatialKL:
+            sample_candidates = (topology_id == Topology::Cluster)
+                              ? &Simulation::sample_spatial_cluster
+                              : &Simulation::sample_spatial;
+            break;
+        default:                sample_candidates = nullptr; break;
+    }
+    select_candidate = (topology_id == Topology::Cluster)
+                     ? &Simulation::select_min_cost
+                     : &Simulation::select_min_queue;
+
+    size_t max_nbrs = k_nbrs->max_degree();
+    candidates.reserve(2 + std::max(0, k) + std::max(0, L) + max_nbrs);
+    cand_dist.resize(candidates.capacity());
+    if (engine != Engine::Occupancy) mark.assign(n, 0);
+
+    // Dense sampling is only reachable when the candidate set can exceed
+    // half the servers; set up its buffers now rather than in the loop.
+    if (engine != Engine::Occupancy && 2 * candidates.capacity() > (size_t)n) {
+        perm.resize(n);
+        perm_pos.resize(n);
+        for (int i = 0; i < n; ++i) perm[i] = perm_pos[i] = i;
+        swap_log.reserve(2 * (size_t)n);
+    }
+    rng.seed(seed_);
+
+    if (target_rel_error > 0) {
+        block_jobs = std::max<long long>(MIN_BLOCK_JOBS, (long long)BLOCK_JOBS_PER_SERVER * n);
+        boundaries.reserve(MAX_BLOCKS + 2);
+        boundary_hist.reserve((size_t)(MAX_BLOCKS + 2) * qmax);
+        boundary_resp.reserve((size_t)(MAX_BLOCKS + 2) * QuantileSketch::BUCKETS);
+        batch_means.reserve(MAX_BLOCKS + 2);
     }
 
+    // Everything that determines the trajectory; a checkpoint only resumes
+    // into a Simulation with identical parameters
+    CheckpointWriter key;
+    key.put(n); key.put(m); key.put(lambda_); key.put(mu_);
+    key.put_str(policy); key.put_str(topology);
+    key.put(k); key.put(L); key.put(qmax); key.put(num_clusters); key.put(comm_cost);
+    key.put((int)engine); key.put(seed); key.put(target_rel_error);
+    key.put<uint64_t>(use_trace ? trace->size() : 0);
+    config_key.assign(key.bytes().begin(), key.bytes().end());
+
     // Initial System State
+    if (engine == Engine::Occupancy) {
+        join_length(0);
+        t_arr = exp_rv(n * lambda_);
+        return;
+    }
     std::uniform_int_distribution<int> U(0, n - 1);
-    int first = U(rng);
-    q[first]++;
+    int first = jobs ? jobs->origin(0) : U(rng);
+    add_job(first);
     
-    if (use_trace && !trace_jobs.empty()) {
-        s_time[first] = trace_jobs[0].duration;
-        t_arr = trace_jobs[0].inter_arrival_time;
+    if (use_trace) {
+        start_service(first, trace->duration(0));
+        t_arr = trace->inter_arrival(0);
         trace_idx = 1; 
+    } else if (jobs) {
+        start_service(first, jobs->duration(0));
+        t_arr = jobs->gap(0);
     } else {
-        s_time[first] = exp_rv(mu_);
+        start_service(first, exp_rv(mu_));
         t_arr = exp_rv(n * lambda_);
     }
 }
 
-void Simulation::load_trace(const std::string& filepath) {
-    std::ifstream infile(filepath);
-    if (!infile.good()) {
-        std::cerr << "Error: Could not open trace file: " << filepath << "\n";
-        use_trace = false;
-        return;
-    }
-    
-    // Check/Skip header
-    std::string line;
-    if (infile.peek() < '0' || infile.peek() > '9') {
-        std::getline(infile, line);
-    }
+void Simulation::add_job(int i) {
+    PROF_SCOPE(prof, PHASE_HISTOGRAM);
+    q_mid_hist.move(q[i], q[i] + 1, now);
+    q[i]++;
+    fifos.push(i, now);
+}
 
-    double dt, d;
-    while (infile >> dt >> d) {
-        trace_jobs.push_back({dt, d});
+// Departure from server i. Servers are FIFO, so the departing job is the
+// oldest one queued there.
+void Simulation::remove_job(int i) {
+    PROF_SCOPE(prof, PHASE_HISTOGRAM);
+    q_mid_hist.move(q[i], q[i] - 1, now);
+    q[i]--;
+    record_response(fifos.pop(i));
+}
+
+// A job that arrived at 'arrived' leaves now; its response time is recorded
+// if it arrived after the warmup. In sequential mode a job that was queued
+// across block boundaries also joins those boundaries' snapshots, so that
+// truncating at one drops exactly the jobs that arrived before it.
+void Simulation::record_response(double arrived) {
+    if (!q_mid_hist.is_recording() || arrived < stats_start) return;
+    double w = now - arrived;
+    response.add(w);
+    if (boundaries.empty() || arrived > boundaries.back().t) return;
+    size_t b = QuantileSketch::bucket(w);
+    for (size_t j = boundaries.size(); j-- > 0 && boundaries[j].t >= arrived;) {
+        boundary_resp[j * QuantileSketch::BUCKETS + b]++;
+        boundaries[j].responses++;
+        boundaries[j].response_sum += w;
     }
-    
-    if (!trace_jobs.empty()) {
-        std::cout << "Loaded " << trace_jobs.size() << " jobs from trace.\n";
-        use_trace = true;
+}
+
+void Simulation::join_length(int len) {
+    PROF_SCOPE(prof, PHASE_HISTOGRAM);
+    q_mid_hist.move(len, len + 1, now);
+    occ.add(len, -1);
+    occ.add(len + 1, 1);
+}
+
+void Simulation::leave_length(int len) {
+    PROF_SCOPE(prof, PHASE_HISTOGRAM);
+    q_mid_hist.move(len, len - 1, now);
+    occ.add(len, -1);
+    occ.add(len - 1, 1);
+}
+
+void Simulation::start_service(int i, double duration) {
+    PROF_SCOPE(prof, PHASE_EVENT_QUEUE);
+    if (engine == Engine::Heap) {
+        s_time[i] = now + duration;
+        events.push(i, s_time[i]);
     } else {
-        use_trace = false;
+        s_time[i] = duration;
     }
 }
 
+void Simulation::stop_service(int i) {
+    PROF_SCOPE(prof, PHASE_EVENT_QUEUE);
+    s_time[i] = 1e30;
+    if (engine == Engine::Heap) events.remove(i);
+}
+
 double Simulation::exp_rv(double rate) {
+    PROF_SCOPE(prof, PHASE_EXP_RV);
     std::uniform_real_distribution<double> U(0.0, 1.0);
     return -std::log(1.0 - U(rng)) / rate;
 }
 
-int Simulation::get_cluster_id(int node_index) const {
-    if (num_clusters <= 1) return 0;
-    int servers_per_cluster = (n + num_clusters - 1) / num_clusters;
-    return node_index / servers_per_cluster;
-}
+// --- Candidate sampling ---
+// 'mark' holds an epoch stamp per server instead of a hash set, so checking
+// and recording membership is one array access and nothing is allocated.
 
-double Simulation::calculate_distance(int u, int v) {
-    if (u == v) return 0.0;
-
-    // Cluster Logic
-    if (topology == "cluster") {
-        // 1. Determine Topological Distance (Hops)
-        // Same Cluster = 1 Hop 
-        // Different Cluster = 2 Hops 
-        double hops = (get_cluster_id(u) == get_cluster_id(v)) ? 1.0 : 2.0;
-
-        // 2. Apply Weighting
-        double weight = (comm_cost > 1e-9) ? comm_cost : 1.0;
-
-        return hops * weight;
+void Simulation::new_pick_set() {
+    candidates.clear();
+    picked = 0;
+    if (++epoch == 0) { // stamp wrapped around
+        std::fill(mark.begin(), mark.end(), 0);
+        epoch = 1;
     }
+}
 
-    if (!dist.empty()) return (double)dist[u][v];
+void Simulation::pick(int v) {
+    if (mark[v] != epoch) {
+        mark[v] = epoch;
+        picked++;
+    }
+    candidates.push_back(v);
+}
 
-    if (topology == "cycle") {
-        int d = std::abs(u - v);
-        return (double)std::min(d, n - d);
-    } 
-    else if (topology == "grid") {
-        // 1. Find the "Best Fit" Width
-        // Start at sqrt(n) and work down to find the largest factor
-        int width = (int)std::floor(std::sqrt(n));
-        
-        while (n % width != 0) {
-            width--;
+// Add 'count' distinct servers, uniformly among those not picked yet.
+// Sparse requests use rejection sampling, which draws exactly the same
+// random numbers as the original unordered_set loop. When more than half
+// of the remaining servers are needed, rejection degrades badly, so a
+// partial Fisher-Yates shuffle over a reusable permutation is used instead.
+void Simulation::sample_distinct(int count) {
+    int available = n - picked;
+    if (count > available) count = available;
+    if (count <= 0) return;
+
+    if (2 * count <= available) {
+        std::uniform_int_distribution<int> U(0, n - 1);
+        int target = (int)candidates.size() + count;
+        while ((int)candidates.size() < target) {
+            int r = U(rng);
+            if (mark[r] != epoch) pick(r);
+            else PROF_COUNT(prof.rejection_retries++);
         }
-        
-        // Safety check: width can't be 0 (though loop above prevents this since 1 divides everything)
-        if (width == 0) return 0.0; 
+        return;
+    }
+    PROF_COUNT(prof.dense_samples++);
+
+    auto swap_slots = [&](int a, int b) {
+        std::swap(perm[a], perm[b]);
+        perm_pos[perm[a]] = a;
+        perm_pos[perm[b]] = b;
+        swap_log.push_back(a);
+        swap_log.push_back(b);
+    };
 
-        // 2. Calculate Coordinates based on this Perfect Rectangle
-        int r1 = u / width;
-        int c1 = u % width;
-        
-        int r2 = v / width;
-        int c2 = v % width;
-        
-        // 3. Manhattan Distance
-        int dr = std::abs(r1 - r2);
-        int dc = std::abs(c1 - c2);
-        
-        return (double)(dr + dc);
+    // Move the already-picked servers to the front, then shuffle the tail
+    int front = 0;
+    int already = (int)candidates.size();
+    for (int i = 0; i < already; ++i) {
+        int slot = perm_pos[candidates[i]];
+        if (slot >= front) swap_slots(front++, slot); // skip duplicates
+    }
+    for (int i = 0; i < count; ++i, ++front) {
+        std::uniform_int_distribution<int> J(front, n - 1);
+        swap_slots(front, J(rng));
+        pick(perm[front]);
+    }
+
+    // Undo the swaps so 'perm' is the identity again
+    while (!swap_log.empty()) {
+        int b = swap_log.back(); swap_log.pop_back();
+        int a = swap_log.back(); swap_log.pop_back();
+        std::swap(perm[a], perm[b]);
+        perm_pos[perm[a]] = a;
+        perm_pos[perm[b]] = b;
     }
-    return 0.0;
 }
 
-int Simulation::choose_node(int s) {
-    std::vector<int> candidates;
-    candidates.reserve(1 + k + L);
-    candidates.push_back(s);
+void Simulation::sample_pot(int s) {
     std::uniform_int_distribution<int> U(0, n - 1);
+    int r = U(rng);
+    while (r == s) {
+        PROF_COUNT(prof.rejection_retries++);
+        r = U(rng);
+    }
+    candidates.push_back(r);
+}
 
-    if (policy == "pot") {
-        int r; do { r = U(rng); } while (r == s);
-        candidates.push_back(r);
-    } 
-    else if (policy == "poKL") {
-        std::unordered_set<int> used; used.insert(s);
-        while ((int)candidates.size() < 1 + k + L) {
-            int r = U(rng);
-            if (used.find(r) == used.end()) {
-                used.insert(r);
-                candidates.push_back(r);
-            }
-        }
-    } 
-    else if (policy == "spatialKL") {
-        if (topology == "cluster") {
-            // --- CLUSTER LOGIC (Corrected) ---
-            const std::vector<int>& my_cluster_nodes = k_nbrs[s];
-            
-            // 1. Pick 'k' neighbors from the local cluster
-            if (!my_cluster_nodes.empty()) {
-                if ((int)my_cluster_nodes.size() <= k) {
-                    for (int v : my_cluster_nodes) candidates.push_back(v);
-                } else {
-                    std::uniform_int_distribution<int> dist_idx(0, my_cluster_nodes.size() - 1);
-                    std::unordered_set<int> picked_indices;
-                    while ((int)picked_indices.size() < k) {
-                        int idx = dist_idx(rng);
-                        if (picked_indices.find(idx) == picked_indices.end()) {
-                            picked_indices.insert(idx);
-                            candidates.push_back(my_cluster_nodes[idx]);
-                        }
-                    }
-                }
-            }
-
-            // 2. Pick 'L' global random neighbors
-            std::unordered_set<int> used(candidates.begin(), candidates.end());
-            int target_size = candidates.size() + L;
+void Simulation::sample_pokl(int s) {
+    sample_distinct(k + L);
+}
 
-            while ((int)candidates.size() < target_size) {
-                int r = U(rng);
-                if (used.find(r) == used.end()) {
-                    used.insert(r);
-                    candidates.push_back(r);
-                }
-            }
+void Simulation::sample_spatial(int s) {
+    // --- GRID / CYCLE LOGIC ---
+    if (k_nbrs->degree(s) > 0) {
+        for (const int* v = k_nbrs->begin(s); v != k_nbrs->end(s); ++v) pick(*v);
+    }
+    sample_distinct(L);
+}
 
+void Simulation::sample_spatial_cluster(int s) {
+    // 1. Pick 'k' neighbors from the local cluster.
+    // The other members of s's cluster are [begin, end) without s; index
+    // 'idx' into that list maps to begin + idx, shifted past s.
+    int size = k_nbrs->degree(s);
+    if (size > 0) {
+        int begin = k_nbrs->cluster_begin(s);
+        auto member = [&](int idx) { return begin + idx + (begin + idx >= s ? 1 : 0); };
+        if (size <= k) {
+            for (int idx = 0; idx < size; ++idx) pick(member(idx));
         } else {
-            // --- GRID / CYCLE LOGIC ---
-            for (int v : k_nbrs[s]) candidates.push_back(v);
-            std::unordered_set<int> used(candidates.begin(), candidates.end());
-            int target = 1 + k_nbrs[s].size() + L;
+            std::uniform_int_distribution<int> dist_idx(0, size - 1);
+            int target = (int)candidates.size() + k;
             while ((int)candidates.size() < target) {
-                int r = U(rng);
-                if (used.find(r) == used.end()) {
-                    used.insert(r);
-                    candidates.push_back(r);
-                }
+                int v = member(dist_idx(rng));
+                if (mark[v] != epoch) pick(v);
+                else PROF_COUNT(prof.rejection_retries++);
             }
         }
     }
 
-    // --- SELECTION LOGIC ---
-    int best = candidates[0];
-    double best_score = 1e30;
+    // 2. Pick 'L' global random neighbors
+    sample_distinct(L);
+}
+
+// --- Selection ---
 
+int Simulation::select_min_queue(int s) {
+    PROF_COUNT(prof.candidates_scored += candidates.size());
+    int best = candidates[0];
+    int best_q = q[best];
     for (int cand : candidates) {
-        double score;
-        if (topology == "cluster") {
-            // Score = Queue Length + Comm Cost
-            double processing_time = q[cand]; 
-            double cost = calculate_distance(s, cand);
-            score = processing_time + cost;
-        } else {
-            score = (double)q[cand];
+        if (q[cand] < best_q) {
+            best_q = q[cand];
+            best = cand;
         }
+    }
+    return best;
+}
 
+int Simulation::select_min_cost(int s) {
+    // Score = Queue Length + Comm Cost
+    int count = (int)candidates.size();
+    PROF_COUNT(prof.candidates_scored += count);
+    oracle.distances(s, candidates.data(), count, cand_dist.data());
+    int best = candidates[0];
+    double best_score = 1e30;
+    for (int i = 0; i < count; ++i) {
+        double score = q[candidates[i]] + cand_dist[i];
         if (score < best_score) {
             best_score = score;
-            best = cand;
+            best = candidates[i];
         }
     }
     return best;
 }
 
+int Simulation::choose_node(int s) {
+    new_pick_set();
+    pick(s);
+    if (sample_candidates) (this->*sample_candidates)(s);
+    return (this->*select_candidate)(s);
+}
+
+// --- Occupancy engine ---
+
+// Queue length joined by an arrival: the length of its own server, then of
+// 1 (pot) or k + L (poKL) distinct other servers, each drawn by rank among
+// the servers not drawn yet (drawn ones are taken out of the counts and put
+// back afterwards). The first shortest candidate wins, as in choose_node.
+int Simulation::choose_length() {
+    int others = std::min(policy_id == Policy::Pot ? 1 : k + L, n - 1);
+    candidates.clear();
+    for (int i = 0; i <= others; ++i) {
+        std::uniform_int_distribution<long long> R(0, (long long)n - 1 - i);
+        int len = occ.find(R(rng));
+        occ.add(len, -1);
+        candidates.push_back(len);
+    }
+    PROF_COUNT(prof.candidates_scored += candidates.size());
+    int best = 0;
+    for (int i = 0; i < (int)candidates.size(); ++i) {
+        occ.add(candidates[i], 1);
+        if (candidates[i] < candidates[best]) best = i;
+    }
+    joined_own = (best == 0);
+    return candidates[best];
+}
+
+// Distance from a uniformly random server to a uniformly random other one,
+// which is what a job travels when it leaves its own server
+double Simulation::random_distance() {
+    std::uniform_int_distribution<long long> U(0, n - 1), V(1, n - 1);
+    long long s = U(rng);
+    long long v = (s + V(rng)) % n;
+    if (topology_id == Topology::Grid) {
+        return (double)(std::llabs(s / occ_width - v / occ_width) +
+                        std::llabs(s % occ_width - v % occ_width));
+    }
+    long long d = std::llabs(s - v);
+    return (double)std::min(d, n - d);
+}
+
+// Snapshot of the cumulative statistics at the current time
+void Simulation::record_boundary(long long arrivals) {
+    q_mid_hist.flush_all(now);
+    const std::vector<double>& areas = q_mid_hist.areas();
+    double q_area = 0.0;
+    for (size_t k = 0; k < areas.size(); ++k) q_area += k * areas[k];
+    boundaries.push_back({now, q_area, req_dist, arrivals, arrivals_recorded,
+                          (uint64_t)response.count(), response.sum()});
+    boundary_hist.insert(boundary_hist.end(), areas.begin(), areas.end());
+    const std::vector<uint64_t>& buckets = response.bucket_counts();
+    boundary_resp.insert(boundary_resp.end(), buckets.begin(), buckets.end());
+}
+
+// Time-average queue length per server between boundaries a < b
+double Simulation::block_mean(int a, int b) const {
+    double dt = boundaries[b].t - boundaries[a].t;
+    return dt > 0 ? (boundaries[b].q_area - boundaries[a].q_area) / (n * dt) : 0.0;
+}
+
+// Called when a block completes; true once the target precision is met
+bool Simulation::block_boundary() {
+    PROF_SCOPE(prof, PHASE_BOOKKEEPING);
+    record_boundary(next_boundary);
+    int blocks = (int)boundaries.size() - 1;
+    if (blocks == MAX_BLOCKS) {
+        // Keep every other boundary: half as many blocks, each twice as long
+        size_t nbins = q_mid_hist.areas().size();
+        size_t nresp = QuantileSketch::BUCKETS;
+        for (int i = 1; i <= MAX_BLOCKS / 2; ++i) {
+            boundaries[i] = boundaries[2 * i];
+            std::copy(boundary_hist.begin() + 2 * i * nbins,
+                      boundary_hist.begin() + (2 * i + 1) * nbins,
+                      boundary_hist.begin() + i * nbins);
+            std::copy(boundary_resp.begin() + 2 * i * nresp,
+                      boundary_resp.begin() + (2 * i + 1) * nresp,
+                      boundary_resp.begin() + i * nresp);
+        }
+        boundaries.resize(MAX_BLOCKS / 2 + 1);
+        boundary_hist.resize((MAX_BLOCKS / 2 + 1) * nbins);
+        boundary_resp.resize((MAX_BLOCKS / 2 + 1) * nresp);
+        block_jobs *= 2;
+    }
+    next_boundary = boundaries.back().arrivals + block_jobs;
+    return estimate_precision(false) && achieved_rel_error <= target_rel_error;
+}
+
+// MSER-5 warmup over the blocks, then a batch-means CI on the rest.
+// Returns false while there are too few blocks (unless final_estimate).
+bool Simulation::estimate_precision(bool final_estimate) {
+    int blocks = (int)boundaries.size() - 1;
+    int groups = blocks / MSER_GROUP;
+    trunc_block = 0;
+    if (groups >= 2) {
+        batch_means.clear();
+        for (int g = 0; g < groups; ++g) {
+            batch_means.push_back(block_mean(g * MSER_GROUP, (g + 1) * MSER_GROUP));
+        }
+        trunc_block = MSER_GROUP * mser_truncation(batch_means.data(), groups);
+    }
+
+    int remaining = blocks - trunc_block;
+    int B = CI_BATCHES;
+    if (remaining < 2 * B) {
+        if (!final_estimate || remaining < 2) return false;
+        B = std::min(B, remaining);
+    }
+    int per_batch = remaining / B;
+    trunc_block = blocks - B * per_batch;   // leftover blocks join the warmup
+
+    batch_means.clear();
+    double sum = 0.0;
+    for (int b = 0; b < B; ++b) {
+        int first = trunc_block + b * per_batch;
+        batch_means.push_back(block_mean(first, first + per_batch));
+        sum += batch_means.back();
+    }
+    double avg = sum / B, ss = 0.0;
+    for (double x : batch_means) ss += (x - avg) * (x - avg);
+    double half = t_quantile_975(B - 1) * std::sqrt(ss / (B - 1) / B);
+    double grand = block_mean(trunc_block, blocks);
+    achieved_rel_error = grand > 0 ? half / grand : 1e30;
+    batches_used = B;
+    return true;
+}
+
+// --- Checkpointing ---
+
+void Simulation::set_checkpoint(const std::string& path, long long every_events,
+                                double every_seconds) {
+    checkpoint_path = path;
+    checkpoint_events = std::max(0LL, every_events);
+    checkpoint_seconds = std::max(0.0, every_seconds);
+    schedule_ticks();
+}
+
+void Simulation::set_telemetry(Telemetry* sink, const std::string& run, int rep) {
+    telemetry = (sink && sink->active()) ? sink : nullptr;
+    telemetry_prefix = "{\"type\": \"progress\", \"run\": \"" + json_escape(run) +
+                       "\", \"rep\": " + std::to_string(rep);
+    schedule_ticks();
+}
+
+// Event-count checkpoints need ticks at that count; anything driven by the
+// wall clock needs them every CLOCK_CHECK_EVENTS
+void Simulation::schedule_ticks() {
+    bool checkpointing = !checkpoint_path.empty();
+    long long interval = checkpointing ? checkpoint_events : 0;
+    if (telemetry || (checkpointing && checkpoint_seconds > 0)) {
+        interval = interval > 0 ? std::min<long long>(interval, CLOCK_CHECK_EVENTS)
+                                : CLOCK_CHECK_EVENTS;
+    }
+    check_interval = (int)std::min<long long>(interval, 1 << 30);
+}
+
+// Payload layout (CHECKPOINT_VERSION 5). Scratch state (candidate marks,
+// the dense-sampling permutation) is not saved: it carries nothing between
+// arrivals. The event heap is rebuilt from s_time on resume; the Occupancy
+// engine saves its counts instead of q and s_time (left empty). The job
+// FIFOs are saved as their arrival times, server by server.
+void Simulation::save_state(CheckpointWriter& out) const {
+    out.put_str(config_key);
+    out.put(arrivals);
+    out.put<char>(finished);
+    out.put(now);
+    out.put(t_arr);
+    out.put(req_dist);
+    out.put(arrivals_recorded);
+    out.put<uint64_t>(trace_idx);
+    out.put(stats_start);
+    out.put(end_time);
+    out.put(loop_allocs);
+    out.put_vec(q);
+    out.put_vec(s_time);
+    q_mid_hist.save(out);
+    occ.save(out);
+    fifos.save(out);
+    response.save(out);
+    std::ostringstream rng_state;
+    rng_state << rng;
+    out.put_str(rng_state.str());
+
+    // Sequential stopping (empty otherwise)
+    out.put(block_jobs);
+    out.put(next_boundary);
+    out.put_vec(boundaries);
+    out.put_vec(boundary_hist);
+    out.put_vec(boundary_resp);
+}
+
+bool Simulation::resume(const std::string& path, std::string& error) {
+    CheckpointReader in;
+    if (!in.open(path, CHECKPOINT_VERSION, error)) return false;
+    if (in.get_str() != config_key) {
+        error = path + " was written for different simulation parameters";
+        return false;
+    }
+    arrivals = in.get<long long>();
+    finished = in.get<char>() != 0;
+    now = in.get<double>();
+    t_arr = in.get<double>();
+    req_dist = in.get<double>();
+    arrivals_recorded = in.get<long long>();
+    trace_idx = (size_t)in.get<uint64_t>();
+    stats_start = in.get<double>();
+    end_time = in.get<double>();
+    loop_allocs = in.get<long long>();
+    bool ok = in.get_vec(q, (long long)q.size()) && in.get_vec(s_time, (long long)s_time.size()) &&
+              q_mid_hist.load(in) && occ.load(in) && fifos.load(in, q) && response.load(in);
+    std::istringstream rng_state(in.get_str());
+    rng_state >> rng;
+    ok = ok && !rng_state.fail();
+
+    block_jobs = in.get<long long>();
+    next_boundary = in.get<long long>();
+    ok = ok && in.get_vec(boundaries) && in.get_vec(boundary_hist) &&
+              in.get_vec(boundary_resp) && in.ok() && in.at_end();
+    if (!ok) {
+        error = path + " does not match this build's checkpoint layout";
+        return false;
+    }
+
+    if (engine == Engine::Heap) {
+        // Ties are broken by server index, so the rebuilt heap yields
+        // completions in exactly the original order
+        events.clear();
+        for (int i = 0; i < n; ++i) {
+            if (q[i] > 0) events.push(i, s_time[i]);
+        }
+    }
+    resumed = true;
+    return true;
+}
+
+void Simulation::write_checkpoint() {
+    // Serialization and file I/O allocate; keep them out of loop_heap_allocs
+    loop_allocs += (long long)(heap_alloc_count() - alloc_base);
+    checkpoint_buf.clear();
+    save_state(checkpoint_buf);
+    if (!checkpoint_buf.commit(checkpoint_path, CHECKPOINT_VERSION) && !checkpoint_warned) {
+        std::cerr << "Warning: Could not write checkpoint " << checkpoint_path << "\n";
+        checkpoint_warned = true;
+    }
+    events_since_checkpoint = 0;
+    last_checkpoint = std::chrono::steady_clock::now();
+    alloc_base = heap_alloc_count();
+}
+
+// One progress line; formatted on the stack, so nothing is allocated
+void Simulation::report_progress(std::chrono::steady_clock::time_point t) {
+    double elapsed = std::chrono::duration<double>(t - run_start).count();
+    double since = std::chrono::duration<double>(t - last_report).count();
+    long long max_jobs = use_trace ? (long long)trace->size() : m;
+    double job_rate = elapsed > 0 ? (arrivals - arrivals_at_start) / elapsed : 0.0;
+    double eta = job_rate > 0 ? (max_jobs - arrivals) / job_rate : -1.0;
+    double mean_q = -1.0;
+    if (q_mid_hist.is_recording() && now > stats_start) {
+        mean_q = q_mid_hist.level_area(now) / (n * (now - stats_start));
+    }
+
+    char line[1024];
+    int len = snprintf(line, sizeof(line),
+                       "%s, \"jobs\": %lld, \"max_jobs\": %lld, \"events\": %lld, "
+                       "\"events_per_sec\": %.6g, \"elapsed\": %.3f, \"sim_time\": %.10g, "
+                       "\"mean_Q\": %.9g, \"eta_seconds\": %.1f",
+                       telemetry_prefix.c_str(), arrivals, max_jobs, events_done,
+                       since > 0 ? (events_done - events_at_report) / since : 0.0,
+                       elapsed, now, mean_q, eta);
+    if (target_rel_error > 0 && len > 0 && len < (int)sizeof(line)) {
+        len += snprintf(line + len, sizeof(line) - len, ", \"rel_error\": %.6g",
+                        achieved_rel_error);
+    }
+    if (len > 0 && len + 1 < (int)sizeof(line)) {
+        line[len++] = '}';
+        telemetry->send(line, len);
+    }
+    last_report = t;
+    events_at_report = events_done;
+}
+
+// Runs every check_interval events
+void Simulation::tick() {
+    PROF_SCOPE(prof, PHASE_BOOKKEEPING);
+    check_countdown = check_interval;
+    events_done += check_interval;
+    bool timed = telemetry || checkpoint_seconds > 0;
+    std::chrono::steady_clock::time_point t;
+    if (timed) t = std::chrono::steady_clock::now();
+
+    if (!checkpoint_path.empty()) {
+        events_since_checkpoint += check_interval;
+        bool due = checkpoint_events > 0 && events_since_checkpoint >= checkpoint_events;
+        if (!due && checkpoint_seconds > 0) {
+            due = std::chrono::duration<double>(t - last_checkpoint).count() >= checkpoint_seconds;
+        }
+        if (due) write_checkpoint();
+    }
+    if (telemetry && std::chrono::duration<double>(t - last_report).count() >= telemetry->interval) {
+        report_progress(t);
+    }
+}
+
 SimulationResult Simulation::run() {
-    int arrivals = 1;
-    int max_jobs = use_trace ? trace_jobs.size() : m;
-    int warmup = static_cast<int>(max_jobs * 0.2);
+    advance();
+    return result();
+}
+
+bool Simulation::advance() {
+    long long max_jobs = use_trace ? (long long)trace->size() : m;
+    bool sequential = target_rel_error > 0;
+    // Sequential mode records from the start and truncates afterwards
+    long long warmup = sequential ? 0 : static_cast<long long>(max_jobs * 0.2);
     
     std::uniform_int_distribution<int> U(0, n - 1);
 
-    while (arrivals < max_jobs) {
+    if (!started) {
+        started = true;
+        // Time-weighted histogram: only record stats after warmup.
+        // Bins are updated lazily on each queue-length change (see Histogram.hpp).
+        // A resumed run has all of this in its checkpoint.
+        if (!resumed) {
+            stats_start = now;
+            if (arrivals > warmup) q_mid_hist.start(now);
+            if (sequential) {
+                record_boundary(arrivals);
+                next_boundary = arrivals + block_jobs;
+            }
+        }
+
+        if (check_interval > 0) {
+            check_countdown = check_interval;
+            events_done = events_since_checkpoint = events_at_report = 0;
+            arrivals_at_start = arrivals;
+            run_start = last_report = last_checkpoint = std::chrono::steady_clock::now();
+        }
+        prof = Profile();
+        if (PROFILE_ENABLED) prof.overhead = profile_timer_overhead();
+    }
+    alloc_base = heap_alloc_count();
+    bool paused = false;
+    std::uint64_t loop_ticks = 0;
+    std::chrono::steady_clock::time_point loop_start;
+    if (PROFILE_ENABLED) {
+        loop_ticks = profile_ticks();
+        loop_start = std::chrono::steady_clock::now();
+    }
+
+    while (!finished && arrivals < max_jobs) {
+        // The next arrival is job 'arrivals' of the stream
+        if (jobs && arrivals >= jobs->end()) {
+            paused = true;
+            break;
+        }
+        PROF_EVENT(prof);
         // 1. Find the next event (min_service vs t_arr)
         int min_idx = -1;
         double min_service = 1e30;
-        for (int i = 0; i < n; i++) {
-            if (q[i] > 0 && s_time[i] < min_service) {
-                min_service = s_time[i];
-                min_idx = i;
+        {
+            PROF_SCOPE(prof, PHASE_NEXT_EVENT);
+            if (engine == Engine::Heap) {
+                if (!events.empty()) {
+                    min_idx = events.top();
+                    min_service = events.top_time() - now;
+                }
+            } else if (engine == Engine::Occupancy) {
+                // Memoryless: the next completion among the busy servers
+                long long busy = n - occ.count(0);
+                if (busy > 0) {
+                    min_idx = 0;
+                    min_service = exp_rv(mu_ * busy);
+                }
+            } else {
+                for (int i = 0; i < n; i++) {
+                    if (q[i] > 0 && s_time[i] < min_service) {
+                        min_service = s_time[i];
+                        min_idx = i;
+                    }
+                }
             }
         }
 
         double dt = std::min(t_arr, min_service);
         
-        // --- CRITICAL FIX: Time-Weighted Histogram Update ---
-        // Only record stats after warmup
-        if (arrivals > warmup && dt > 0) {
-            T += dt;
-            // For every queue, add the duration 'dt' to its length bin
-            for (int i = 0; i < n; ++i) {
-                int len = q[i];
-                if (len < qmax) {
-                    q_mid_hist[len] += dt;
-                } else {
-                    q_mid_hist[qmax-1] += dt; // overflow bin
-                }
-            }
-        }
-
-        // Advance clocks
+        // Advance clocks (the Heap engine keeps absolute completion times)
         if (dt > 0) {
+             PROF_SCOPE(prof, PHASE_CLOCK);
              t_arr -= dt;
-             for (int i=0; i<n; i++) if(q[i]>0) s_time[i] -= dt;
+             now += dt;
+             if (engine == Engine::Scan) {
+                 for (int i=0; i<n; i++) if(q[i]>0) s_time[i] -= dt;
+             }
         }
 
         if (t_arr <= 1e-9) { // ARRIVAL
             arrivals++;
+            PROF_COUNT(prof.arrivals++);
             
             // (Removed the old random sampling code here)
 
-            double job_duration;
+            double job_duration = 0.0;
             if (use_trace) {
-                job_duration = trace_jobs[trace_idx-1].duration; 
-            } else {
+                PROF_SCOPE(prof, PHASE_TRACE);
+                job_duration = trace->duration(trace_idx-1); 
+            } else if (jobs) {
+                job_duration = jobs->duration(arrivals - 1);
+            } else if (engine != Engine::Occupancy) {
                 job_duration = exp_rv(mu_);
             }
 
-            int s = U(rng);
-            int chosen = choose_node(s);
-            q[chosen]++;
+            // Occupancy: 'chosen' is the queue length joined, not a server
+            int s = -1, chosen;
+            {
+                PROF_SCOPE(prof, PHASE_CHOOSE_NODE);
+                if (engine == Engine::Occupancy) {
+                    chosen = choose_length();
+                } else {
+                    s = jobs ? jobs->origin(arrivals - 1) : U(rng);
+                    chosen = choose_node(s);
+                }
+            }
+            if (engine == Engine::Occupancy) join_length(chosen);
+            else add_job(chosen);
+
+            if (arrivals == warmup + 1) {
+                stats_start = now;
+                q_mid_hist.start(now);
+            }
 
             if (arrivals > warmup) {
-                req_dist += calculate_distance(s, chosen);
+                if (engine != Engine::Occupancy) {
+                    req_dist += oracle.distance(s, chosen);
+                } else {
+                    if (!joined_own) req_dist += random_distance();
+                    // Behind 'chosen' jobs, with exponential service, a job
+                    // stays Erlang(chosen + 1, mu): no FIFO needed
+                    std::gamma_distribution<double> G(chosen + 1, 1.0 / mu_);
+                    response.add(G(rng));
+                }
                 arrivals_recorded++;
             }
 
-            if (q[chosen] == 1) s_time[chosen] = job_duration;
+            if (engine != Engine::Occupancy && q[chosen] == 1) start_service(chosen, job_duration);
+            else if (jobs) sizes.push(chosen, job_duration);
 
             if (use_trace) {
-                if (trace_idx < trace_jobs.size()) {
-                    t_arr = trace_jobs[trace_idx].inter_arrival_time;
+                PROF_SCOPE(prof, PHASE_TRACE);
+                if (trace_idx < trace->size()) {
+                    t_arr = trace->inter_arrival(trace_idx);
                     trace_idx++;
                 } else {
                     t_arr = 1e30; 
                 }
+            } else if (jobs) {
+                t_arr = jobs->gap(arrivals - 1);
             } else {
                 t_arr = exp_rv(n * lambda_);
             }
 
+            if (sequential && arrivals == next_boundary && block_boundary()) break;
         } 
+        else if (engine == Engine::Occupancy) { // SERVICE at a uniformly random busy server
+            PROF_COUNT(prof.departures++);
+            std::uniform_int_distribution<long long> B(occ.count(0), (long long)n - 1);
+            leave_length(occ.find(B(rng)));
+        }
         else { // SERVICE
-            q[min_idx]--;
+            PROF_COUNT(prof.departures++);
+            remove_job(min_idx);
             if (q[min_idx] == 0) {
-                s_time[min_idx] = 1e30;
+                stop_service(min_idx);
             } else {
-                s_time[min_idx] = exp_rv(mu_); 
+                start_service(min_idx, jobs ? sizes.pop(min_idx) : exp_rv(mu_));
             }
         }
+
+        if (check_countdown > 0 && --check_countdown == 0) tick();
     }
 
+    if (paused) {
+        loop_allocs += (long long)(heap_alloc_count() - alloc_base);
+    } else if (!finished) {
+        finished = true;
+        drain();
+        loop_allocs += (long long)(heap_alloc_count() - alloc_base);
+        // Final state, so that an interrupted replication set can still
+        // pick up the replications that had already completed
+        if (!checkpoint_path.empty()) write_checkpoint();
+    }
+    if (PROFILE_ENABLED) {
+        prof.timing = false;
+        prof.loop_ticks += profile_ticks() - loop_ticks;
+        prof.loop_seconds += std::chrono::duration<double>(
+            std::chrono::steady_clock::now() - loop_start).count();
+        prof.heap_allocs = loop_allocs;
+    }
+    return !paused;
+}
+
+// After the last arrival. The statistics end here (end_time), but dropping
+// the jobs still queued would cut off the longest response times, so
+// departures go on, without arrivals, until every queue is empty; they only
+// add response times. The Occupancy engine draws each job's response time
+// when it arrives and has nothing to serve out.
+void Simulation::drain() {
+    end_time = now;
+    // Close the last (partial) block before its jobs leave
+    if (target_rel_error > 0 && arrivals > boundaries.back().arrivals) record_boundary(arrivals);
+    if (engine == Engine::Occupancy) return;
+    while (true) {
+        int i = -1;
+        if (engine == Engine::Heap) {
+            if (events.empty()) break;
+            i = events.top();
+            now = events.top_time();
+        } else {
+            double dt = 1e30;
+            for (int j = 0; j < n; ++j) {
+                if (q[j] > 0 && s_time[j] < dt) {
+                    dt = s_time[j];
+                    i = j;
+                }
+            }
+            if (i < 0) break;
+            now += dt;
+            for (int j = 0; j < n; ++j) if (q[j] > 0) s_time[j] -= dt;
+        }
+        q[i]--;
+        record_response(fifos.pop(i));
+        if (q[i] == 0) stop_service(i);
+        else start_service(i, jobs ? sizes.pop(i) : exp_rv(mu_));
+    }
+}
+
+SimulationResult Simulation::result() {
+    long long max_jobs = use_trace ? (long long)trace->size() : m;
+    bool sequential = target_rel_error > 0;
+    long long warmup = sequential ? 0 : static_cast<long long>(max_jobs * 0.2);
+
     // --- Post-Processing ---
     // Normalize the time-weighted histogram
     // Total time accumulated across all N nodes is T * n
+    q_mid_hist.flush_all(end_time);
+    std::vector<double> hist = q_mid_hist.areas();
+    long long warmup_jobs = warmup;
+    // Every arrival but the initial job is an event, and so is every
+    // departure: the jobs that arrived and are no longer queued
+    long long in_system = occ.total_jobs();
+    for (int len : q) in_system += len;
+    long long events = (arrivals - 1) + (arrivals - in_system);
+    long long recorded = arrivals_recorded;
+    double dist = req_dist;
+    QuantileSketch responses = response;
+    if (sequential) {
+        // Drop everything before the MSER truncation point (drain() closed
+        // the last block)
+        estimate_precision(true);
+        const Boundary& b0 = boundaries[trunc_block];
+        const double* h0 = boundary_hist.data() + (size_t)trunc_block * hist.size();
+        for (size_t k = 0; k < hist.size(); ++k) hist[k] -= h0[k];
+        stats_start = b0.t;
+        warmup_jobs = b0.arrivals;
+        recorded -= b0.recorded;
+        dist -= b0.req_dist;
+        responses.subtract(boundary_resp.data() + (size_t)trunc_block * QuantileSketch::BUCKETS,
+                           b0.responses, b0.response_sum);
+        // Every job that arrived after the truncation point (drain() has
+        // served them all out)
+        long long expected = arrivals - warmup_jobs;
+        if (responses.count() != expected) {
+            std::cerr << "Warning: response_time holds " << responses.count()
+                      << " jobs, expected " << expected << "\n";
+        }
+    }
+    T = q_mid_hist.is_recording() ? end_time - stats_start : 0.0;
     double total_time_n = T * n;
     
     if (total_time_n > 0) {
-        for(double &v : q_mid_hist) v /= total_time_n;
+        for(double &v : hist) v /= total_time_n;
     }
     
     // Calculate Mean Q
     double mean_Q_dist = 0.0;
-    for (size_t k = 0; k < q_mid_hist.size(); ++k) {
-        mean_Q_dist += k * q_mid_hist[k];
+    for (size_t k = 0; k < hist.size(); ++k) {
+        mean_Q_dist += k * hist[k];
     }
 
     double mean_W = (lambda_ > 0) ? mean_Q_dist / lambda_ : 0;
     
     return {
-        q_mid_hist, 
-        req_dist, 
+        hist, 
+        dist, 
         mean_Q_dist,   
         mean_W, 
-        (arrivals_recorded>0 ? req_dist/arrivals_recorded : 0)
+        (recorded>0 ? dist/recorded : 0),
+        loop_allocs,
+        arrivals,
+        warmup_jobs,
+        events,
+        sequential ? achieved_rel_error : -1.0,
+        sequential ? batches_used : 0,
+        prof,
+        responses
     };
 }
\ No newline at end of file
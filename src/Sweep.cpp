@@ -0,0 +1,213 @@
+#include "Sweep.hpp"
+#include "Json.hpp"
+#include <chrono>
+#include <fstream>
+#include <iostream>
+#include <sstream>
+#include <map>
+#include <memory>
+#include <mutex>
+
+bool set_config_field(SimConfig& cfg, const std::string& key, const std::string& value) {
+    if (key == "n") cfg.n = std::stoi(value);
+    else if (key == "m") cfg.m = std::stoll(value);
+    else if (key == "lambda") cfg.lambda = std::stod(value);
+    else if (key == "mu") cfg.mu = std::stod(value);
+    else if (key == "policy") cfg.policy = value;
+    else if (key == "topo") cfg.topo = value;
+    else if (key == "k") cfg.k = std::stoi(value);
+    else if (key == "L") cfg.L = std::stoi(value);
+    else if (key == "clusters") cfg.num_clusters = std::stoi(value);
+    else if (key == "cost") cfg.comm_cost = std::stod(value);
+    else if (key == "qmax") cfg.qmax = std::stoi(value);
+    else if (key == "trace") cfg.trace_file = value;
+    else if (key == "engine") cfg.engine = value;
+    else if (key == "seed") cfg.seed = std::stoull(value);
+    else if (key == "replications") cfg.replications = std::stoi(value);
+    else if (key == "target-rel-error") cfg.target_rel_error = std::stod(value);
+    else if (key == "lps") cfg.lps = std::stoi(value);
+    else if (key == "window") cfg.window = std::stod(value);
+    else if (key == "compare-sequential") cfg.compare_sequential = (value != "0" && value != "false");
+    else if (key == "paired") cfg.paired = parse_paired_arms(value);
+    else if (key == "tag") cfg.tag = value;
+    else return false;
+    return true;
+}
+
+static void apply_object(SimConfig& cfg, const JsonValue& obj) {
+    if (!obj.is_object()) throw std::runtime_error("sweep spec: expected an object of fields");
+    for (const auto& kv : obj.members) {
+        if (!set_config_field(cfg, kv.first, kv.second.as_text())) {
+            throw std::runtime_error("sweep spec: unknown field '" + kv.first + "'");
+        }
+    }
+}
+
+static std::vector<SimConfig> expand_json(const JsonValue& spec, const SimConfig& defaults) {
+    std::vector<SimConfig> points;
+    if (spec.is_array()) {
+        for (const JsonValue& p : spec.items) {
+            SimConfig cfg = defaults;
+            apply_object(cfg, p);
+            points.push_back(cfg);
+        }
+        return points;
+    }
+    if (!spec.is_object()) throw std::runtime_error("sweep spec: expected an array or object");
+
+    SimConfig base = defaults;
+    if (const JsonValue* b = spec.find("base")) apply_object(base, *b);
+
+    // Explicit points first (or just the base), then the grid product on each
+    if (const JsonValue* list = spec.find("points")) {
+        for (const JsonValue& p : list->items) {
+            SimConfig cfg = base;
+            apply_object(cfg, p);
+            points.push_back(cfg);
+        }
+    } else {
+        points.push_back(base);
+    }
+
+    if (const JsonValue* grid = spec.find("grid")) {
+        if (!grid->is_object()) throw std::runtime_error("sweep spec: 'grid' must be an object");
+        for (const auto& axis : grid->members) {
+            std::vector<JsonValue> values = axis.second.is_array()
+                ? axis.second.items : std::vector<JsonValue>{axis.second};
+            std::vector<SimConfig> expanded;
+            for (const SimConfig& cfg : points) {
+                for (const JsonValue& v : values) {
+                    SimConfig c = cfg;
+                    if (!set_config_field(c, axis.first, v.as_text())) {
+                        throw std::runtime_error("sweep spec: unknown field '" + axis.first + "'");
+                    }
+                    expanded.push_back(c);
+                }
+            }
+            points.swap(expanded);
+        }
+    }
+    return points;
+}
+
+static std::vector<std::string> split_csv_line(const std::string& line) {
+    std::vector<std::string> cells;
+    std::stringstream ss(line);
+    std::string cell;
+    while (std::getline(ss, cell, ',')) {
+        size_t b = cell.find_first_not_of(" \t\r");
+        size_t e = cell.find_last_not_of(" \t\r");
+        cells.push_back(b == std::string::npos ? "" : cell.substr(b, e - b + 1));
+    }
+    return cells;
+}
+
+static std::vector<SimConfig> expand_csv(std::istream& in, const SimConfig& defaults) {
+    std::vector<SimConfig> points;
+    std::string line;
+    if (!std::getline(in, line)) return points;
+    std::vector<std::string> header = split_csv_line(line);
+    while (std::getline(in, line)) {
+        if (line.find_first_not_of(" \t\r") == std::string::npos) continue;
+        std::vector<std::string> cells = split_csv_line(line);
+        SimConfig cfg = defaults;
+        for (size_t i = 0; i < header.size() && i < cells.size(); ++i) {
+            if (cells[i].empty()) continue;
+            if (!set_config_field(cfg, header[i], cells[i])) {
+                throw std::runtime_error("sweep spec: unknown column '" + header[i] + "'");
+            }
+        }
+        points.push_back(cfg);
+    }
+    return points;
+}
+
+std::vector<SimConfig> load_sweep_spec(const std::string& path, const SimConfig& defaults) {
+    std::ifstream in(path);
+    if (!in.good()) throw std::runtime_error("Could not open sweep spec: " + path);
+    if (path.size() >= 4 && path.compare(path.size() - 4, 4, ".csv") == 0) {
+        return expand_csv(in, defaults);
+    }
+    std::stringstream buf;
+    buf << in.rdbuf();
+    return expand_json(parse_json(buf.str()), defaults);
+}
+
+// Key of the neighbor table a configuration needs
+static std::string neighbor_key(const SimConfig& c) {
+    if (c.policy != "spatialKL") return "none";
+    if (c.topo == "cluster") {
+        return "cluster/n" + std::to_string(c.n) + "/c" + std::to_string(c.num_clusters);
+    }
+    return c.topo + "/n" + std::to_string(c.n) + "/k" + std::to_string(c.k);
+}
+
+int run_sweep(const std::vector<SimConfig>& points, const std::string& out_path, int threads,
+              ResultStore* store, Telemetry* telemetry) {
+    // --- Shared artifacts, built once ---
+    struct Neighbors {
+        NeighborTable table;
+        double build_seconds;
+    };
+    std::map<std::string, std::unique_ptr<Neighbors>> neighbors;
+    std::map<std::string, std::unique_ptr<Trace>> traces;
+
+    for (const SimConfig& c : points) {
+        std::string key = neighbor_key(c);
+        if (!neighbors.count(key)) {
+            auto t0 = std::chrono::steady_clock::now();
+            auto nb = std::make_unique<Neighbors>();
+            nb->table = build_neighbors(c.policy, c.topo, c.n, c.k, c.num_clusters);
+            nb->build_seconds = std::chrono::duration<double>(
+                std::chrono::steady_clock::now() - t0).count();
+            neighbors[key] = std::move(nb);
+        }
+        if (!c.trace_file.empty() && !traces.count(c.trace_file)) {
+            auto tr = std::make_unique<Trace>();
+            if (!tr->load(c.trace_file)) return 1;
+            traces[c.trace_file] = std::move(tr);
+        }
+    }
+    std::cout << "Sweep: " << points.size() << " points, "
+              << neighbors.size() << " neighbor tables, "
+              << traces.size() << " traces, " << threads << " threads\n";
+
+    // --- Run, streaming one record per finished point ---
+    std::ofstream out;
+    if (!out_path.empty()) {
+        out.open(out_path, std::ios::app);
+        if (!out.good()) {
+            std::cerr << "Error: Could not open sweep output: " << out_path << "\n";
+            return 1;
+        }
+    }
+    std::mutex out_mtx;
+    size_t finished = 0;
+
+    ThreadPool pool(threads);
+    for (const SimConfig& c : points) {
+        const Neighbors& nb = *neighbors[neighbor_key(c)];
+        const Trace* trace = c.trace_file.empty() ? nullptr : traces[c.trace_file].get();
+        double setup_seconds = nb.build_seconds;
+        submit_replications(c, nb.table, trace, pool, [&, setup_seconds](RunReport& r) {
+            r.setup_seconds = setup_seconds;
+            std::lock_guard<std::mutex> lock(out_mtx);
+            if (out.is_open()) {
+                write_metrics_json(r, out, false);
+                out << "\n";
+                out.flush();
+            }
+            if (store) store->append(r);
+            finished++;
+            std::cout << "[" << finished << "/" << points.size() << "] "
+                      << r.config.policy << " " << r.config.topo
+                      << " n=" << r.config.n << " lambda=" << r.config.lambda
+                      << " k=" << r.config.k << " L=" << r.config.L
+                      << " E[Q]=" << r.combined.mean_Q << "\n" << std::flush;
+        }, telemetry);
+    }
+    pool.wait();
+
+    if (!out_path.empty()) std::cout << "Sweep results appended to " << out_path << "\n";
+    return 0;
+}
@@ -0,0 +1,103 @@
+#include "Telemetry.hpp"
+#include "Json.hpp"
+#include <iostream>
+#include <algorithm>
+#include <cerrno>
+#include <cstdlib>
+#include <cstring>
+#include <limits>
+#include <sstream>
+#include <fcntl.h>
+#include <signal.h>
+#include <unistd.h>
+#include <sys/socket.h>
+#include <sys/uio.h>
+#include <sys/un.h>
+
+Telemetry::~Telemetry() {
+    if (owned && fd >= 0) close(fd);
+}
+
+bool Telemetry::open(const std::string& dest) {
+    if (dest.compare(0, 3, "fd:") == 0) {
+        char* end = nullptr;
+        long n = strtol(dest.c_str() + 3, &end, 10);
+        if (*end != '\0' || n < 0 || fcntl((int)n, F_GETFD) < 0) {
+            std::cerr << "Error: Bad telemetry descriptor: " << dest << "\n";
+            return false;
+        }
+        fd = (int)n;
+    } else if (dest.compare(0, 5, "unix:") == 0) {
+        std::string path = dest.substr(5);
+        sockaddr_un addr{};
+        addr.sun_family = AF_UNIX;
+        if (path.empty() || path.size() >= sizeof(addr.sun_path)) {
+            std::cerr << "Error: Bad telemetry socket path: " << path << "\n";
+            return false;
+        }
+        memcpy(addr.sun_path, path.c_str(), path.size());
+        int s = socket(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0);
+        if (s < 0 || connect(s, reinterpret_cast<sockaddr*>(&addr), sizeof(addr)) != 0) {
+            std::cerr << "Error: Could not connect to telemetry socket " << path << ": "
+                      << strerror(errno) << "\n";
+            if (s >= 0) close(s);
+            return false;
+        }
+        fd = s;
+        owned = true;
+    } else {
+        std::cerr << "Error: --telemetry expects fd:N or unix:PATH, got " << dest << "\n";
+        return false;
+    }
+    // A reader that goes away must not kill the simulation
+    signal(SIGPIPE, SIG_IGN);
+    return true;
+}
+
+void Telemetry::start(const std::string& run, int rep, int n, double lambda,
+                      long long max_jobs) {
+    std::ostringstream line;
+    line << "{\"type\": \"start\", \"run\": \"" << json_escape(run) << "\", \"rep\": " << rep
+         << ", \"n\": " << n << ", \"lambda\": " << lambda
+         << ", \"max_jobs\": " << max_jobs << "}";
+    send(line.str());
+}
+
+void Telemetry::done(const std::string& run, int rep, long long jobs, double mean_Q,
+                     double seconds) {
+    std::ostringstream line;
+    line.precision(std::numeric_limits<double>::max_digits10);
+    line << "{\"type\": \"done\", \"run\": \"" << json_escape(run) << "\", \"rep\": " << rep
+         << ", \"jobs\": " << jobs << ", \"mean_Q\": " << mean_Q
+         << ", \"seconds\": " << seconds << "}";
+    send(line.str());
+}
+
+void Telemetry::send(const char* line, size_t size) {
+    std::lock_guard<std::mutex> lock(mtx);
+    if (fd < 0) return;
+    // Line and newline in one write: on a pipe, lines below PIPE_BUF then
+    // stay whole even when several processes share it
+    char nl = '\n';
+    iovec parts[2] = {{const_cast<char*>(line), size}, {&nl, 1}};
+    size_t left = size + 1;
+    while (left > 0) {
+        ssize_t w = writev(fd, parts, 2);
+        if (w < 0 && errno == EINTR) continue;
+        if (w <= 0) {
+            if (owned) close(fd);
+            fd = -1;
+            return;
+        }
+        left -= (size_t)w;
+        if (left == 0) break;
+        // Partial write: continue with what is left
+        size_t skip = (size_t)w;
+        for (iovec& p : parts) {
+            size_t d = std::min(skip, p.iov_len);
+            p.iov_base = static_cast<char*>(p.iov_base) + d;
+            p.iov_len -= d;
+            skip -= d;
+        }
+    }
+}
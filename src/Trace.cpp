@@ -0,0 +1,215 @@
+#include "Trace.hpp"
+#include <iostream>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+static const char TRACE_MAGIC[8] = {'L', 'B', 'T', 'R', 'A', 'C', 'E', '\0'};
+static const size_t TRACE_DATA_ALIGN = 64;
+static const size_t CSV_CHUNK_BYTES = 1 << 20;
+
+Trace::~Trace() {
+    reset();
+}
+
+void Trace::reset() {
+    if (map_base) munmap(map_base, map_size);
+    map_base = nullptr;
+    map_size = 0;
+    ia_owned.clear();
+    dur_owned.clear();
+    ia_col = dur_col = nullptr;
+    single = false;
+    count = 0;
+}
+
+bool Trace::load(const std::string& filepath) {
+    reset();
+    int fd = open(filepath.c_str(), O_RDONLY);
+    if (fd < 0) {
+        std::cerr << "Error: Could not open trace file: " << filepath << "\n";
+        return false;
+    }
+    struct stat st;
+    char magic[sizeof(TRACE_MAGIC)] = {};
+    bool binary = fstat(fd, &st) == 0 && (size_t)st.st_size >= sizeof(TraceHeader) &&
+                  pread(fd, magic, sizeof(magic), 0) == (ssize_t)sizeof(magic) &&
+                  memcmp(magic, TRACE_MAGIC, sizeof(magic)) == 0;
+
+    bool ok = binary ? load_binary(fd, (size_t)st.st_size, filepath) : load_text(filepath);
+    close(fd);
+    if (!ok || count == 0) {
+        reset();
+        return false;
+    }
+    std::cout << "Loaded " << count << " jobs from trace"
+              << (binary ? " (mapped)" : "") << ".\n";
+    return true;
+}
+
+bool Trace::load_binary(int fd, size_t file_size, const std::string& filepath) {
+    TraceHeader h;
+    if (pread(fd, &h, sizeof(h), 0) != (ssize_t)sizeof(h)) return false;
+    if (h.version != 1 || (h.value_bytes != 4 && h.value_bytes != 8) ||
+        h.data_offset < sizeof(TraceHeader) || h.data_offset % h.value_bytes != 0 ||
+        h.data_offset + 2 * h.count * h.value_bytes > file_size) {
+        std::cerr << "Error: Malformed binary trace: " << filepath << "\n";
+        return false;
+    }
+    if (h.count == 0) return false;
+
+    void* base = mmap(nullptr, file_size, PROT_READ, MAP_SHARED, fd, 0);
+    if (base == MAP_FAILED) {
+        std::cerr << "Error: Could not map trace file: " << filepath << "\n";
+        return false;
+    }
+    // Replay walks the columns front to back
+    madvise(base, file_size, MADV_SEQUENTIAL);
+
+    map_base = base;
+    map_size = file_size;
+    single = (h.value_bytes == 4);
+    count = h.count;
+    const char* data = static_cast<const char*>(base) + h.data_offset;
+    ia_col = data;
+    dur_col = data + h.count * h.value_bytes;
+    return true;
+}
+
+// Parses one number starting at p; returns false at end of line / buffer.
+static bool parse_field(const char*& p, const char* end, double& out) {
+    while (p < end && (*p == ' ' || *p == '\t' || *p == ',' || *p == '\r')) p++;
+    if (p >= end || *p == '\n') return false;
+    char* stop = nullptr;
+    out = std::strtod(p, &stop);
+    if (stop == p) return false;
+    p = stop;
+    return true;
+}
+
+bool Trace::load_text(const std::string& filepath) {
+    FILE* f = fopen(filepath.c_str(), "rb");
+    if (!f) {
+        std::cerr << "Error: Could not open trace file: " << filepath << "\n";
+        return false;
+    }
+
+    // Read fixed-size chunks; a line cut by the chunk boundary is carried
+    // over to the front of the next chunk. The buffer keeps one spare byte
+    // so strtod always stops at a terminator.
+    std::vector<char> buf(CSV_CHUNK_BYTES + 1);
+    size_t carry = 0;
+    bool first_line = true;
+    bool malformed = false;
+    while (true) {
+        size_t got = fread(buf.data() + carry, 1, buf.size() - 1 - carry, f);
+        size_t len = carry + got;
+        bool at_eof = (got == 0) || feof(f);
+        if (len == 0) break;
+
+        // Only whole lines are parsed unless this is the last chunk
+        size_t parse_len = len;
+        if (!at_eof) {
+            while (parse_len > 0 && buf[parse_len - 1] != '\n') parse_len--;
+            if (parse_len == 0) {
+                // A single line longer than the chunk: grow and retry
+                buf.resize(buf.size() * 2);
+                carry = len;
+                continue;
+            }
+        }
+        char saved = buf[parse_len];
+        buf[parse_len] = '\0';
+
+        const char* p = buf.data();
+        const char* end = buf.data() + parse_len;
+        while (p < end) {
+            const char* line_end = static_cast<const char*>(memchr(p, '\n', end - p));
+            if (!line_end) line_end = end;
+            if (first_line) {
+                first_line = false;
+                // Header: anything not starting with a digit, as before
+                if (*p < '0' || *p > '9') {
+                    p = line_end + 1;
+                    continue;
+                }
+            }
+            double dt, d;
+            const char* q = p;
+            if (parse_field(q, line_end, dt) && parse_field(q, line_end, d)) {
+                ia_owned.push_back(dt);
+                dur_owned.push_back(d);
+            } else {
+                // Blank lines are fine; anything else ends the trace
+                while (p < line_end && (*p == ' ' || *p == '\t' || *p == '\r')) p++;
+                if (p != line_end) {
+                    malformed = true;
+                    break;
+                }
+            }
+            p = line_end + 1;
+        }
+        buf[parse_len] = saved;
+        if (malformed || at_eof) break;
+
+        carry = len - parse_len;
+        memmove(buf.data(), buf.data() + parse_len, carry);
+    }
+    fclose(f);
+
+    if (malformed) {
+        std::cerr << "Warning: stopped reading trace at line " << ia_owned.size() + 1
+                  << " (expected two numbers): " << filepath << "\n";
+    }
+    count = ia_owned.size();
+    ia_col = ia_owned.data();
+    dur_col = dur_owned.data();
+    single = false;
+    return count > 0;
+}
+
+template <typename T>
+static bool write_column(FILE* f, const Trace& trace, bool durations) {
+    std::vector<T> block;
+    block.reserve(1 << 16);
+    for (size_t i = 0; i < trace.size(); ++i) {
+        block.push_back((T)(durations ? trace.duration(i) : trace.inter_arrival(i)));
+        if (block.size() == block.capacity() || i + 1 == trace.size()) {
+            if (fwrite(block.data(), sizeof(T), block.size(), f) != block.size()) return false;
+            block.clear();
+        }
+    }
+    return true;
+}
+
+bool Trace::write_binary(const std::string& filepath, int value_bytes) const {
+    if (value_bytes != 4 && value_bytes != 8) return false;
+    FILE* f = fopen(filepath.c_str(), "wb");
+    if (!f) {
+        std::cerr << "Error: Could not write trace file: " << filepath << "\n";
+        return false;
+    }
+    TraceHeader h;
+    memset(&h, 0, sizeof(h));
+    memcpy(h.magic, TRACE_MAGIC, sizeof(h.magic));
+    h.version = 1;
+    h.value_bytes = (uint32_t)value_bytes;
+    h.count = count;
+    h.data_offset = TRACE_DATA_ALIGN;
+
+    std::vector<char> pad(h.data_offset - sizeof(h), 0);
+    bool ok = fwrite(&h, sizeof(h), 1, f) == 1 &&
+              fwrite(pad.data(), 1, pad.size(), f) == pad.size();
+    if (value_bytes == 4) {
+        ok = ok && write_column<float>(f, *this, false) && write_column<float>(f, *this, true);
+    } else {
+        ok = ok && write_column<double>(f, *this, false) && write_column<double>(f, *this, true);
+    }
+    ok = (fclose(f) == 0) && ok;
+    if (!ok) std::cerr << "Error: Failed writing trace file: " << filepath << "\n";
+    return ok;
+}
@@ -3,125 +3,296 @@
 #include <vector>
 #include <string>
 #include <cstring>
+#include <cstdio>
+#include <chrono>
+#include <thread>
 #include <sys/stat.h>
 #include <filesystem>
 #include "Simulation.hpp"
 #include "Graph.hpp"
+#include "Runner.hpp"
+#include "Sweep.hpp"
+#include "ResultStore.hpp"
+#include "Telemetry.hpp"
+#include "Stats.hpp"
 
 namespace fs = std::filesystem;
 
-static void write_hist_csv(const std::vector<double>& hist, const std::string& path) {
-    std::ofstream out(path);
-    out << "QueueLength,Probability\n";
-    for (size_t i = 0; i < hist.size(); ++i) {
-        if (hist[i] > 0.0)
-            out << i << "," << hist[i] << "\n";
-    }
-}
-
-static void write_metrics_json(const std::string& path,
-                               const std::string& policy,
-                               const std::string& graph_type,
-                               int n, int m, double lambda_, double mu_,
-                               int k, int L, int qmax,
-                               int num_clusters, double comm_cost,
-                               double total_req_dist,
-                               double mean_Q,
-                               double mean_W,
-                               double avg_req_dist) {
-    std::ofstream out(path);
-    out << "{\n";
-    out << "  \"policy\": \"" << policy << "\",\n";
-    out << "  \"graph\": \"" << graph_type << "\",\n";
-    out << "  \"n\": " << n << ",\n";
-    out << "  \"m\": " << m << ",\n";
-    out << "  \"lambda\": " << lambda_ << ",\n";
-    out << "  \"mu\": " << mu_ << ",\n";
-    out << "  \"k\": " << k << ",\n";
-    out << "  \"L\": " << L << ",\n";
-    out << "  \"qmax\": " << qmax << ",\n";
-    out << "  \"num_clusters\": " << num_clusters << ",\n";
-    out << "  \"comm_cost\": " << comm_cost << ",\n";
-    out << "  \"total_req_dist\": " << total_req_dist << ",\n";
-    out << "  \"mean_Q\": " << mean_Q << ",\n";
-    out << "  \"mean_W\": " << mean_W << ",\n";
-    out << "  \"avg_req_dist\": " << avg_req_dist << "\n";
-    out << "}\n";
+static double seconds_since(std::chrono::steady_clock::time_point start) {
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
 }
 
 int main(int argc, char* argv[]) {
-    int n = 1000;
-    int m = 100000;
-    double lambda = 0.9;
-    double mu = 1.0;
-    std::string policy = "pot";
-    std::string topo = "cycle";
-    int k = 1;
-    int L = 1;
-    int qmax = 100;
-    
-    int num_clusters = 1;
-    double comm_cost = 0.0;
-    std::string trace_file = "";
+    SimConfig cfg;
+    int threads = 0; // 0 = one per replication, up to the core count
 
     std::string outdir = "results";
-    std::string tag_suffix = "";
+    std::string sweep_file;
+    std::string sweep_out;
+    std::string store_path;
+    std::string convert_out;
+    std::string trace_dtype = "float64";
+    std::string telemetry_dest;
+    double telemetry_interval = 1.0;
 
     for(int i=1; i<argc; ++i) {
-        if(strcmp(argv[i], "--n")==0) n = std::stoi(argv[++i]);
-        else if(strcmp(argv[i], "--m")==0) m = std::stoi(argv[++i]);
-        else if(strcmp(argv[i], "--lambda")==0) lambda = std::stod(argv[++i]);
-        else if(strcmp(argv[i], "--mu")==0) mu = std::stod(argv[++i]);
-        else if(strcmp(argv[i], "--policy")==0) policy = argv[++i];
-        else if(strcmp(argv[i], "--topo")==0) topo = argv[++i];
-        else if(strcmp(argv[i], "--k")==0) k = std::stoi(argv[++i]);
-        else if(strcmp(argv[i], "--L")==0) L = std::stoi(argv[++i]);
-        else if(strcmp(argv[i], "--clusters")==0) num_clusters = std::stoi(argv[++i]);
-        else if(strcmp(argv[i], "--cost")==0) comm_cost = std::stod(argv[++i]);
-        else if(strcmp(argv[i], "--trace")==0) trace_file = argv[++i];
-        else if(strcmp(argv[i], "--outdir")==0) outdir = argv[++i];
-        else if(strcmp(argv[i], "--tag")==0) tag_suffix = argv[++i];
+        if (strncmp(argv[i], "--", 2) != 0 || i + 1 >= argc) continue;
+        std::string key = argv[i] + 2;
+        std::string value = argv[++i];
+        if (key == "threads") threads = std::stoi(value);
+        else if (key == "outdir") outdir = value;
+        else if (key == "sweep") sweep_file = value;
+        else if (key == "sweep-out") sweep_out = value;
+        else if (key == "store") store_path = value;
+        else if (key == "convert-trace") convert_out = value;
+        else if (key == "trace-dtype") trace_dtype = value;
+        else if (key == "telemetry") telemetry_dest = value;
+        else if (key == "telemetry-interval") telemetry_interval = std::stod(value);
+        else if (key == "checkpoint") cfg.checkpoint = value;
+        else if (key == "checkpoint-every") cfg.checkpoint_events = std::stoll(value);
+        else if (key == "checkpoint-seconds") cfg.checkpoint_seconds = std::stod(value);
+        else if (key == "resume") {
+            // Continue from this checkpoint and keep checkpointing to it
+            cfg.checkpoint = value;
+            cfg.resume = true;
+        }
+        else {
+            bool known;
+            try {
+                known = set_config_field(cfg, key, value);
+            } catch (const std::exception& e) {
+                std::cerr << "Error: bad value for --" << key << ": " << e.what() << "\n";
+                return 1;
+            }
+            if (!known) std::cerr << "Warning: ignoring unknown option --" << key << "\n";
+        }
+    }
+
+    std::string engine_problem = engine_error(cfg.engine, cfg.policy, cfg.topo,
+                                              !cfg.trace_file.empty());
+    if (!engine_problem.empty()) {
+        std::cerr << "Error: " << engine_problem << "\n";
+        return 1;
+    }
+    if (cfg.engine == "pdes" && (cfg.target_rel_error > 0 || !cfg.checkpoint.empty())) {
+        std::cerr << "Error: --engine pdes supports neither --target-rel-error nor checkpoints\n";
+        return 1;
+    }
+    if (!cfg.paired.empty()) {
+        if (cfg.engine != "scan" && cfg.engine != "heap") {
+            std::cerr << "Error: --paired needs the scan or heap engine\n";
+            return 1;
+        }
+        if (!cfg.trace_file.empty() || cfg.target_rel_error > 0 || !cfg.checkpoint.empty()) {
+            std::cerr << "Error: --paired supports neither --trace, --target-rel-error nor checkpoints\n";
+            return 1;
+        }
+        if (cfg.replications < 2) {
+            std::cerr << "Warning: paired differences need --replications 2 or more for "
+                         "confidence intervals\n";
+        }
+    }
+    if (cfg.target_rel_error < 0 || cfg.target_rel_error >= 1) {
+        std::cerr << "Error: --target-rel-error must be in [0, 1)\n";
+        return 1;
+    }
+    if (cfg.replications < 1) {
+        std::cerr << "Error: --replications must be at least 1\n";
+        return 1;
+    }
+    if (!cfg.checkpoint.empty() && cfg.checkpoint_events <= 0 && cfg.checkpoint_seconds <= 0) {
+        cfg.checkpoint_seconds = 60.0;
+    }
+    if (cfg.resume && !fs::exists(cfg.checkpoint)) {
+        std::cerr << "Error: Checkpoint " << cfg.checkpoint << " not found\n";
+        return 1;
+    }
+    int cores = (int)std::max(1u, std::thread::hardware_concurrency());
+
+    // --- Trace conversion: --trace in.csv --convert-trace out.lbt ---
+    if (!convert_out.empty()) {
+        if (trace_dtype != "float32" && trace_dtype != "float64") {
+            std::cerr << "Error: --trace-dtype must be float32 or float64\n";
+            return 1;
+        }
+        Trace trace;
+        if (cfg.trace_file.empty() || !trace.load(cfg.trace_file)) {
+            std::cerr << "Error: --convert-trace needs a readable --trace input\n";
+            return 1;
+        }
+        if (!trace.write_binary(convert_out, trace_dtype == "float32" ? 4 : 8)) return 1;
+        std::cout << "Wrote " << trace.size() << " jobs (" << trace_dtype << ") to "
+                  << convert_out << "\n";
+        return 0;
     }
 
     fs::create_directories(outdir);
 
-    std::vector<std::vector<int>> k_nbrs;
-    std::vector<std::vector<int>> dist; 
+    // With --store, results go to the database instead of per-run files
+    ResultStore store;
+    if (!store_path.empty() && !store.open(store_path)) return 1;
+    ResultStore* store_ptr = store_path.empty() ? nullptr : &store;
+
+    // Live progress as JSON lines (--telemetry fd:N | unix:PATH)
+    Telemetry telemetry;
+    if (!telemetry_dest.empty() && !telemetry.open(telemetry_dest)) return 1;
+    telemetry.interval = telemetry_interval;
+    Telemetry* telemetry_ptr = telemetry_dest.empty() ? nullptr : &telemetry;
 
-    if (policy == "spatialKL") {
-        if (topo == "cycle") k_nbrs = generate_cycle_neighbors(n, k);
-        else if (topo == "grid") k_nbrs = generate_grid_neighbors(n, k);
-        else if (topo == "cluster") k_nbrs = generate_cluster_neighbors(n, num_clusters);
+    // --- Batch sweep: every point of a spec in this one process ---
+    if (!sweep_file.empty()) {
+        if (!cfg.checkpoint.empty()) {
+            std::cerr << "Warning: checkpointing applies to single runs, not to --sweep\n";
+            cfg.checkpoint.clear();
+            cfg.resume = false;
+        }
+        std::vector<SimConfig> points;
+        try {
+            points = load_sweep_spec(sweep_file, cfg);
+        } catch (const std::exception& e) {
+            std::cerr << "Error: " << e.what() << "\n";
+            return 1;
+        }
+        for (const SimConfig& p : points) {
+            std::string problem = engine_error(p.engine, p.policy, p.topo, !p.trace_file.empty());
+            if (problem.empty() && !p.paired.empty()) problem = "paired runs cannot be swept";
+            if (!problem.empty()) {
+                std::cerr << "Error: sweep point " << run_name(p) << ": " << problem << "\n";
+                return 1;
+            }
+        }
+        if (sweep_out.empty() && !store_ptr) sweep_out = outdir + "/sweep_results.jsonl";
+        int status = run_sweep(points, sweep_out, threads > 0 ? threads : cores, store_ptr,
+                               telemetry_ptr);
+        if (status == 0 && store_ptr) std::cout << "Sweep results stored in " << store_path << "\n";
+        return status;
     }
 
-    std::cout << "Running: N=" << n << " Policy=" << policy 
-              << " Topo=" << topo;
-    if (!trace_file.empty()) std::cout << " [Trace: " << trace_file << "]";
+    if (threads <= 0) threads = std::min(cfg.replications, cores);
+
+    auto setup_start = std::chrono::steady_clock::now();
+
+    // Read-only, shared by every replication
+    NeighborTable k_nbrs = build_neighbors(cfg.policy, cfg.topo, cfg.n, cfg.k, cfg.num_clusters);
+    std::vector<NeighborTable> arm_tables;
+    for (const PairedArm& arm : cfg.paired) {
+        arm_tables.push_back(build_neighbors(arm.policy, cfg.topo, cfg.n, arm.k, cfg.num_clusters));
+    }
+    Trace trace;
+    if (!cfg.trace_file.empty()) trace.load(cfg.trace_file);
+    double setup_seconds = seconds_since(setup_start);
+
+    std::cout << "Running: N=" << cfg.n << " Policy=" << cfg.policy 
+              << " Topo=" << cfg.topo << " Engine=" << cfg.engine;
+    if (!cfg.trace_file.empty()) std::cout << " [Trace: " << cfg.trace_file << "]";
+    if (cfg.replications > 1) {
+        std::cout << " Replications=" << cfg.replications << " Threads=" << threads;
+    }
+    if (cfg.resume) std::cout << " [Resuming: " << cfg.checkpoint << "]";
+    if (!cfg.paired.empty()) std::cout << " [Paired with " << cfg.paired.size() << " more]";
     std::cout << "..." << std::flush;
     
-    Simulation sim(n, lambda, m, mu, policy, topo, dist, k_nbrs, k, L, qmax, 
-                   num_clusters, comm_cost, trace_file);
-                   
-    SimulationResult result = sim.run();
+    ThreadPool pool(threads);
+    RunReport report;
+    if (cfg.paired.empty()) {
+        report = run_replications(cfg, k_nbrs, trace.empty() ? nullptr : &trace, pool,
+                                  telemetry_ptr);
+    } else {
+        std::vector<const NeighborTable*> arm_nbrs;
+        for (const NeighborTable& t : arm_tables) arm_nbrs.push_back(&t);
+        report = run_paired(cfg, k_nbrs, arm_nbrs, pool, telemetry_ptr);
+    }
+    report.setup_seconds = setup_seconds;
+    if (report.failed) {
+        std::cerr << "Error: " << report.failed << " replication(s) could not be resumed\n";
+        return 1;
+    }
+    // Checkpoints are only needed until the result is written
+    auto remove_checkpoints = [&cfg] {
+        for (int r = 0; r < cfg.replications; ++r) {
+            std::string ckpt = checkpoint_file(cfg, r);
+            if (!ckpt.empty()) std::remove(ckpt.c_str());
+        }
+    };
+    const SimulationResult& result = report.combined;
 
-    std::cout << " Done. E[Q]=" << result.mean_Q << "\n";
+    std::cout << " Done. E[Q]=" << result.mean_Q
+              << " (heap allocs in event loop: " << result.loop_heap_allocs << ")\n";
+    if (cfg.target_rel_error > 0) {
+        std::cout << "Jobs used " << result.jobs_used << " (warmup " << result.warmup_jobs
+                  << "), relative error " << result.rel_error << " (target "
+                  << cfg.target_rel_error << (result.rel_error <= cfg.target_rel_error
+                                              ? ", met)\n" : ", NOT met: raise --m)\n");
+    }
+    if (!report.parallel.empty()) {
+        const ParallelStats& ps = report.parallel[0];
+        std::cout << "PDES: " << ps.lps << " processes, window " << ps.window << ", "
+                  << ps.windows << " windows, " << ps.messages << " cross-process dispatches ("
+                  << ps.in_flight << " still in transfer at the end)\n";
+        if (!report.sequential.empty()) {
+            const SimulationResult& seq = report.sequential[0];
+            std::cout << "Speedup " << report.sequential_seconds[0] / report.rep_seconds[0]
+                      << "x over the heap engine (E[Q]=" << seq.mean_Q << ", avg_req_dist="
+                      << seq.avg_req_dist << "; differences "
+                      << 100.0 * (report.reps[0].mean_Q - seq.mean_Q) / seq.mean_Q << "% and "
+                      << 100.0 * (report.reps[0].avg_req_dist - seq.avg_req_dist) / seq.avg_req_dist
+                      << "%)\n";
+        }
+    }
+    for (RunReport& arm : report.paired) {
+        arm.setup_seconds = setup_seconds;
+        const SimConfig& c = arm.config;
+        std::vector<double> diff;
+        for (size_t r = 0; r < arm.reps.size(); ++r) {
+            diff.push_back(arm.reps[r].mean_Q - report.reps[r].mean_Q);
+        }
+        Estimate d = estimate(diff);
+        std::cout << "Paired " << c.policy << " k=" << c.k << " L=" << c.L << ": E[Q]="
+                  << arm.combined.mean_Q << ", difference " << d.mean;
+        if (d.count > 1) std::cout << " [" << d.ci_low << ", " << d.ci_high << "]";
+        std::cout << "\n";
+    }
+    std::cout << "Setup " << setup_seconds << " s (neighbors " << report.neighbor_bytes
+              << " bytes), run " << report.run_seconds << " s, peak RSS "
+              << report.peak_rss_kb << " kB\n";
+
+    if (store_ptr) {
+        if (!store.append(report)) return 1;
+        for (const RunReport& arm : report.paired) {
+            if (!store.append(arm)) return 1;
+        }
+        std::cout << "Result stored in " << store_path << "\n";
+        remove_checkpoints();
+        return 0;
+    }
 
-    std::string filename_base = policy + "_" + topo 
-                              + "_n" + std::to_string(n);
-    if(trace_file.empty()) filename_base += "_lam" + std::to_string(lambda).substr(0,4);
+    std::string filename_base = cfg.policy + "_" + cfg.topo 
+                              + "_n" + std::to_string(cfg.n);
+    if(cfg.trace_file.empty()) filename_base += "_lam" + std::to_string(cfg.lambda).substr(0,4);
     else filename_base += "_trace";
     
-    if (!tag_suffix.empty()) filename_base += "_" + tag_suffix;
+    if (!cfg.tag.empty()) filename_base += "_" + cfg.tag;
 
     std::string hist_path = outdir + "/" + filename_base + "_hist.csv";
     std::string meta_path = outdir + "/" + filename_base + "_metrics.json";
 
     write_hist_csv(result.hist, hist_path);
-    write_metrics_json(meta_path, policy, topo, n, m, lambda, mu, k, L, qmax,
-                       num_clusters, comm_cost,
-                       result.total_req_dist, 
-                       result.mean_Q, 
-                       result.mean_W, result.avg_req_dist);
+    std::ofstream meta(meta_path);
+    write_metrics_json(report, meta);
+    meta.close();
+    if (meta) remove_checkpoints();
+
+    // Paired arms get their own files, named after their policy, k and L
+    for (const RunReport& arm : report.paired) {
+        const SimConfig& c = arm.config;
+        std::string arm_base = c.policy + "_" + c.topo + "_n" + std::to_string(c.n)
+                             + "_lam" + std::to_string(c.lambda).substr(0,4)
+                             + "_k" + std::to_string(c.k) + "_L" + std::to_string(c.L);
+        if (!c.tag.empty()) arm_base += "_" + c.tag;
+        write_hist_csv(arm.combined.hist, outdir + "/" + arm_base + "_hist.csv");
+        std::ofstream arm_meta(outdir + "/" + arm_base + "_metrics.json");
+        write_metrics_json(arm, arm_meta);
+    }
 
     return 0;
-}
\ No newline at end of file
+}